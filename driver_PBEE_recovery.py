@@ -1,4 +1,5 @@
-def run_analysis(model_name):
+def run_analysis(model_name, output_profile = None, memory_budget_mb = None, max_workers = None, stage_cache_dir = None,
+                 convergence_options = None):
 
     '''This script facilitates the performance based functional recovery and
     reoccupancy assessment of a single building for a single intensity level
@@ -19,6 +20,39 @@ def run_analysis(model_name):
         Name of the model. Inputs are expected to be in a directory with this 
         name. Outputs will save to a directory with this name
     
+    output_profile: string
+        optional override of functionality_options['output_profile']: 'full',
+        'standard' or 'summary' (statistics only)
+    
+    memory_budget_mb: number
+        optional memory budget (MB). If provided, the damage arrays are
+        streamed once from simulated_inputs.json into memory-mapped files
+        (damage_memmap in the inputs directory, reused while the inputs are
+        unchanged) and the realizations are assessed in blocks that fit the
+        budget. Per realization outputs are saved as .npy files
+        (realization_outputs in the outputs directory) and referenced by file
+        name in the json file.
+    
+    max_workers: number
+        optional number of worker processes. If provided, the realizations
+        are assessed in chunks by a pool of workers, with the inputs and per
+        realization outputs transported in shared memory (chunks sized to
+        memory_budget_mb, if provided).
+    
+    stage_cache_dir: string
+        optional directory of a stage cache (see fn_stage_cache). Stages of
+        the assessment whose inputs, options and random seed are unchanged
+        since a previous run are reused rather than recomputed. Not used
+        when assessing realizations in blocks or chunks.
+    
+    convergence_options: dictionary
+        optional requested precision of the recovery statistics (see
+        fn_convergence_monitor.fn_default_convergence_options; {} for the
+        defaults). If provided, realizations are assessed in blocks until the
+        building level recovery percentiles and probabilities of exceeding
+        the performance targets converge, and only the realizations needed
+        are saved (as .npy files, like memory_budget_mb).
+    
     
     """'''
     
@@ -44,59 +78,93 @@ def run_analysis(model_name):
     outputs_dir = 'outputs/'+model_name # Directory where the assessment outputs are saved
     
     ## 3. Load FEMA P-58 performance model data and simulated damage and loss
-    f = open(os.path.join(os.path.dirname(__file__),model_dir, 'simulated_inputs.json'))
+    input_path = os.path.join(os.path.dirname(__file__),model_dir, 'simulated_inputs.json')
+    is_out_of_core = max_workers == None and convergence_options == None and memory_budget_mb != None
+    if is_out_of_core:
+        # Damage arrays streamed once into memory-mapped files (keyed to the
+        # content of the inputs); only the other inputs are loaded
+        import fn_out_of_core
+        memmap_dir = fn_out_of_core.fn_convert_simulated_inputs(input_path, os.path.join(os.path.dirname(__file__), model_dir, 'damage_memmap'))
+        input_path = os.path.join(memmap_dir, 'simulated_inputs.json')
+    f = open(input_path)
     simulated_inputs = json.load(f)
+    f.close()
     
+    simulated_inputs = fn_format_simulated_inputs(simulated_inputs)
     building_model = simulated_inputs['building_model']
     damage = simulated_inputs['damage']
     damage_consequences = simulated_inputs['damage_consequences']
     functionality = simulated_inputs['functionality']
     functionality_options = simulated_inputs['functionality_options']
+    if output_profile != None:
+        functionality_options['output_profile'] = output_profile
     impedance_options = simulated_inputs['impedance_options']
     repair_time_options = simulated_inputs['repair_time_options']
     tenant_units = simulated_inputs['tenant_units']
     
-    # Change story indices in damage['tenant_units'], damage['story'] building_model['comps']['story'] to int from string
-    damage_ten_units = []
-    if ('tenant_units' in damage.keys()) == True:
-        for tu in range(len(damage['tenant_units'])):
-            damage_ten_units.append(damage['tenant_units'][str(tu)])
-            
-        damage['tenant_units'] = damage_ten_units  
-    
-    damage_story = []    
-    for s in range(len(damage['story'])):
-        damage_story.append(damage['story'][str(s)])
-    
-    damage['story'] = damage_story 
-    
-    bldg_comps_story = []
-    for s in range(len(building_model['comps']['story'])):
-        bldg_comps_story.append(building_model['comps']['story'][str(s)])
-        
-    building_model['comps']['story'] = bldg_comps_story
-    
     ## 4. Load required static data
-    systems = pd.read_csv(os.path.join(os.path.dirname(__file__), 'static_tables', 'systems.csv'))
-    subsystems = pd.read_csv(os.path.join(os.path.dirname(__file__), 'static_tables', 'subsystems.csv'))
-    impeding_factor_medians = pd.read_csv(os.path.join(os.path.dirname(__file__), 'static_tables', 'impeding_factors.csv'))
-    tmp_repair_class = pd.read_csv(os.path.join(os.path.dirname(__file__), 'static_tables', 'temp_repair_class.csv'))
+    static_tables = fn_load_static_tables()
+    systems = static_tables['systems']
+    subsystems = static_tables['subsystems']
+    impeding_factor_medians = static_tables['impeding_factor_medians']
+    tmp_repair_class = static_tables['tmp_repair_class']
     
     ## 5. Run Recovery Method
     from main_PBEE_recovery import main_PBEE_recovery
     
-    functionality, damage_consequences = main_PBEE_recovery(damage, 
-                                                            damage_consequences, 
-                                                            building_model, 
-                                                            tenant_units, 
-                                                            systems, 
-                                                            subsystems, 
-                                                            tmp_repair_class,
-                                                            impedance_options, 
-                                                            impeding_factor_medians, 
-                                                            repair_time_options,
-                                                            functionality, 
-                                                            functionality_options)
+    if max_workers != None:
+        # Chunks of realizations assessed by a pool of workers
+        import fn_shared_memory
+        functionality = fn_shared_memory.fn_run_shared_pool(damage, damage_consequences, 
+                                                    building_model, tenant_units, systems, 
+                                                    subsystems, tmp_repair_class, impedance_options, 
+                                                    impeding_factor_medians, repair_time_options, 
+                                                    functionality, functionality_options, 
+                                                    max_workers, memory_budget_mb)
+    elif convergence_options != None:
+        # Blocks of realizations until the recovery statistics converge
+        import fn_out_of_core
+        import fn_convergence_monitor
+        results_dir = os.path.join(os.path.dirname(__file__), outputs_dir, 'realization_outputs')
+        functionality = fn_convergence_monitor.fn_run_until_converged(damage, damage_consequences, 
+                                                    building_model, tenant_units, systems, 
+                                                    subsystems, tmp_repair_class, impedance_options, 
+                                                    impeding_factor_medians, repair_time_options, 
+                                                    functionality, functionality_options, 
+                                                    results_dir, convergence_options)
+        functionality = fn_out_of_core.fn_result_file_names(functionality, results_dir)
+        print('Recovery statistics ' + ('converged' if functionality['recovery_convergence']['converged'] else 'did not converge') +
+              ' after ' + str(functionality['recovery_convergence']['num_reals_assessed']) + ' of ' + 
+              str(functionality['recovery_convergence']['num_reals_available']) + ' realizations')
+    elif is_out_of_core:
+        # Out-of-core assessment in blocks of realizations
+        damage = fn_out_of_core.fn_damage_memmap(damage, memmap_dir)
+        results_dir = os.path.join(os.path.dirname(__file__), outputs_dir, 'realization_outputs')
+        functionality = fn_out_of_core.fn_run_realization_blocks(damage, damage_consequences, 
+                                                    building_model, tenant_units, systems, 
+                                                    subsystems, tmp_repair_class, impedance_options, 
+                                                    impeding_factor_medians, repair_time_options, 
+                                                    functionality, functionality_options, 
+                                                    memory_budget_mb, results_dir)
+        functionality = fn_out_of_core.fn_result_file_names(functionality, results_dir)
+    else:
+        stage_cache = None
+        if stage_cache_dir != None:
+            import fn_stage_cache
+            stage_cache = fn_stage_cache.fn_create_stage_cache(stage_cache_dir)
+        functionality, damage_consequences = main_PBEE_recovery(damage, 
+                                                                damage_consequences, 
+                                                                building_model, 
+                                                                tenant_units, 
+                                                                systems, 
+                                                                subsystems, 
+                                                                tmp_repair_class,
+                                                                impedance_options, 
+                                                                impeding_factor_medians, 
+                                                                repair_time_options,
+                                                                functionality, 
+                                                                functionality_options,
+                                                                stage_cache)
            
     # 6. Save Outputs
     # # Define Output path
@@ -105,37 +173,8 @@ def run_analysis(model_name):
     if os.path.exists(os.path.join(os.path.dirname(__file__),'outputs', model_name)) == False:
         os.mkdir(os.path.join(os.path.dirname(__file__),'outputs', model_name))
     
-    # Covert arrays to list for writing to json file   
-    fnc_keys_1 = list(functionality.keys())
-    for k_1 in fnc_keys_1:
-        if type(functionality[k_1]) == np.ndarray: 
-            functionality[k_1] = functionality[k_1].tolist() 
-        if type(functionality[k_1]) == dict:
-            fnc_keys_2 = list(functionality[k_1].keys())    
-       
-            for k_2 in fnc_keys_2:
-                if type(functionality[k_1][k_2]) == np.ndarray: 
-                    functionality[k_1][k_2] = functionality[k_1][k_2].tolist()
-                if type(functionality[k_1][k_2]) == dict:
-                    fnc_keys_3 = list(functionality[k_1][k_2].keys())    
-       
-                    for k_3 in fnc_keys_3:
-                        if type(functionality[k_1][k_2][k_3]) == np.ndarray: 
-                            functionality[k_1][k_2][k_3] = functionality[k_1][k_2][k_3].tolist()
-                        if type(functionality[k_1][k_2][k_3]) == dict:
-                            fnc_keys_4 = list(functionality[k_1][k_2][k_3].keys())
-     
-                            for k_4 in fnc_keys_4:
-                                if type(functionality[k_1][k_2][k_3][k_4]) == np.ndarray: 
-                                    functionality[k_1][k_2][k_3][k_4] = functionality[k_1][k_2][k_3][k_4].tolist()
-                                if type(functionality[k_1][k_2][k_3][k_4]) == dict:
-                                    fnc_keys_5 = list(functionality[k_1][k_2][k_3][k_4].keys())
-        
-                                    for k_5 in fnc_keys_5:
-                                        if type(functionality[k_1][k_2][k_3][k_4][k_5]) == np.ndarray: 
-                                            functionality[k_1][k_2][k_3][k_4][k_5] = functionality[k_1][k_2][k_3][k_4][k_5].tolist()
-                                        if type(functionality[k_1][k_2][k_3][k_4][k_5]) == dict:
-                                            fnc_keys_6 = list(functionality[k_1][k_2][k_3][k_4][k_5].keys())
+    # Covert arrays to list for writing to json file
+    fn_arrays_to_lists(functionality)
     
     output_json_object = json.dumps(functionality)
     
@@ -147,6 +186,68 @@ def run_analysis(model_name):
     print('Recovery assessment of model ' + model_name + ' complete')
     print('time to run '+str(round(end_time - start_time,2))+'s')
         
+
+
+def fn_format_simulated_inputs(simulated_inputs):
+    '''Change the story indices of damage['tenant_units'], damage['story'] and
+    building_model['comps']['story'] of the simulated inputs read from json
+    from string keys to lists (simulated_inputs updated in place)'''
+    
+    damage = simulated_inputs['damage']
+    building_model = simulated_inputs['building_model']
+    
+    damage_ten_units = []
+    if ('tenant_units' in damage.keys()) == True and type(damage['tenant_units']) == dict:
+        for tu in range(len(damage['tenant_units'])):
+            damage_ten_units.append(damage['tenant_units'][str(tu)])
+            
+        damage['tenant_units'] = damage_ten_units  
+    
+    if type(damage['story']) == dict:
+        damage_story = []    
+        for s in range(len(damage['story'])):
+            damage_story.append(damage['story'][str(s)])
+        
+        damage['story'] = damage_story 
+    
+    if type(building_model['comps']['story']) == dict:
+        bldg_comps_story = []
+        for s in range(len(building_model['comps']['story'])):
+            bldg_comps_story.append(building_model['comps']['story'][str(s)])
+            
+        building_model['comps']['story'] = bldg_comps_story
+    
+    return simulated_inputs
+
+
+def fn_load_static_tables():
+    '''Load the static tables (systems, subsystems, impeding factor medians and
+    temporary repair classes) from the static_tables directory'''
+    
+    import os
+    import pandas as pd
+    
+    static_dir = os.path.join(os.path.dirname(__file__), 'static_tables')
+    static_tables = {'systems' : pd.read_csv(os.path.join(static_dir, 'systems.csv')),
+                     'subsystems' : pd.read_csv(os.path.join(static_dir, 'subsystems.csv')),
+                     'impeding_factor_medians' : pd.read_csv(os.path.join(static_dir, 'impeding_factors.csv')),
+                     'tmp_repair_class' : pd.read_csv(os.path.join(static_dir, 'temp_repair_class.csv'))}
+    
+    return static_tables
+
+
+def fn_arrays_to_lists(outputs):
+    '''Covert arrays to lists (in place), e.g. for writing outputs to json'''
+    
+    import numpy as np
+    
+    keys = range(len(outputs)) if type(outputs) == list else list(outputs.keys())
+    for key in keys:
+        if type(outputs[key]) == np.ndarray:
+            outputs[key] = outputs[key].tolist()
+        elif type(outputs[key]) == dict or type(outputs[key]) == list:
+            fn_arrays_to_lists(outputs[key])
+    
     
 if __name__ == '__main__':
 
@@ -0,0 +1,492 @@
+"""
+Long-lived (warm) recovery assessment server: static tables are loaded and
+packages imported once, recovery filters are compiled once per building
+model (keyed by a hash of the component damage state table), and jobs are
+accepted over a local socket, queued to a pool of worker processes, and
+their results streamed back as they complete (results that are never
+fetched are released after a time to live, or once too many finished jobs
+are kept, see fn_release_jobs). The client functions
+(fn_submit_job, fn_job_status, fn_stream_results, fn_server_status and
+fn_shutdown_server) talk to a running server.
+
+Messages are json objects, one per line, over a TCP socket bound to the local
+host. Requests have an 'action' ('submit', 'status', 'results',
+'server_status' or 'shutdown'); see fn_handle_request.
+"""
+import json
+import time
+import socket
+import threading
+
+# Static tables of each pool worker (see fn_init_server_worker)
+worker_state = {}
+
+
+def fn_model_hash(comp_ds_table):
+    '''Hash of the component damage state table of a building model, which
+    identifies the recovery filters compiled for the model
+
+    Parameters
+    ----------
+    comp_ds_table: DataFrame or dictionary
+      attributes of each component damage state
+
+    Returns
+    -------
+    model_hash: string
+      sha256 hex digest of the table'''
+
+    import hashlib
+    import pandas as pd
+
+    if isinstance(comp_ds_table, pd.DataFrame):
+        comp_ds_table = comp_ds_table.to_dict('list')
+    table_json = json.dumps({col : list(comp_ds_table[col]) for col in comp_ds_table.keys()}, sort_keys=True, default=str)
+
+    return hashlib.sha256(table_json.encode()).hexdigest()
+
+
+def fn_init_server_worker(static_tables):
+    '''Keep the static tables and import the assessment once per pool worker'''
+
+    import main_PBEE_recovery
+
+    worker_state['static_tables'] = static_tables
+
+
+def fn_run_server_job(simulated_inputs, model_filters, output_profile, seed):
+    '''Perform the recovery assessment of a job in a pool worker
+
+    Parameters
+    ----------
+    simulated_inputs: dictionary
+      simulated inputs of the building, as read from simulated_inputs.json
+
+    model_filters: dictionary
+      recovery filters compiled for the building model (see
+      preprocessing_fns.fn_compile_model_filters)
+
+    output_profile: string
+      optional override of functionality_options['output_profile']
+
+    seed: int
+      optional random seed of the assessment
+
+    Returns
+    -------
+    functionality: dictionary
+      main_PBEE_recovery outputs, with arrays converted to lists'''
+
+    import numpy as np
+    from main_PBEE_recovery import main_PBEE_recovery
+    from driver_PBEE_recovery import fn_format_simulated_inputs, fn_arrays_to_lists
+
+    simulated_inputs = fn_format_simulated_inputs(simulated_inputs)
+    damage = simulated_inputs['damage']
+    damage['model_filters'] = model_filters
+    functionality_options = simulated_inputs['functionality_options']
+    if output_profile != None:
+        functionality_options['output_profile'] = output_profile
+    static_tables = worker_state['static_tables']
+
+    if seed != None:
+        np.random.seed(seed)
+    functionality, _ = main_PBEE_recovery(damage, simulated_inputs['damage_consequences'],
+                                          simulated_inputs['building_model'], simulated_inputs['tenant_units'],
+                                          static_tables['systems'].copy(), static_tables['subsystems'].copy(),
+                                          static_tables['tmp_repair_class'].copy(), simulated_inputs['impedance_options'],
+                                          static_tables['impeding_factor_medians'].copy(), simulated_inputs['repair_time_options'],
+                                          simulated_inputs['functionality'], functionality_options)
+    fn_arrays_to_lists(functionality)
+
+    return functionality
+
+
+def fn_start_server(host = '127.0.0.1', port = 0, max_workers = None, max_models = 32,
+                    max_jobs = 1000, job_ttl = 3600):
+    '''Start an assessment server in background threads of this process
+
+    Parameters
+    ----------
+    host: string
+      local address to listen on
+
+    port: int
+      port to listen on (0 picks a free port)
+
+    max_workers: int
+      number of worker processes (default: number of CPUs)
+
+    max_models: int
+      number of building models whose compiled recovery filters are kept
+      (oldest dropped first)
+
+    max_jobs: int
+      number of finished jobs whose results are kept until they are fetched
+      (oldest dropped first). Queued and running jobs are always kept.
+
+    job_ttl: number
+      seconds the result of a finished job is kept if it is not fetched
+      (None keeps results until they are fetched or dropped by max_jobs)
+
+    Returns
+    -------
+    server: dictionary
+      server['address']: [host, port] the server listens on. Pass to the
+      client functions, or stop the server with fn_stop_server(server).'''
+
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    from driver_PBEE_recovery import fn_load_static_tables
+
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+    static_tables = fn_load_static_tables()
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen()
+
+    server = {'address' : list(listener.getsockname()[0:2]),
+              'listener' : listener,
+              'static_tables' : static_tables,
+              'executor' : ProcessPoolExecutor(max_workers = max_workers, initializer = fn_init_server_worker, initargs = (static_tables,)),
+              'num_workers' : max_workers,
+              'max_models' : max_models,
+              'model_filters' : {}, # compiled filters of each model hash, oldest first
+              'max_jobs' : max_jobs,
+              'job_ttl' : job_ttl,
+              'jobs' : {}, # future and model hash of each job id, oldest first
+              'next_job_id' : 1,
+              'lock' : threading.Lock(),
+              'stopped' : threading.Event()}
+
+    server['thread'] = threading.Thread(target = fn_accept_connections, args = (server,), daemon = True)
+    server['thread'].start()
+
+    return server
+
+
+def fn_stop_server(server):
+    '''Stop accepting connections and shut down the worker pool'''
+
+    server['stopped'].set()
+    server['listener'].close()
+    server['executor'].shutdown(wait = True, cancel_futures = True)
+
+
+def fn_serve_forever(host = '127.0.0.1', port = 8138, max_workers = None, max_models = 32,
+                     max_jobs = 1000, job_ttl = 3600):
+    '''Run an assessment server until it receives a shutdown request'''
+
+    server = fn_start_server(host, port, max_workers, max_models, max_jobs, job_ttl)
+    print('Recovery assessment server listening on ' + server['address'][0] + ':' + str(server['address'][1]))
+    server['stopped'].wait()
+    fn_stop_server(server)
+
+
+def fn_accept_connections(server):
+    '''Accept client connections, each handled in its own thread'''
+
+    while server['stopped'].is_set() == False:
+        try:
+            conn, _ = server['listener'].accept()
+        except OSError:
+            break # listener closed
+        threading.Thread(target = fn_handle_connection, args = (server, conn), daemon = True).start()
+
+
+def fn_handle_connection(server, conn):
+    '''Answer the requests of a client connection, one json message per line'''
+
+    with conn, conn.makefile('rwb') as stream:
+        for line in stream:
+            if line.strip() == b'':
+                continue
+            try:
+                request = json.loads(line)
+                for response in fn_handle_request(server, request):
+                    fn_send_message(stream, response)
+            except Exception as e:
+                fn_send_message(stream, {'status' : 'error', 'error' : str(e)})
+            except SystemExit as e:
+                fn_send_message(stream, {'status' : 'error', 'error' : str(e)})
+            if server['stopped'].is_set():
+                break
+
+
+def fn_handle_request(server, request):
+    '''Responses to a client request
+
+    Parameters
+    ----------
+    server: dictionary
+      output of fn_start_server
+
+    request: dictionary
+      request['action']:
+        'submit': queue an assessment of request['simulated_inputs'], with
+        optional request['output_profile'] and request['seed']. Responds
+        with the job id and model hash.
+        'status': status of request['job_id'] ('queued', 'running', 'done' or
+        'failed', or 'unknown' once its result is released)
+        'results': stream the result of each job of request['job_ids'] as it
+        completes (one response per job, in completion order). Delivered
+        results are released from the server, as are results never fetched
+        (see fn_release_jobs).
+        'server_status': number of workers, jobs and compiled models
+        'shutdown': stop the server
+
+    Returns
+    -------
+    responses: generator
+      response messages (dictionaries)'''
+
+    from concurrent.futures import as_completed
+
+    action = request['action'] if 'action' in request.keys() else None
+
+    if action == 'submit':
+        yield fn_submit(server, request)
+
+    elif action == 'status':
+        yield fn_status(server, request['job_id'])
+
+    elif action == 'results':
+        with server['lock']:
+            fn_release_jobs(server)
+            jobs = {server['jobs'][job_id]['future'] : [job_id, server['jobs'][job_id]]
+                    for job_id in request['job_ids'] if job_id in server['jobs'].keys()}
+        for job_id in request['job_ids']:
+            if job_id not in [job[0] for job in jobs.values()]:
+                yield {'job_id' : job_id, 'status' : 'unknown'}
+        for future in as_completed(jobs.keys()):
+            job_id, job = jobs[future]
+            response = fn_job_response(job_id, job)
+            if response['status'] == 'done':
+                response['functionality'] = future.result()
+            with server['lock']:
+                server['jobs'].pop(job_id, None)
+            yield response
+
+    elif action == 'server_status':
+        with server['lock']:
+            fn_release_jobs(server)
+            statuses = [fn_job_state(job['future']) for job in server['jobs'].values()]
+            yield {'status' : 'ok',
+                   'num_workers' : server['num_workers'],
+                   'num_jobs' : {state : statuses.count(state) for state in ['queued', 'running', 'done', 'failed']},
+                   'num_models' : len(server['model_filters'])}
+
+    elif action == 'shutdown':
+        yield {'status' : 'ok'}
+        server['stopped'].set()
+        server['listener'].close()
+
+    else:
+        yield {'status' : 'error', 'error' : 'unknown action ' + str(action)}
+
+
+def fn_submit(server, request):
+    '''Queue the assessment of a job to the worker pool, with the recovery
+    filters compiled once per building model'''
+
+    import copy
+    from preprocessing import preprocessing_fns
+
+    simulated_inputs = request['simulated_inputs']
+    comp_ds_table = simulated_inputs['damage']['comp_ds_table']
+    model_hash = fn_model_hash(comp_ds_table)
+
+    with server['lock']:
+        if model_hash in server['model_filters'].keys():
+            model_filters = server['model_filters'][model_hash]
+        else:
+            model_filters = None
+    if model_filters == None:
+        model_filters = preprocessing_fns.fn_compile_model_filters(copy.deepcopy(comp_ds_table))
+        with server['lock']:
+            server['model_filters'][model_hash] = model_filters
+            while len(server['model_filters']) > server['max_models']:
+                del server['model_filters'][next(iter(server['model_filters']))]
+
+    output_profile = request['output_profile'] if 'output_profile' in request.keys() else None
+    seed = request['seed'] if 'seed' in request.keys() else None
+
+    with server['lock']:
+        fn_release_jobs(server)
+        job_id = server['next_job_id']
+        server['next_job_id'] = job_id + 1
+        future = server['executor'].submit(fn_run_server_job, simulated_inputs, model_filters, output_profile, seed)
+        job = {'future' : future, 'model_hash' : model_hash, 'finished_time' : None}
+        server['jobs'][job_id] = job
+    future.add_done_callback(lambda future: job.update(finished_time = time.monotonic()))
+
+    return {'job_id' : job_id, 'status' : 'queued', 'model_hash' : model_hash}
+
+
+def fn_job_state(future):
+    '''State of the future of a job: 'queued', 'running', 'done' or 'failed' '''
+
+    if future.done() == False:
+        return 'running' if future.running() else 'queued'
+    if future.cancelled() or future.exception() != None:
+        return 'failed'
+    return 'done'
+
+
+def fn_release_jobs(server):
+    '''Release the results of finished jobs that were never fetched: jobs
+    finished more than server['job_ttl'] seconds ago, then the oldest
+    finished jobs beyond server['max_jobs'] (call with server['lock']
+    held)'''
+
+    finished = [job_id for job_id, job in server['jobs'].items() if job['finished_time'] != None]
+    if server['job_ttl'] != None:
+        expiry_time = time.monotonic() - server['job_ttl']
+        for job_id in [job_id for job_id in finished if server['jobs'][job_id]['finished_time'] < expiry_time]:
+            del server['jobs'][job_id]
+            finished.remove(job_id)
+    for job_id in finished[0:max(len(finished) - server['max_jobs'], 0)]:
+        del server['jobs'][job_id]
+
+
+def fn_status(server, job_id):
+    '''Status of a job (and its error, if it failed)'''
+
+    with server['lock']:
+        fn_release_jobs(server)
+        if job_id not in server['jobs'].keys():
+            return {'job_id' : job_id, 'status' : 'unknown'}
+        job = server['jobs'][job_id]
+
+    return fn_job_response(job_id, job)
+
+
+def fn_job_response(job_id, job):
+    '''Status response of a job (and its error, if it failed)'''
+
+    response = {'job_id' : job_id, 'status' : fn_job_state(job['future']), 'model_hash' : job['model_hash']}
+    if response['status'] == 'failed':
+        response['error'] = 'cancelled' if job['future'].cancelled() else str(job['future'].exception())
+
+    return response
+
+
+def fn_send_message(stream, message):
+    '''Write a json message (one line) to a socket stream'''
+
+    stream.write(json.dumps(message).encode() + b'\n')
+    stream.flush()
+
+
+def fn_client_request(address, request):
+    '''Send a request to an assessment server and yield its responses
+
+    Parameters
+    ----------
+    address: list
+      [host, port] of the server (server['address'])
+
+    request: dictionary
+      request message (see fn_handle_request)
+
+    Returns
+    -------
+    responses: generator
+      response messages (dictionaries)'''
+
+    num_responses = len(request['job_ids']) if request['action'] == 'results' else 1
+    with socket.create_connection(tuple(address)) as conn, conn.makefile('rwb') as stream:
+        fn_send_message(stream, request)
+        for _ in range(num_responses):
+            line = stream.readline()
+            if line == b'':
+                break # server closed the connection
+            response = json.loads(line)
+            yield response
+            if response['status'] == 'error':
+                break
+
+
+def fn_submit_job(address, simulated_inputs, output_profile = None, seed = None):
+    '''Submit a recovery assessment job to a server
+
+    Parameters
+    ----------
+    address: list
+      [host, port] of the server
+
+    simulated_inputs: dictionary
+      simulated inputs of the building, as read from simulated_inputs.json
+
+    output_profile: string
+      optional override of functionality_options['output_profile']
+
+    seed: int
+      optional random seed of the assessment
+
+    Returns
+    -------
+    job_id: int
+      id of the job on the server'''
+
+    import sys
+
+    request = {'action' : 'submit', 'simulated_inputs' : simulated_inputs}
+    if output_profile != None:
+        request['output_profile'] = output_profile
+    if seed != None:
+        request['seed'] = int(seed)
+    response = next(fn_client_request(address, request))
+    if response['status'] == 'error':
+        sys.exit('error! ' + response['error'])
+
+    return response['job_id']
+
+
+def fn_job_status(address, job_id):
+    '''Status of a job on a server ('queued', 'running', 'done', 'failed' or
+    'unknown')'''
+
+    return next(fn_client_request(address, {'action' : 'status', 'job_id' : job_id}))
+
+
+def fn_stream_results(address, job_ids):
+    '''Stream the results of jobs from a server as they complete
+
+    Parameters
+    ----------
+    address: list
+      [host, port] of the server
+
+    job_ids: list
+      ids of the jobs
+
+    Returns
+    -------
+    results: generator
+      one dictionary per job, in completion order: result['job_id'],
+      result['status'] ('done', 'failed' or 'unknown'), and the
+      main_PBEE_recovery outputs (result['functionality']) or error
+      (result['error'])'''
+
+    return fn_client_request(address, {'action' : 'results', 'job_ids' : list(job_ids)})
+
+
+def fn_server_status(address):
+    '''Number of workers, jobs and compiled building models of a server'''
+
+    return next(fn_client_request(address, {'action' : 'server_status'}))
+
+
+def fn_shutdown_server(address):
+    '''Ask a server to stop'''
+
+    return next(fn_client_request(address, {'action' : 'shutdown'}))
+
+
+if __name__ == '__main__':
+
+    fn_serve_forever()
@@ -0,0 +1,135 @@
+def fn_benchmark_inputs(systems, num_reals = 50000, num_comps = 60, seed = 0):
+    '''Synthetic inputs of the system repair schedule functions
+    (fn_set_repair_constraints, fn_prioritize_systems and
+    fn_allocate_workers_systems) for a large number of realizations
+
+    Returns
+    -------
+    inputs: dictionary
+      condition_tag, damage (component systems, function filters and tenant
+      unit damaged quantities), tmp_repair_complete_day, impeding_factors,
+      sys_repair_days, sys_crew_size, sys_impeding_factors and
+      max_workers_per_building'''
+
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    num_sys = len(systems)
+
+    comp_system = rng.integers(1, num_sys + 1, num_comps)
+    comp_system[0:3] = 0 # components without a repair system
+    damage = {'comp_ds_table' : {'system' : pd.Series(comp_system), 'comp_id' : pd.Series(np.arange(num_comps))},
+              'fnc_filters' : {'affects_reoccupancy' : rng.random(num_comps) < 0.5,
+                               'affects_function' : rng.random(num_comps) < 0.5},
+              'tenant_units' : [{'qnt_damaged' : (rng.random((num_reals, num_comps)) < 0.2) * 1.0} for tu in range(3)]}
+
+    tmp_repair_complete_day = rng.exponential(30, (num_reals, num_comps))
+    tmp_repair_complete_day[rng.random((num_reals, num_comps)) < 0.3] = np.inf # no temporary repair
+    tmp_repair_complete_day[rng.random((num_reals, num_comps)) < 0.3] = np.nan # undamaged
+
+    inputs = {'condition_tag' : rng.random(num_reals) < 0.3,
+              'damage' : damage,
+              'tmp_repair_complete_day' : tmp_repair_complete_day,
+              'impeding_factors' : {'time_sys' : rng.exponential(40, (num_reals, num_sys))},
+              'sys_repair_days' : rng.exponential(20, (num_reals, num_sys)) * (rng.random((num_reals, num_sys)) < 0.5),
+              'sys_crew_size' : np.round(rng.uniform(1, 12, (num_reals, num_sys))),
+              'sys_impeding_factors' : np.ceil(rng.exponential(50, (num_reals, num_sys))),
+              'max_workers_per_building' : 60}
+
+    return inputs
+
+
+def fn_output_hash(outputs):
+    '''Hash of the values of arrays (or lists and dictionaries of arrays), to compare
+    outputs of the benchmark across checkouts'''
+
+    import hashlib
+    import numpy as np
+
+    digest = hashlib.sha1()
+    def fn_update(value):
+        if isinstance(value, dict):
+            for key in sorted(value.keys()):
+                digest.update(str(key).encode())
+                fn_update(value[key])
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                fn_update(item)
+        else:
+            value = np.ascontiguousarray(value)
+            digest.update(str(value.dtype).encode() + str(value.shape).encode())
+            digest.update(value.tobytes())
+    fn_update(outputs)
+
+    return digest.hexdigest()[0:12]
+
+
+def fn_benchmark_repair_schedule(num_reals = 50000, num_repeats = 3, seed = 0):
+    '''Time the system repair schedule functions on synthetic inputs. The
+    inputs only depend on the seed, so the output hashes and timings can be
+    compared between checkouts (e.g. run this script in a worktree of an
+    earlier commit)
+
+    Parameters
+    ----------
+    num_reals: int
+      realizations of the synthetic inputs
+
+    num_repeats: int
+      runs of each function; the fastest is reported
+
+    seed: int
+      random seed of the inputs
+
+    Returns
+    -------
+    benchmark: dictionary
+      for fn_set_repair_constraints, fn_prioritize_systems and
+      fn_allocate_workers_systems, the fastest run time in seconds and the
+      hash of the outputs (fn_output_hash)'''
+
+    import os
+    import time
+    import copy
+    import pandas as pd
+    from repair_schedule import other_repair_schedule_functions
+
+    systems = pd.read_csv(os.path.join(os.path.dirname(__file__), 'static_tables', 'systems.csv'))
+    inputs = fn_benchmark_inputs(systems, num_reals = num_reals, seed = seed)
+
+    def fn_time(function, args):
+        run_times = []
+        for repeat in range(num_repeats):
+            run_args = copy.deepcopy(args)
+            start_time = time.perf_counter()
+            outputs = function(*run_args)
+            run_times.append(time.perf_counter() - start_time)
+        return {'time' : min(run_times), 'hash' : fn_output_hash(outputs)}, outputs
+
+    benchmark = {}
+    benchmark['fn_set_repair_constraints'], sys_constraint_matrix = fn_time(
+        other_repair_schedule_functions.fn_set_repair_constraints, [systems, 'full', inputs['condition_tag']])
+    benchmark['fn_prioritize_systems'], sys_idx_priority_matrix = fn_time(
+        other_repair_schedule_functions.fn_prioritize_systems, [systems, 'full', inputs['damage'],
+                                                                inputs['tmp_repair_complete_day'], inputs['impeding_factors']])
+    benchmark['fn_allocate_workers_systems'], allocation = fn_time(
+        other_repair_schedule_functions.fn_allocate_workers_systems, [systems, inputs['sys_repair_days'], inputs['sys_crew_size'],
+                                                                      inputs['max_workers_per_building'], sys_idx_priority_matrix,
+                                                                      sys_constraint_matrix, inputs['condition_tag'],
+                                                                      inputs['sys_impeding_factors']])
+
+    return benchmark
+
+
+if __name__ == '__main__':
+
+    import sys
+    import warnings
+    warnings.filterwarnings('ignore')
+
+    num_reals = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    benchmark = fn_benchmark_repair_schedule(num_reals = num_reals)
+    print('system repair schedule benchmark, ' + str(num_reals) + ' realizations')
+    for name in benchmark.keys():
+        print(name + ': ' + str(round(benchmark[name]['time'], 3)) + 's (outputs ' + benchmark[name]['hash'] + ')')
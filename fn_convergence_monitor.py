@@ -0,0 +1,284 @@
+"""
+Streaming recovery assessment with early stopping: realizations are assessed
+in blocks, online estimates of the building level reoccupancy and functional
+recovery percentiles and probabilities of exceeding the performance targets
+are updated after each block with their confidence intervals, and the
+assessment stops once the requested precision is reached, reporting how many
+realizations were needed
+"""
+import numpy as np
+
+import fn_out_of_core
+
+
+def fn_default_convergence_options(convergence_options = None):
+    '''Fill in the default convergence options
+
+    Parameters
+    ----------
+    convergence_options: dictionary
+      optional changes of the defaults:
+      'percentiles': percentiles of the building level recovery day to
+      monitor (default [10, 50, 90]);
+      'confidence': confidence level of the intervals (default 0.95);
+      'relative_precision': largest half width of the percentile intervals,
+      relative to the percentile (default 0.05);
+      'absolute_precision_days': half width of the percentile intervals
+      accepted regardless of the relative precision, e.g. for percentiles
+      near zero days (default 1);
+      'prob_precision': largest half width of the intervals of the
+      probabilities of exceeding the performance targets (default 0.02);
+      'block_size': realizations assessed between convergence checks
+      (default 100);
+      'min_reals': fewest realizations assessed before stopping (default 200)
+
+    Returns
+    -------
+    convergence_options: dictionary
+      the options, with the defaults of unspecified options'''
+
+    options = {'percentiles' : [10, 50, 90],
+               'confidence' : 0.95,
+               'relative_precision' : 0.05,
+               'absolute_precision_days' : 1,
+               'prob_precision' : 0.02,
+               'block_size' : 100,
+               'min_reals' : 200}
+    if convergence_options != None:
+        options.update(convergence_options)
+
+    return options
+
+
+def fn_percentile_interval(values, percentile, confidence):
+    '''Percentile of simulated values with a distribution-free confidence
+    interval from the order statistics (normal approximation of the binomial
+    ranks)
+
+    Parameters
+    ----------
+    values: array [num reals]
+      simulated values (NaNs are ignored)
+
+    percentile: number
+      percentile (0 to 100)
+
+    confidence: number
+      confidence level of the interval
+
+    Returns
+    -------
+    interval: dictionary
+      estimate, lower and upper bounds of the percentile'''
+
+    from scipy.stats import norm
+
+    values = np.sort(np.array(values, dtype=float)[np.isfinite(values)])
+    num_reals = len(values)
+    if num_reals == 0:
+        return {'estimate' : np.nan, 'lower' : np.nan, 'upper' : np.nan}
+
+    p = percentile / 100
+    z = norm.ppf(0.5 + confidence / 2)
+    rank_spread = z * np.sqrt(num_reals * p * (1 - p))
+    lower_rank = int(np.clip(np.floor(num_reals * p - rank_spread), 1, num_reals))
+    upper_rank = int(np.clip(np.ceil(num_reals * p + rank_spread) + 1, 1, num_reals))
+
+    return {'estimate' : np.quantile(values, p),
+            'lower' : values[lower_rank - 1],
+            'upper' : values[upper_rank - 1]}
+
+
+def fn_proportion_interval(prob, num_reals, confidence):
+    '''Wilson score confidence interval of fractions of realizations (e.g.
+    probabilities of exceeding the performance targets), which does not
+    collapse to zero width for fractions of 0 or 1
+
+    Returns
+    -------
+    lower, upper: array
+      bounds of each fraction'''
+
+    from scipy.stats import norm
+
+    prob = np.array(prob, dtype=float)
+    z = norm.ppf(0.5 + confidence / 2)
+    center = (prob + z**2 / (2 * num_reals)) / (1 + z**2 / num_reals)
+    half_width = z / (1 + z**2 / num_reals) * np.sqrt(prob * (1 - prob) / num_reals + z**2 / (4 * num_reals**2))
+
+    return np.maximum(center - half_width, 0), np.minimum(center + half_width, 1)
+
+
+def fn_recovery_statistics(recovery_days, convergence_options):
+    '''Estimates and confidence intervals of the monitored recovery statistics
+
+    Parameters
+    ----------
+    recovery_days: dictionary
+      building level recovery day of each realization assessed so far, by
+      recovery state (reoccupancy, functional)
+
+    convergence_options: dictionary
+      output of fn_default_convergence_options
+
+    Returns
+    -------
+    statistics: dictionary
+      statistics[state]['percentiles'][percentile]: fn_percentile_interval;
+      statistics[state]['prob_of_target']: performance target days, and
+      estimate, lower and upper bounds of the probability of exceeding each
+      target day
+
+    is_converged: logical
+      true if all intervals are within the requested precision'''
+
+    from functionality import other_functionality_functions
+
+    confidence = convergence_options['confidence']
+    statistics = {}
+    is_converged = True
+    for state in recovery_days.keys():
+        days = recovery_days[state]
+        num_reals = len(days)
+
+        percentiles = {}
+        for percentile in convergence_options['percentiles']:
+            interval = fn_percentile_interval(days, percentile, confidence)
+            half_width = (interval['upper'] - interval['lower']) / 2
+            precision = max(convergence_options['relative_precision'] * abs(interval['estimate']),
+                            convergence_options['absolute_precision_days'])
+            if np.isnan(half_width) or half_width > precision:
+                is_converged = False
+            percentiles[percentile] = interval
+
+        # Same targets and exceedance probabilities as the functionality outputs
+        perform_targ_days = other_functionality_functions.fn_performance_target_days(np.nanmax(days, initial=0))
+        prob = other_functionality_functions.fn_exceedance_probability(np.reshape(days, (num_reals, 1)), perform_targ_days)[0,:]
+        lower, upper = fn_proportion_interval(prob, num_reals, confidence)
+        if np.any((upper - lower) / 2 > convergence_options['prob_precision']):
+            is_converged = False
+
+        statistics[state] = {'percentiles' : percentiles,
+                             'prob_of_target' : {'perform_targ_days' : perform_targ_days,
+                                                 'estimate' : prob,
+                                                 'lower' : lower,
+                                                 'upper' : upper}}
+
+    return statistics, is_converged
+
+
+def fn_truncate_results(outputs, num_reals):
+    '''Rewrite the memory-mapped per realization result files with only the
+    realizations assessed, and reopen them read-only (outputs updated in
+    place)'''
+
+    import os
+    from numpy.lib.format import open_memmap
+
+    for key in list(outputs.keys()):
+        if isinstance(outputs[key], dict):
+            fn_truncate_results(outputs[key], num_reals)
+        elif isinstance(outputs[key], np.memmap) and len(outputs[key]) > num_reals:
+            file_path = outputs[key].filename
+            old_path = file_path[:-4] + '_old.npy'
+            outputs[key].flush()
+            del outputs[key]
+            os.replace(file_path, old_path)
+            old_values = np.load(old_path, mmap_mode='r')
+            values = open_memmap(file_path, mode='w+', dtype=old_values.dtype, shape=(num_reals,) + np.shape(old_values)[1:])
+            for row in range(0, num_reals, 4096):
+                values[row:min(row+4096, num_reals)] = old_values[row:min(row+4096, num_reals)]
+            values.flush()
+            del values, old_values
+            os.remove(old_path)
+            outputs[key] = np.load(file_path, mmap_mode='r')
+
+    return outputs
+
+
+def fn_run_until_converged(damage, damage_consequences, building_model,
+                           tenant_units, systems, subsystems,
+                           tmp_repair_class, impedance_options,
+                           impeding_factor_medians, repair_time_options,
+                           functionality, functionality_options,
+                           results_dir, convergence_options = None):
+    '''Assess blocks of realizations until the recovery statistics converge
+
+    Parameters
+    ----------
+    damage, damage_consequences, building_model, tenant_units, systems,
+    subsystems, tmp_repair_class, impedance_options, impeding_factor_medians,
+    repair_time_options, functionality, functionality_options:
+      inputs of main_PBEE_recovery. The damage arrays can be memory maps (see
+      fn_out_of_core.fn_damage_memmap). Realizations are assessed in order,
+      so they should be independent draws.
+
+    results_dir: string
+      directory of the .npy result files
+
+    convergence_options: dictionary
+      requested precision and block size (see fn_default_convergence_options)
+
+    Returns
+    -------
+    functionality: dictionary
+      main_PBEE_recovery outputs of the realizations assessed. Per
+      realization outputs are read-only memory maps [num reals assessed x
+      ...]; aggregates and the statistics of the summary output profile are
+      combined across the assessed blocks, with the same schema as a single
+      run (see fn_out_of_core.fn_combine_block_aggregates; realization
+      indices of the worker allocation convergence diagnostics refer to all
+      realizations). functionality['recovery_convergence']: 'converged' (whether the
+      requested precision was reached before running out of realizations),
+      'num_reals_assessed', 'num_reals_available', the final statistics
+      (see fn_recovery_statistics) and 'history': number of realizations
+      and convergence after each block.'''
+
+    import os
+    import copy
+
+    convergence_options = fn_default_convergence_options(convergence_options)
+    if os.path.exists(results_dir) == False:
+        os.makedirs(results_dir)
+
+    num_reals = len(damage_consequences['simulated_replacement_time'])
+    blocks = fn_out_of_core.fn_realization_blocks(num_reals, int(convergence_options['block_size']))
+
+    outputs = {}
+    block_recovery_days = []
+    history = []
+    for start, stop in blocks:
+        block_damage, block_damage_consequences, block_functionality = fn_out_of_core.fn_slice_realizations(damage, damage_consequences, functionality, start, stop)
+        block_outputs, block_days = fn_out_of_core.fn_assess_realizations(block_damage, block_damage_consequences,
+                                                                          copy.deepcopy(building_model), copy.deepcopy(tenant_units),
+                                                                          systems.copy(), subsystems.copy(), tmp_repair_class.copy(),
+                                                                          copy.deepcopy(impedance_options), impeding_factor_medians.copy(),
+                                                                          copy.deepcopy(repair_time_options), block_functionality,
+                                                                          copy.deepcopy(functionality_options))
+
+        # Online statistics of the building level recovery days
+        block_recovery_days.append(block_days)
+        recovery_days = fn_out_of_core.fn_concatenate_recovery_days(block_recovery_days)
+        statistics, is_converged = fn_recovery_statistics(recovery_days, convergence_options)
+        history.append({'num_reals' : stop, 'converged' : is_converged})
+
+        fn_out_of_core.fn_write_block_outputs(block_outputs, outputs, start, stop, num_reals, results_dir)
+        del block_damage, block_damage_consequences, block_functionality, block_outputs
+
+        if is_converged and stop >= convergence_options['min_reals']:
+            break
+
+    num_reals_assessed = history[-1]['num_reals']
+    assessed_blocks = blocks[0:len(history)]
+    fn_out_of_core.fn_combine_block_aggregates(outputs, [stop - start for start, stop in assessed_blocks])
+    outputs = fn_out_of_core.fn_reopen_results(fn_truncate_results(outputs, num_reals_assessed))
+    fn_out_of_core.fn_building_performance_targets(outputs, recovery_days)
+
+    outputs['recovery_convergence'] = {'converged' : is_converged and num_reals_assessed >= convergence_options['min_reals'],
+                                       'num_reals_assessed' : num_reals_assessed,
+                                       'num_reals_available' : num_reals,
+                                       'convergence_options' : convergence_options,
+                                       'statistics' : statistics,
+                                       'history' : history}
+
+    return outputs
@@ -0,0 +1,133 @@
+def fn_estimate_memory(building_model, tenant_units, comp_ds_table, num_systems = 11, precision = 'float64'):
+    '''Estimate the memory of the recovery assessment per realization from
+    the dimensions of the building model, before running it
+
+    Parameters
+    ----------
+    building_model: dictionary
+      general attributes of the building model (num_stories)
+
+    tenant_units: DataFrame or dictionary
+      attributes of each tenant unit within the building
+
+    comp_ds_table: DataFrame or dictionary
+      attributes of each component damage state (one row per column of the
+      simulated damage arrays)
+
+    num_systems: int
+      number of repair systems (rows of static_tables/systems.csv)
+
+    precision: string
+      'float64' or 'float32' (see preprocessing_fns.fn_set_precision)
+
+    Returns
+    -------
+    estimate: dictionary
+      estimate['bytes_per_realization']: approximate peak bytes per
+      realization
+      estimate['breakdown']: bytes per realization of the damage inputs,
+      component breakdowns, component arrays, repair schedule and worker
+      timelines
+      estimate['base_mb']: memory independent of the number of realizations
+      (static tables, imported packages)
+
+    Notes
+    -----
+    The component breakdowns of the reoccupancy and function checks (about
+    32 [num comp_ds x num tenant units] arrays per realization alive at once)
+    dominate for large models. Calibrated against the peak traced memory of
+    the example models, rounded up.'''
+
+    import numpy as np
+
+    num_stories = int(building_model['num_stories'])
+    num_units = len(tenant_units['id'])
+    num_comp_ds = len(comp_ds_table['comp_id'])
+    itemsize = 4 if precision == 'float32' else 8
+
+    breakdown = {
+        # qnt_damaged, worker_days and tmp_worker_day of each tenant unit, and
+        # directional damage of each story
+        'damage_inputs' : 8 * num_comp_ds * (3 * num_units + 3 * num_stories),
+        # [num comp_ds x num tenant units] checks of each realization
+        'comp_breakdowns' : itemsize * 32 * num_comp_ds * num_units,
+        # per component damage state arrays (filters, red tag impact,
+        # component breakdowns of all realizations)
+        'comp_arrays' : 8 * 16 * num_comp_ds,
+        # compact and gantt chart repair schedules (full and temp repairs)
+        'repair_schedule' : itemsize * 8 * num_systems * (num_stories + 1),
+        # worker allocation timelines (about one step per system and story)
+        'worker_timelines' : 8 * 4 * num_systems * num_stories
+        }
+
+    estimate = {'bytes_per_realization' : int(np.sum(list(breakdown.values()))),
+                'breakdown' : breakdown,
+                'base_mb' : 50}
+
+    return estimate
+
+
+def fn_plan_chunks(num_reals, memory_limit_mb, estimate, max_workers = None, min_chunk_size = 100):
+    '''Pick the realization chunk size and number of workers that fit a
+    memory limit
+
+    Parameters
+    ----------
+    num_reals: int
+      number of realizations
+
+    memory_limit_mb: number
+      memory available to the assessment (MB), shared by all workers
+
+    estimate: dictionary
+      output of fn_estimate_memory
+
+    max_workers: int
+      largest number of worker processes (default: number of CPUs). Use 1 to
+      assess the chunks one after the other.
+
+    min_chunk_size: int
+      smallest chunk worth giving to a worker (vectorized stages are
+      inefficient for very few realizations)
+
+    Returns
+    -------
+    plan: dictionary
+      plan['chunk_size']: realizations per chunk
+      plan['num_chunks']: number of chunks
+      plan['num_workers']: number of workers assessing chunks at once
+      plan['peak_mb']: estimated peak memory of the plan (MB)
+      plan['single_pass_mb']: estimated memory to assess all realizations at
+      once (MB)
+      plan['estimate']: the memory estimate used'''
+
+    import os
+    import sys
+    import numpy as np
+
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+    bytes_per_realization = estimate['bytes_per_realization']
+    base_bytes = estimate['base_mb'] * 1e6
+
+    # Use as many workers as there are full chunks of work and memory for
+    num_workers = int(max(min(max_workers, np.ceil(num_reals / min_chunk_size)), 1))
+    while num_workers > 1 and memory_limit_mb * 1e6 / num_workers - base_bytes < min(min_chunk_size, num_reals) * bytes_per_realization:
+        num_workers = num_workers - 1
+
+    # Largest chunks that fit the memory of each worker
+    max_chunk_size = int(np.floor((memory_limit_mb * 1e6 / num_workers - base_bytes) / bytes_per_realization))
+    if max_chunk_size < 1:
+        sys.exit('error! memory limit of ' + str(memory_limit_mb) + ' MB is too small for a single realization (about '
+                 + str(round((base_bytes + bytes_per_realization) / 1e6, 1)) + ' MB)')
+    chunk_size = int(min(max_chunk_size, np.ceil(num_reals / num_workers)))
+    num_chunks = int(np.ceil(num_reals / chunk_size))
+
+    plan = {'chunk_size' : chunk_size,
+            'num_chunks' : num_chunks,
+            'num_workers' : int(min(num_workers, num_chunks)),
+            'peak_mb' : min(num_workers, num_chunks) * (base_bytes + chunk_size * bytes_per_realization) / 1e6,
+            'single_pass_mb' : (base_bytes + num_reals * bytes_per_realization) / 1e6,
+            'estimate' : estimate}
+
+    return plan
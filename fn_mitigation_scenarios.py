@@ -0,0 +1,270 @@
+"""
+Mitigation scenario sweeps: many impedance_options / repair_time_options
+variants (e.g. engineer on retainer, contractor relationship, funding source,
+capital available, shoring) assessed against one preprocessed damage set,
+with common random numbers across scenarios and scenarios run in parallel.
+Each stage draws from its own random stream seeded from the sweep seed and
+the stage name, so realization i of every scenario sees the same damage and
+the same impeding factor draws, and the difference between two scenarios is
+due to the mitigation alone (paired comparison, see fn_compare_scenarios).
+"""
+import copy
+import numpy as np
+
+import fn_stage_cache
+import fn_recovery_dag
+
+# Base inputs and shared upstream stages inherited by each pool worker (see fn_init_scenario_worker)
+worker_state = {}
+
+# Preprocessed once in the parent and shared by the scenarios
+shared_stage_names = ['preprocessing', 'red_tag']
+
+scenario_input_names = ['impedance_options', 'repair_time_options', 'functionality_options']
+
+
+def fn_update_nested(options, changes):
+    '''Update a dictionary of options with changes, merging nested
+    dictionaries (e.g. {'mitigation' : {'funding_source' : 'sba'}} changes
+    only the funding source of the mitigation options)'''
+
+    for key in changes.keys():
+        if isinstance(changes[key], dict) and key in options.keys() and isinstance(options[key], dict):
+            fn_update_nested(options[key], changes[key])
+        else:
+            options[key] = copy.deepcopy(changes[key])
+
+    return options
+
+
+def fn_scenario_inputs(inputs, scenario):
+    '''Inputs of main_PBEE_recovery for a scenario: the base inputs with the
+    option changes of the scenario (the base inputs are not modified)'''
+
+    import sys
+
+    scenario_inputs = dict(inputs)
+    for name in scenario.keys():
+        if name == 'name':
+            continue
+        if name not in scenario_input_names:
+            sys.exit('error! scenarios can only change ' + ', '.join(scenario_input_names) + ', not ' + str(name))
+        scenario_inputs[name] = fn_update_nested(copy.deepcopy(inputs[name]), scenario[name])
+
+    return scenario_inputs
+
+
+def fn_recovery_days(recovery):
+    '''Building level recovery day of each realization, for reoccupancy and
+    function'''
+
+    return {state : np.array(recovery[state]['building_level']['recovery_day'], dtype=float)
+            for state in recovery.keys()}
+
+
+def fn_run_scenario(inputs, scenario, stage_cache, input_keys, seed):
+    '''Assess one scenario
+
+    Returns
+    -------
+    outputs: dictionary
+      main_PBEE_recovery functionality outputs of the scenario, reduced to its
+      output profile
+
+    recovery_days: dictionary
+      building level recovery day of each realization, by recovery state
+
+    evaluated_stages: list
+      stages evaluated (rather than shared with the other scenarios)'''
+
+    from fn_output_profile import fn_check_output_profile, fn_apply_output_profile
+
+    scenario_inputs = fn_scenario_inputs(inputs, scenario)
+    output_profile = fn_check_output_profile(scenario_inputs['functionality_options']['output_profile']
+                                             if 'output_profile' in scenario_inputs['functionality_options'].keys() else 'full')
+
+    state = fn_recovery_dag.fn_run_recovery_dag(scenario_inputs, stage_cache, input_keys,
+                                                copy_inputs = True, stage_seed = seed)
+
+    outputs = copy.deepcopy(inputs['functionality'])
+    for key in ['impeding_factors', 'worker_data', 'building_repair_schedule', 'recovery']:
+        outputs[key] = state[key]
+    recovery_days = fn_recovery_days(state['recovery'])
+
+    return fn_apply_output_profile(outputs, output_profile), recovery_days, state['evaluated_stages']
+
+
+def fn_init_scenario_worker(inputs, shared_entries, input_keys, seed):
+    '''Keep the base inputs and the cached upstream stages in each pool
+    worker (inherited rather than pickled when workers are forked)'''
+
+    worker_state['inputs'] = inputs
+    worker_state['shared_entries'] = shared_entries
+    worker_state['input_keys'] = input_keys
+    worker_state['seed'] = seed
+
+
+def fn_assess_scenario(task):
+    '''Assess a scenario in a pool worker
+
+    Parameters
+    ----------
+    task: list
+      [index, scenario]: index of the scenario in the sweep and its option
+      changes
+
+    Returns
+    -------
+    index: int
+      index of the scenario
+
+    outputs, recovery_days, evaluated_stages:
+      outputs of fn_run_scenario'''
+
+    from collections import OrderedDict
+
+    index, scenario = task
+
+    # Scenario stages are cached only for the duration of the task, the shared stages persist
+    stage_cache = fn_stage_cache.fn_create_stage_cache(max_size_mb = np.inf)
+    stage_cache['entries'] = OrderedDict(worker_state['shared_entries'])
+
+    outputs, recovery_days, evaluated_stages = fn_run_scenario(worker_state['inputs'], scenario, stage_cache,
+                                                               worker_state['input_keys'], worker_state['seed'])
+
+    return index, outputs, recovery_days, evaluated_stages
+
+
+def fn_compare_scenarios(recovery_days, names, baseline = 0):
+    '''Paired comparison of scenarios against a baseline scenario
+
+    Parameters
+    ----------
+    recovery_days: list
+      building level recovery days of each scenario (fn_recovery_days),
+      assessed with common random numbers
+
+    names: list
+      name of each scenario
+
+    baseline: int
+      index of the baseline scenario
+
+    Returns
+    -------
+    comparison: dictionary
+      comparison[scenario name][recovery state]: mean recovery day of the
+      scenario, mean paired difference from the baseline (negative is faster
+      recovery), standard error of the mean difference, and fraction of
+      realizations that recover faster, slower or the same as the baseline'''
+
+    comparison = {}
+    for name, scenario_days in zip(names, recovery_days):
+        comparison[name] = {}
+        for state in scenario_days.keys():
+            difference = scenario_days[state] - recovery_days[baseline][state]
+            num_reals = np.sum(np.isfinite(difference))
+            comparison[name][state] = {
+                'mean' : np.nanmean(scenario_days[state]),
+                'mean_difference' : np.nanmean(difference),
+                'std_error_difference' : np.nanstd(difference, ddof=1) / np.sqrt(num_reals) if num_reals > 1 else np.nan,
+                'fraction_faster' : np.sum(difference < 0) / num_reals,
+                'fraction_slower' : np.sum(difference > 0) / num_reals,
+                'fraction_same' : np.sum(difference == 0) / num_reals
+                }
+
+    return comparison
+
+
+def fn_run_mitigation_scenarios(damage, damage_consequences, building_model,
+                                tenant_units, systems, subsystems, tmp_repair_class,
+                                impedance_options, impeding_factor_medians,
+                                repair_time_options, functionality,
+                                functionality_options, scenarios, seed = 0,
+                                max_workers = None, baseline = 0):
+    '''Assess mitigation scenarios with common random numbers, in parallel
+
+    Parameters
+    ----------
+    damage, damage_consequences, building_model, tenant_units, systems,
+    subsystems, tmp_repair_class, impedance_options, impeding_factor_medians,
+    repair_time_options, functionality, functionality_options:
+      base inputs of main_PBEE_recovery (not modified)
+
+    scenarios: list
+      option changes of each scenario relative to the base inputs, by input
+      name (impedance_options, repair_time_options or functionality_options),
+      with an optional scenario name, e.g.
+      [{'name' : 'as is'},
+       {'name' : 'retainer', 'impedance_options' : {'mitigation' : {'is_engineer_on_retainer' : True,
+                                                                    'contractor_relationship' : 'retainer'}}},
+       {'name' : 'sba', 'impedance_options' : {'mitigation' : {'funding_source' : 'sba'}}}]
+      Nested dictionaries are merged.
+
+    seed: int
+      seed of the random streams shared by all scenarios
+
+    max_workers: int
+      largest number of scenarios assessed at once (default: number of CPUs).
+      With one worker, scenarios are assessed in this process.
+
+    baseline: int
+      index of the scenario the others are compared against
+
+    Returns
+    -------
+    results: list
+      main_PBEE_recovery functionality outputs of each scenario
+
+    comparison: dictionary
+      paired comparison of each scenario with the baseline, by scenario
+      name (see fn_compare_scenarios)'''
+
+    import os
+    import sys
+    import multiprocessing
+
+    if len(scenarios) == 0:
+        sys.exit('error! no mitigation scenarios to assess')
+    if baseline < 0 or baseline >= len(scenarios):
+        sys.exit('error! baseline must be the index of one of the ' + str(len(scenarios)) + ' scenarios')
+
+    names = [scenario['name'] if 'name' in scenario.keys() else 'scenario_' + str(i)
+             for i, scenario in enumerate(scenarios)]
+    if len(set(names)) < len(names):
+        sys.exit('error! mitigation scenario names must be unique')
+
+    inputs = {'damage' : damage, 'damage_consequences' : damage_consequences, 'building_model' : building_model,
+              'tenant_units' : tenant_units, 'systems' : systems, 'subsystems' : subsystems,
+              'tmp_repair_class' : tmp_repair_class, 'impedance_options' : impedance_options,
+              'impeding_factor_medians' : impeding_factor_medians, 'repair_time_options' : repair_time_options,
+              'functionality' : functionality, 'functionality_options' : functionality_options}
+    input_keys = {'damage' : fn_stage_cache.fn_content_hash(damage)}
+
+    ## Preprocess the damage once for all scenarios
+    # Scenarios that change the preprocessing options (e.g. allow_shoring) re-evaluate it, with the same random stream
+    shared_cache = fn_stage_cache.fn_create_stage_cache(max_size_mb = np.inf)
+    shared_stages = [stage for stage in fn_recovery_dag.recovery_stages if stage['name'] in shared_stage_names]
+    fn_recovery_dag.fn_run_recovery_dag(inputs, shared_cache, input_keys, copy_inputs = True,
+                                        stages = shared_stages, stage_seed = seed)
+    shared_entries = shared_cache['entries']
+
+    ## Assess the scenarios
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+    num_workers = int(max(min(max_workers, len(scenarios)), 1))
+    tasks = [[i, scenario] for i, scenario in enumerate(scenarios)]
+    if num_workers == 1:
+        fn_init_scenario_worker(inputs, shared_entries, input_keys, seed)
+        scenario_results = [fn_assess_scenario(task) for task in tasks]
+        worker_state.clear()
+    else:
+        with multiprocessing.Pool(processes = num_workers, initializer = fn_init_scenario_worker,
+                                  initargs = (inputs, shared_entries, input_keys, seed)) as pool:
+            scenario_results = pool.map(fn_assess_scenario, tasks, chunksize = 1)
+
+    scenario_results.sort(key = lambda result: result[0])
+    results = [result[1] for result in scenario_results]
+    comparison = fn_compare_scenarios([result[2] for result in scenario_results], names, baseline)
+
+    return results, comparison
@@ -0,0 +1,787 @@
+"""
+Out-of-core recovery assessment: damage inputs stored in memory-mapped .npy
+files, and realizations assessed in blocks sized to a memory budget, with the
+per realization outputs written block by block to memory-mapped result
+arrays
+"""
+import os
+import numpy as np
+
+import fn_output_profile
+
+# Per realization damage arrays of each tenant unit and story
+tenant_unit_damage_keys = ['qnt_damaged', 'worker_days', 'tmp_worker_day',
+                           'qnt_damaged_side_1', 'qnt_damaged_side_2',
+                           'qnt_damaged_side_3', 'qnt_damaged_side_4']
+story_damage_keys = ['qnt_damaged_dir_1', 'qnt_damaged_dir_2', 'qnt_damaged_dir_3']
+
+# Outputs that summarize all realizations of a block (fractions of
+# realizations, statistics, labels and diagnostics)
+aggregate_keys = ['perform_targ_days', 'prob_of_target', 'percent_recovered',
+                  'system_breakdowns', 'component_breakdowns', 'system_names',
+                  'comp_names', 'component_names', 'partial', 'convergence']
+
+# Aggregates that are fractions of realizations (combined as weighted means)
+fraction_keys = ['prob_of_target', 'system_breakdowns', 'component_breakdowns', 'component_combined']
+
+
+def fn_damage_memmap(damage, memmap_dir):
+    '''Store the per realization damage arrays in .npy files and replace them
+    with read-only memory maps
+
+    Parameters
+    ----------
+    damage: dictionary
+      contains simulated damage info. Damage arrays already written to
+      memmap_dir (e.g. by fn_convert_simulated_inputs) are provided as None.
+      Only the arrays of the keys present in damage are loaded, so files of
+      other inputs left in memmap_dir are never used.
+
+    memmap_dir: string
+      directory of the .npy damage files
+
+    Returns
+    -------
+    damage: dictionary
+      contains simulated damage info, with the per realization damage of each
+      tenant unit and story as read-only memory maps'''
+
+    import sys
+
+    if os.path.exists(memmap_dir) == False:
+        os.makedirs(memmap_dir)
+
+    for group, keys in [['tenant_units', tenant_unit_damage_keys], ['story', story_damage_keys]]:
+        if group not in damage.keys():
+            continue
+        for i in range(len(damage[group])):
+            for key in keys:
+                if key not in damage[group][i].keys():
+                    continue
+                file_path = os.path.join(memmap_dir, group + '_' + str(i) + '_' + key + '.npy')
+                if damage[group][i][key] is not None and isinstance(damage[group][i][key], np.memmap) == False:
+                    np.save(file_path, np.array(damage[group][i][key], dtype=float))
+                    damage[group][i][key] = None # release the in-memory copy
+                if os.path.exists(file_path) == False:
+                    sys.exit('error! damage array ' + group + ' ' + str(i) + ' ' + key + ' not found in ' + memmap_dir)
+                damage[group][i][key] = np.load(file_path, mmap_mode='r')
+
+    return damage
+
+
+def fn_file_content_key(file_path):
+    '''Hash (hex digest) of the content of a file, read in blocks'''
+
+    import hashlib
+
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            hasher.update(block)
+
+    return hasher.hexdigest()
+
+
+def fn_convert_simulated_inputs(input_path, memmap_root):
+    '''Convert a simulated_inputs.json file once into memory-mapped damage
+    arrays, streaming the damage realization by realization so the json
+    damage lists are never held in memory
+
+    Parameters
+    ----------
+    input_path: string
+      path of simulated_inputs.json
+
+    memmap_root: string
+      directory of the converted inputs. Each inputs file is converted into a
+      subdirectory named by the hash of its content, so later runs of the
+      same inputs skip the conversion and changed inputs never reuse the
+      files of earlier inputs.
+
+    Returns
+    -------
+    memmap_dir: string
+      directory of the .npy damage files (see fn_damage_memmap) and of a
+      simulated_inputs.json of the other inputs, with the damage arrays
+      replaced by None'''
+
+    import json
+    import shutil
+
+    memmap_dir = os.path.join(memmap_root, fn_file_content_key(input_path)[0:16])
+    small_input_path = os.path.join(memmap_dir, 'simulated_inputs.json')
+    if os.path.exists(small_input_path):
+        return memmap_dir # converted by a previous run
+    if os.path.exists(memmap_dir):
+        shutil.rmtree(memmap_dir) # partially converted
+    os.makedirs(memmap_dir)
+
+    with open(input_path) as f:
+        reader = {'file' : f, 'buffer' : '', 'pos' : 0, 'eof' : False}
+        simulated_inputs = {}
+        for key in fn_stream_object_keys(reader):
+            if key == 'damage':
+                simulated_inputs[key] = fn_stream_damage(reader, memmap_dir)
+            else:
+                simulated_inputs[key] = fn_stream_value(reader)
+
+    # Written last: marks the conversion as complete
+    tmp_path = small_input_path + '.tmp'
+    with open(tmp_path, 'w') as outfile:
+        outfile.write(json.dumps(simulated_inputs))
+    os.replace(tmp_path, small_input_path)
+
+    return memmap_dir
+
+
+def fn_stream_damage(reader, memmap_dir):
+    '''Read the damage object of a streamed inputs file, writing the per
+    realization damage arrays of each tenant unit and story to .npy files'''
+
+    damage = {}
+    for key in fn_stream_object_keys(reader):
+        if key in ['tenant_units', 'story']:
+            array_keys = tenant_unit_damage_keys if key == 'tenant_units' else story_damage_keys
+            # Indexed by story as a dictionary ({"0" : ...}) or a list
+            is_dict = fn_stream_peek(reader) == '{'
+            items = fn_stream_object_keys(reader) if is_dict else fn_stream_array_items(reader)
+            units = {}
+            for i, unit_key in enumerate(items):
+                unit_id = int(unit_key) if is_dict else i
+                unit = {}
+                for unit_data_key in fn_stream_object_keys(reader):
+                    if unit_data_key in array_keys:
+                        file_path = os.path.join(memmap_dir, key + '_' + str(unit_id) + '_' + unit_data_key + '.npy')
+                        fn_stream_array_to_npy(reader, file_path)
+                        unit[unit_data_key] = None
+                    else:
+                        unit[unit_data_key] = fn_stream_value(reader)
+                units[str(unit_id)] = unit
+            damage[key] = units if is_dict else [units[str(i)] for i in range(len(units))]
+        else:
+            damage[key] = fn_stream_value(reader)
+
+    return damage
+
+
+def fn_stream_array_to_npy(reader, file_path):
+    '''Stream a json array of realizations (one row per realization) into a
+    .npy file of floats'''
+
+    from numpy.lib import format as npy_format
+
+    raw_path = file_path + '.raw'
+    num_rows = 0
+    row_shape = ()
+    with open(raw_path, 'wb') as raw_file:
+        for _ in fn_stream_array_items(reader):
+            row = np.array(fn_stream_value(reader), dtype=float)
+            row_shape = np.shape(row)
+            row.tofile(raw_file)
+            num_rows += 1
+
+    with open(file_path, 'wb') as npy_file:
+        npy_format.write_array_header_1_0(npy_file, {'descr' : npy_format.dtype_to_descr(np.dtype(float)),
+                                                     'fortran_order' : False,
+                                                     'shape' : (num_rows,) + row_shape})
+        with open(raw_path, 'rb') as raw_file:
+            for block in iter(lambda: raw_file.read(1 << 24), b''):
+                npy_file.write(block)
+    os.remove(raw_path)
+
+
+def fn_stream_read_more(reader):
+    '''Read the next block of a streamed json file into the buffer of the
+    reader (False at the end of the file)'''
+
+    if reader['eof']:
+        return False
+    block = reader['file'].read(max(1 << 20, len(reader['buffer']) - reader['pos']))
+    if block == '':
+        reader['eof'] = True
+        return False
+    reader['buffer'] = reader['buffer'][reader['pos']:] + block
+    reader['pos'] = 0
+
+    return True
+
+
+def fn_stream_peek(reader):
+    '''Skip whitespace and return the next character of a streamed json
+    file (empty at the end of the file)'''
+
+    while True:
+        buffer = reader['buffer']
+        pos = reader['pos']
+        while pos < len(buffer) and buffer[pos] in ' \t\n\r':
+            pos += 1
+        reader['pos'] = pos
+        if pos < len(buffer):
+            return buffer[pos]
+        if fn_stream_read_more(reader) == False:
+            return ''
+
+
+def fn_stream_expect(reader, chars):
+    '''Consume the next character of a streamed json file, which must be
+    one of chars'''
+
+    import sys
+
+    char = fn_stream_peek(reader)
+    if char == '' or char not in chars:
+        sys.exit('error! invalid simulated inputs json: expected ' + chars + ', found ' + repr(char))
+    reader['pos'] += 1
+
+    return char
+
+
+def fn_stream_value(reader):
+    '''Decode the next json value of a streamed json file'''
+
+    import json
+
+    decoder = json.JSONDecoder()
+    fn_stream_peek(reader)
+    while True:
+        try:
+            value, end = decoder.raw_decode(reader['buffer'], reader['pos'])
+            if end < len(reader['buffer']) or reader['eof']: # a number at the end of the buffer may continue
+                reader['pos'] = end
+                return value
+        except json.JSONDecodeError:
+            if reader['eof']:
+                raise
+        fn_stream_read_more(reader)
+
+
+def fn_stream_object_keys(reader):
+    '''Iterate over the keys of the next json object of a streamed json
+    file. The value of each key must be read before the next key.'''
+
+    fn_stream_expect(reader, '{')
+    if fn_stream_peek(reader) == '}':
+        reader['pos'] += 1
+        return
+    while True:
+        key = fn_stream_value(reader)
+        fn_stream_expect(reader, ':')
+        yield key
+        if fn_stream_expect(reader, ',}') == '}':
+            return
+
+
+def fn_stream_array_items(reader):
+    '''Iterate over the items of the next json array of a streamed json
+    file. Each item must be read before the next one.'''
+
+    fn_stream_expect(reader, '[')
+    if fn_stream_peek(reader) == ']':
+        reader['pos'] += 1
+        return
+    i = 0
+    while True:
+        yield i
+        i += 1
+        if fn_stream_expect(reader, ',]') == ']':
+            return
+
+
+def fn_realization_blocks(num_reals, chunk_size):
+    '''Split the realizations into contiguous blocks
+
+    Parameters
+    ----------
+    num_reals: int
+      number of realizations
+
+    chunk_size: int
+      realizations per block (see fn_memory_plan.fn_plan_chunks)
+
+    Returns
+    -------
+    blocks: list
+      [start, stop] realization index of each block'''
+
+    blocks = [[start, min(start + chunk_size, num_reals)] for start in range(0, num_reals, chunk_size)]
+
+    return blocks
+
+
+def fn_slice_realizations(damage, damage_consequences, functionality, start, stop):
+    '''Copy the inputs of a block of realizations into memory
+
+    Parameters
+    ----------
+    damage: dictionary
+      contains simulated damage info (damage arrays can be memory maps)
+
+    damage_consequences: dictionary
+      simulated building consequences (all per realization)
+
+    functionality: dictionary
+      contains the simulated utility downtimes (functionality['utilities'])
+
+    start, stop: int
+      realization index range of the block
+
+    Returns
+    -------
+    block_damage, block_damage_consequences, block_functionality: dictionary
+      inputs of the block of realizations'''
+
+    import copy
+
+    num_reals = len(damage_consequences['simulated_replacement_time'])
+    
+    block_damage = {}
+    for key in damage.keys():
+        if key not in ['tenant_units', 'story']:
+            block_damage[key] = copy.deepcopy(damage[key])
+    for group, keys in [['tenant_units', tenant_unit_damage_keys], ['story', story_damage_keys]]:
+        if group not in damage.keys():
+            continue
+        block_damage[group] = []
+        for i in range(len(damage[group])):
+            block_group = {}
+            for key in damage[group][i].keys():
+                if key in keys:
+                    block_group[key] = np.array(damage[group][i][key][start:stop], dtype=float)
+                else:
+                    block_group[key] = copy.deepcopy(damage[group][i][key])
+            block_damage[group].append(block_group)
+
+    block_damage_consequences = {}
+    for key in damage_consequences.keys():
+        if np.ndim(damage_consequences[key]) >= 1 and len(damage_consequences[key]) == num_reals:
+            block_damage_consequences[key] = np.array(damage_consequences[key])[start:stop]
+        else:
+            block_damage_consequences[key] = copy.deepcopy(damage_consequences[key])
+
+    block_functionality = copy.deepcopy({key : functionality[key] for key in functionality.keys() if key != 'utilities'})
+    block_functionality['utilities'] = {}
+    for key in functionality['utilities'].keys():
+        block_functionality['utilities'][key] = np.array(functionality['utilities'][key])[start:stop]
+
+    return block_damage, block_damage_consequences, block_functionality
+
+
+def fn_write_block_outputs(block_outputs, outputs, start, stop, num_reals, results_dir, path = ''):
+    '''Write the per realization outputs of a block into memory-mapped result
+    arrays, and collect the block aggregates
+
+    Parameters
+    ----------
+    block_outputs: dictionary
+      outputs of main_PBEE_recovery for the block
+
+    outputs: dictionary
+      outputs of the previous blocks, updated in place. Per realization
+      outputs are memory maps [num_reals x ...]; aggregates (including the
+      statistics of the summary output profile) are lists with the value of
+      each block.
+
+    start, stop: int
+      realization index range of the block
+
+    num_reals: int
+      total number of realizations
+
+    results_dir: string
+      directory of the .npy result files
+
+    path: string
+      output path of block_outputs (used for the file names)'''
+
+    from numpy.lib.format import open_memmap
+
+    for key in block_outputs.keys():
+        value = block_outputs[key]
+        key_path = path + key if path == '' else path + '__' + key
+        if isinstance(value, dict) and key not in aggregate_keys and fn_output_profile.fn_is_realization_statistics(value) == False:
+            if key not in outputs.keys():
+                outputs[key] = {}
+            fn_write_block_outputs(value, outputs[key], start, stop, num_reals, results_dir, key_path)
+        elif fn_is_per_realization(key, value, stop - start):
+            file_path = os.path.join(results_dir, key_path + '.npy')
+            if key not in outputs.keys():
+                outputs[key] = open_memmap(file_path, mode='w+', dtype=value.dtype, shape=(num_reals,) + np.shape(value)[1:])
+            elif np.ndim(value) == 2 and np.size(value, 1) > np.size(outputs[key], 1):
+                # Widen timelines (e.g. worker data) in row blocks to keep memory bounded
+                outputs[key].flush()
+                old_path = file_path[:-4] + '_old.npy'
+                del outputs[key]
+                os.replace(file_path, old_path)
+                old_values = np.load(old_path, mmap_mode='r')
+                outputs[key] = open_memmap(file_path, mode='w+', dtype=value.dtype, shape=(num_reals, np.size(value, 1)))
+                for row in range(0, num_reals, 4096):
+                    outputs[key][row:row+4096, 0:np.size(old_values, 1)] = old_values[row:row+4096]
+                del old_values
+                os.remove(old_path)
+            if np.ndim(value) == 2 and np.size(value, 1) < np.size(outputs[key], 1):
+                # Pad shorter timelines with zeros
+                outputs[key][start:stop, :] = 0
+                outputs[key][start:stop, 0:np.size(value, 1)] = value
+            else:
+                outputs[key][start:stop] = value
+            outputs[key].flush()
+        else:
+            fn_append_block_aggregate(outputs, key, value, start)
+
+
+def fn_append_block_aggregate(outputs, key, value, start):
+    '''Append the aggregate of a block to the list of block values (outputs
+    updated in place). Realization indices of the convergence diagnostics
+    are offset by the start of the block, so they index all realizations.'''
+
+    if key == 'convergence':
+        value = fn_offset_realization_indices(value, start)
+    if key not in outputs.keys():
+        outputs[key] = []
+    outputs[key].append(value)
+
+
+def fn_offset_realization_indices(convergence, start):
+    '''Copy of worker allocation convergence diagnostics (see
+    other_repair_schedule_functions.fn_convergence_diagnostics) with the
+    realization indices offset by start'''
+
+    if isinstance(convergence, dict):
+        return {key : [int(r) + start for r in value] if key in ['non_converged_reals', 'unresolved_reals']
+                else fn_offset_realization_indices(value, start) for key, value in convergence.items()}
+    if isinstance(convergence, list):
+        return [fn_offset_realization_indices(value, start) for value in convergence]
+    return convergence
+
+
+def fn_is_per_realization(key, value, block_size):
+    '''Check if an output of main_PBEE_recovery for a block of realizations
+    is a per realization array (one row per realization of the block)'''
+
+    return (isinstance(value, np.ndarray) and np.ndim(value) >= 1 and len(value) == block_size
+            and key not in aggregate_keys and np.issubdtype(value.dtype, np.number))
+
+
+def fn_combine_block_aggregates(outputs, block_sizes):
+    '''Combine the aggregates of each block of realizations, to the outputs
+    main_PBEE_recovery gives for all realizations at once
+
+    Parameters
+    ----------
+    outputs: dictionary
+      outputs written by fn_write_block_outputs, updated in place
+
+    block_sizes: array [num blocks]
+      number of realizations in each block
+
+    Notes
+    -----
+    Statistics of realizations (summary output profile) are merged with
+    fn_output_profile.fn_merge_realization_statistics. Aggregates equal in
+    all blocks are kept once. Performance target days are those of the
+    largest recovery day of all blocks (fn_merge_target_days), and fractions
+    of realizations (e.g. prob_of_target, system_breakdowns,
+    component_combined) are the means weighted by block size, at these
+    target days (fn_align_target_days). Partial recovery is merged with
+    fn_merge_partial_recovery, and convergence diagnostics with
+    fn_merge_convergence.'''
+
+    block_weights = np.array(block_sizes) / np.sum(block_sizes)
+    block_targ_days = None
+    if 'perform_targ_days' in outputs.keys() and isinstance(outputs['perform_targ_days'], list) and len(outputs['perform_targ_days']) == len(block_sizes):
+        block_targ_days = outputs['perform_targ_days']
+        targ_days = fn_merge_target_days(block_targ_days)
+
+    for key in outputs.keys():
+        if isinstance(outputs[key], dict):
+            fn_combine_block_aggregates(outputs[key], block_sizes)
+        elif isinstance(outputs[key], list) and len(outputs[key]) == len(block_sizes):
+            block_values = outputs[key]
+            if all(fn_output_profile.fn_is_realization_statistics(value) for value in block_values):
+                outputs[key] = fn_output_profile.fn_merge_realization_statistics(block_values)
+            elif all(fn_is_equal(value, block_values[0]) for value in block_values):
+                outputs[key] = block_values[0]
+            elif key == 'perform_targ_days' and block_targ_days != None:
+                outputs[key] = targ_days
+            elif key == 'partial':
+                outputs[key] = fn_merge_partial_recovery(block_values, block_weights)
+            elif key == 'convergence':
+                outputs[key] = fn_merge_convergence(block_values)
+            elif key in fraction_keys and all(np.shape(value)[0:-1] == np.shape(block_values[0])[0:-1] for value in block_values):
+                if block_targ_days != None:
+                    block_values = [fn_align_target_days(value, days, targ_days) for value, days in zip(block_values, block_targ_days)]
+                if all(np.shape(value) == np.shape(block_values[0]) for value in block_values):
+                    outputs[key] = np.sum([weight * np.array(value, dtype=float) for weight, value in zip(block_weights, block_values)], axis=0)
+
+
+def fn_merge_target_days(block_targ_days):
+    '''Performance target days of all realizations, from the target days of
+    each block (other_functionality_functions.fn_performance_target_days).
+    Target days past a year end at the largest recovery day, so the target
+    days of all realizations are those of the largest last target day.'''
+
+    from functionality import other_functionality_functions
+
+    if all(fn_is_equal(days, block_targ_days[0]) for days in block_targ_days):
+        return block_targ_days[0]
+
+    return other_functionality_functions.fn_performance_target_days(max(days[-1] for days in block_targ_days))
+
+
+def fn_align_target_days(values, block_days, targ_days):
+    '''Fractions of the realizations of a block exceeding its target days
+    (last dimension of values), at other target days. Target days of all
+    realizations (fn_merge_target_days) include every target day of the
+    block up to its largest recovery day, and no realization of the block
+    exceeds the later ones.'''
+
+    values = np.array(values, dtype=float)
+    block_days = np.array(block_days, dtype=float)
+    targ_days = np.array(targ_days, dtype=float)
+    day_idx = np.clip(np.searchsorted(block_days, targ_days, side='right') - 1, 0, len(block_days) - 1)
+
+    return np.where(targ_days > block_days[-1], 0, values[..., day_idx])
+
+
+def fn_merge_partial_recovery(block_partials, block_weights):
+    '''Merge the partial recovery outputs of each block of realizations
+    (recovery[state]['partial'] of other_functionality_functions.
+    fn_extract_recovery_metrics)
+
+    Parameters
+    ----------
+    block_partials: list
+      partial recovery outputs of each block
+
+    block_weights: array [num blocks]
+      fraction of the realizations in each block
+
+    Returns
+    -------
+    partial: dictionary
+      partial recovery of all realizations. The probabilities of not
+      reaching each recovery ratio by the target days and the mean day are
+      exact (except for replacement cases past the last target day of a
+      block); the median and fractiles are the means of the block fractiles
+      weighted by block size (as fn_output_profile.
+      fn_merge_realization_statistics).'''
+
+    partial = {}
+    for i_pct in block_partials[0].keys():
+        block_entries = [block_partial[i_pct] for block_partial in block_partials]
+        block_targ_days = [entry['target_recovery_day'] for entry in block_entries]
+        targ_days = fn_merge_target_days(block_targ_days)
+        prob_of_target = np.sum([weight * fn_align_target_days([entry['prob_of_target'][i] for i in range(len(days))], days, targ_days)
+                                 for weight, entry, days in zip(block_weights, block_entries, block_targ_days)], axis=0)
+
+        partial[i_pct] = {'target_recovery_ratio_units' : block_entries[0]['target_recovery_ratio_units'],
+                          'target_recovery_day' : targ_days,
+                          'prob_of_target' : {i_targ_day : prob_of_target[i_targ_day] for i_targ_day in range(len(targ_days))},
+                          'reqd_units' : block_entries[0]['reqd_units']}
+        for stat in ['mean', 'median', 'fractile_75', 'fractile_90']:
+            partial[i_pct][stat] = np.sum([weight * entry[stat] for weight, entry in zip(block_weights, block_entries)])
+
+    return partial
+
+
+def fn_merge_convergence(block_convergence):
+    '''Merge the worker allocation convergence diagnostics of each block of
+    realizations (realization indices already offset by
+    fn_append_block_aggregate): realizations re-run or unresolved in any
+    block, and the largest iteration budget and number of iterations'''
+
+    first = block_convergence[0]
+    if isinstance(first, dict):
+        return {key : [r for convergence in block_convergence for r in convergence[key]] if key in ['non_converged_reals', 'unresolved_reals']
+                else fn_merge_convergence([convergence[key] for convergence in block_convergence]) for key in first.keys()}
+    if isinstance(first, list):
+        return [fn_merge_convergence([convergence[i] for convergence in block_convergence]) for i in range(len(first))]
+
+    return max(block_convergence)
+
+
+def fn_is_equal(value_1, value_2):
+    '''Check if two block outputs are equal (arrays, lists, dictionaries or
+    scalars)'''
+
+    if isinstance(value_1, dict) or isinstance(value_2, dict):
+        return isinstance(value_1, dict) and isinstance(value_2, dict) and value_1.keys() == value_2.keys() and all(fn_is_equal(value_1[key], value_2[key]) for key in value_1.keys())
+    try:
+        return bool(np.array_equal(np.array(value_1), np.array(value_2)))
+    except Exception:
+        return False
+
+
+def fn_assess_realizations(damage, damage_consequences, building_model,
+                           tenant_units, systems, subsystems,
+                           tmp_repair_class, impedance_options,
+                           impeding_factor_medians, repair_time_options,
+                           functionality, functionality_options):
+    '''Assess a block of realizations as main_PBEE_recovery does, also
+    returning the building level recovery day of each realization (which
+    the summary output profile reduces to statistics)
+
+    Returns
+    -------
+    functionality: dictionary
+      main_PBEE_recovery outputs of the block, reduced to the output profile
+
+    recovery_days: dictionary
+      building level recovery day of each realization, by recovery state'''
+
+    from fn_recovery_dag import fn_run_recovery_dag
+
+    output_profile = fn_output_profile.fn_check_output_profile(functionality_options['output_profile']
+                                                               if 'output_profile' in functionality_options.keys() else 'full')
+
+    state = fn_run_recovery_dag({'damage' : damage, 'damage_consequences' : damage_consequences,
+                                 'building_model' : building_model, 'tenant_units' : tenant_units,
+                                 'systems' : systems, 'subsystems' : subsystems,
+                                 'tmp_repair_class' : tmp_repair_class, 'impedance_options' : impedance_options,
+                                 'impeding_factor_medians' : impeding_factor_medians,
+                                 'repair_time_options' : repair_time_options, 'functionality' : functionality,
+                                 'functionality_options' : functionality_options})
+    recovery_days = {state_name : np.array(state['recovery'][state_name]['building_level']['recovery_day'], dtype=float)
+                     for state_name in state['recovery'].keys()}
+
+    for key in ['impeding_factors', 'worker_data', 'building_repair_schedule', 'recovery']:
+        functionality[key] = state[key]
+
+    return fn_output_profile.fn_apply_output_profile(functionality, output_profile), recovery_days
+
+
+def fn_concatenate_recovery_days(block_recovery_days):
+    '''Concatenate the building level recovery days of each block of
+    realizations (fn_assess_realizations), by recovery state'''
+
+    return {state : np.concatenate([block_days[state] for block_days in block_recovery_days])
+            for state in block_recovery_days[0].keys()}
+
+
+def fn_run_realization_blocks(damage, damage_consequences, building_model,
+                              tenant_units, systems, subsystems,
+                              tmp_repair_class, impedance_options,
+                              impeding_factor_medians, repair_time_options,
+                              functionality, functionality_options,
+                              memory_budget_mb, results_dir):
+    '''Perform the recovery assessment block by block of realizations, with
+    the per realization outputs written to memory-mapped result arrays
+
+    Parameters
+    ----------
+    damage, damage_consequences, building_model, tenant_units, systems,
+    subsystems, tmp_repair_class, impedance_options, impeding_factor_medians,
+    repair_time_options, functionality, functionality_options:
+      inputs of main_PBEE_recovery. The damage arrays can be memory maps (see
+      fn_damage_memmap).
+
+    memory_budget_mb: number
+      memory budget of the assessment (MB). Blocks are sized with
+      fn_memory_plan from the dimensions of the building model.
+
+    results_dir: string
+      directory of the .npy result files
+
+    Returns
+    -------
+    functionality: dictionary
+      main_PBEE_recovery outputs. Per realization outputs are read-only
+      memory maps [num_reals x ...]; aggregates and the statistics of the
+      summary output profile are combined across blocks (see
+      fn_combine_block_aggregates), except the building level recovery day
+      statistics and performance targets, which are recomputed from all
+      realizations.
+
+    Notes
+    -----
+    Each block simulates its own random variables (e.g. impeding times), so
+    results are statistically, not numerically, equivalent to a single run.'''
+
+    import copy
+    import fn_memory_plan
+
+    if os.path.exists(results_dir) == False:
+        os.makedirs(results_dir)
+
+    num_reals = len(damage_consequences['simulated_replacement_time'])
+    precision = functionality_options['precision'] if 'precision' in functionality_options.keys() else 'float64'
+    estimate = fn_memory_plan.fn_estimate_memory(building_model, tenant_units, damage['comp_ds_table'], len(systems), precision)
+    plan = fn_memory_plan.fn_plan_chunks(num_reals, memory_budget_mb, estimate, max_workers = 1)
+    blocks = fn_realization_blocks(num_reals, plan['chunk_size'])
+
+    outputs = {}
+    block_recovery_days = []
+    for start, stop in blocks:
+        block_damage, block_damage_consequences, block_functionality = fn_slice_realizations(damage, damage_consequences, functionality, start, stop)
+        block_outputs, block_days = fn_assess_realizations(block_damage, block_damage_consequences,
+                                                           copy.deepcopy(building_model), copy.deepcopy(tenant_units),
+                                                           systems.copy(), subsystems.copy(), tmp_repair_class.copy(),
+                                                           copy.deepcopy(impedance_options), impeding_factor_medians.copy(),
+                                                           copy.deepcopy(repair_time_options), block_functionality,
+                                                           copy.deepcopy(functionality_options))
+        fn_write_block_outputs(block_outputs, outputs, start, stop, num_reals, results_dir)
+        block_recovery_days.append(block_days)
+        del block_damage, block_damage_consequences, block_functionality, block_outputs
+
+    fn_combine_block_aggregates(outputs, [stop - start for start, stop in blocks])
+    fn_building_performance_targets(outputs, fn_concatenate_recovery_days(block_recovery_days))
+
+    return fn_reopen_results(outputs)
+
+
+def fn_building_performance_targets(outputs, recovery_days):
+    '''Recompute the building level probabilities of exceeding the
+    performance target days (combined across blocks, see
+    fn_merge_target_days) from the recovery days of all realizations, and
+    the building level recovery day statistics of the summary output
+    profile (outputs updated in place)
+
+    Parameters
+    ----------
+    outputs: dictionary
+      outputs combined across blocks of realizations
+
+    recovery_days: dictionary
+      building level recovery day of all realizations, by recovery state
+      (see fn_assess_realizations)'''
+
+    from functionality import other_functionality_functions
+
+    if 'recovery' in outputs.keys():
+        for state in outputs['recovery'].keys():
+            recovery = outputs['recovery'][state]
+            days = recovery_days[state]
+            if fn_output_profile.fn_is_realization_statistics(recovery['building_level']['recovery_day']):
+                recovery['building_level']['recovery_day'] = fn_output_profile.fn_realization_statistics(days)
+            # the building recovers with its last tenant unit
+            if 'perform_targ_days' not in recovery['building_level'].keys():
+                recovery['building_level']['perform_targ_days'] = other_functionality_functions.fn_performance_target_days(np.nanmax(days))
+            recovery['building_level']['prob_of_target'] = other_functionality_functions.fn_exceedance_probability(
+                np.reshape(days, (len(days), 1)), recovery['building_level']['perform_targ_days'])[0,:]
+
+
+def fn_reopen_results(outputs):
+    '''Replace the writable result memory maps with read-only memory maps'''
+
+    for key in outputs.keys():
+        if isinstance(outputs[key], dict):
+            fn_reopen_results(outputs[key])
+        elif isinstance(outputs[key], np.memmap):
+            file_path = outputs[key].filename
+            outputs[key].flush()
+            outputs[key] = np.load(file_path, mmap_mode='r')
+
+    return outputs
+
+
+def fn_result_file_names(outputs, results_dir):
+    '''Replace memory-mapped results with their .npy file names (relative to
+    results_dir), e.g. to write the remaining outputs to json'''
+
+    for key in outputs.keys():
+        if isinstance(outputs[key], dict):
+            fn_result_file_names(outputs[key], results_dir)
+        elif isinstance(outputs[key], np.memmap):
+            outputs[key] = os.path.relpath(outputs[key].filename, results_dir)
+
+    return outputs
@@ -0,0 +1,158 @@
+def fn_check_output_profile(output_profile):
+    '''Check the requested output profile
+
+    Parameters
+    ----------
+    output_profile: string
+      'full' (all per realization outputs), 'standard' (per realization
+      outputs used by the plotters, without the per system per story gantt
+      chart breakdowns), or 'summary' (statistics only)
+
+    Returns
+    -------
+    output_profile: string
+      the checked output profile'''
+
+    import sys
+
+    if output_profile not in ['summary', 'standard', 'full']:
+        sys.exit('error! output_profile must be "summary", "standard" or "full", not ' + str(output_profile))
+
+    return output_profile
+
+
+def fn_realization_statistics(values):
+    '''Summarize simulated values across realizations
+
+    Parameters
+    ----------
+    values: array [num reals x ...]
+      simulated values of each realization (e.g. recovery day of each tenant
+      unit). NaNs are ignored.
+
+    Returns
+    -------
+    stats: dictionary
+      mean, median, 10th, 25th, 75th and 90th fractiles, and max of the
+      values, each with the shape of a single realization'''
+
+    import numpy as np
+
+    values = np.array(values, dtype=float)
+    fractiles = np.nanquantile(values, [0.1, 0.25, 0.5, 0.75, 0.9], axis=0)
+    stats = {'mean' : np.nanmean(values, axis=0),
+             'median' : fractiles[2],
+             'fractile_10' : fractiles[0],
+             'fractile_25' : fractiles[1],
+             'fractile_75' : fractiles[3],
+             'fractile_90' : fractiles[4],
+             'max' : np.nanmax(values, axis=0),
+             'num_reals' : int(np.size(values, 0))
+             }
+
+    return stats
+
+
+def fn_is_realization_statistics(value):
+    '''Check if an output is a summary of realizations
+    (fn_realization_statistics)'''
+
+    return isinstance(value, dict) and set(value.keys()) == {'mean', 'median', 'fractile_10', 'fractile_25',
+                                                             'fractile_75', 'fractile_90', 'max', 'num_reals'}
+
+
+def fn_merge_realization_statistics(block_stats):
+    '''Merge the statistics of blocks of realizations (e.g. the blocks of
+    fn_out_of_core.fn_run_realization_blocks)
+
+    Parameters
+    ----------
+    block_stats: list
+      fn_realization_statistics of each block
+
+    Returns
+    -------
+    stats: dictionary
+      statistics of all realizations. The mean, max and number of
+      realizations are exact; the median and fractiles are the means of the
+      block fractiles weighted by block size (approximate, since fractiles
+      of the blocks do not combine exactly)'''
+
+    import numpy as np
+
+    weights = np.array([block['num_reals'] for block in block_stats], dtype=float)
+    stats = {}
+    for key in ['mean', 'median', 'fractile_10', 'fractile_25', 'fractile_75', 'fractile_90']:
+        values = np.array([block[key] for block in block_stats], dtype=float)
+        block_weights = weights.reshape((len(weights),) + (1,) * (np.ndim(values) - 1)) * np.isfinite(values)
+        with np.errstate(invalid='ignore'):
+            block_weights = block_weights / np.sum(block_weights, axis=0)
+        stats[key] = np.where(np.any(block_weights > 0, axis=0), np.nansum(values * block_weights, axis=0), np.nan)[()]
+    stats['max'] = np.fmax.reduce(np.array([block['max'] for block in block_stats], dtype=float), axis=0)[()]
+    stats['num_reals'] = int(np.sum(weights))
+
+    return stats
+
+
+def fn_apply_output_profile(functionality, output_profile):
+    '''Reduce the assessment outputs to the requested output profile
+
+    Parameters
+    ----------
+    functionality: dictionary
+      main output of main_PBEE_recovery
+
+    output_profile: string
+      'full', 'standard' or 'summary' (see fn_check_output_profile). The
+      expensive per realization outputs (e.g. gantt chart breakdowns, tenant
+      unit recovery days and recovery trajectories) are already summarized
+      by the stage functions; this summarizes what remains.
+
+    Returns
+    -------
+    functionality: dictionary
+      outputs for the requested profile. For 'summary', per realization
+      arrays are replaced by their statistics (fn_realization_statistics)
+      and only probabilities of exceeding the performance targets,
+      partial recovery statistics and breakdown matrices are kept as is.'''
+
+    import numpy as np
+
+    output_profile = fn_check_output_profile(output_profile)
+    if output_profile != 'summary':
+        return functionality
+
+    def summarize_all(outputs):
+        # every array in this branch is per realization
+        for key in list(outputs.keys()):
+            if isinstance(outputs[key], dict):
+                summarize_all(outputs[key])
+            elif isinstance(outputs[key], np.ndarray):
+                outputs[key] = fn_realization_statistics(outputs[key])
+
+    ## Recovery of reoccupancy and function
+    per_realization_keys = {'tenant_unit' : ['recovery_day'],
+                            'building_level' : ['recovery_day', 'initial_percent_affected', 'recovery_day_red_tag'],
+                            'recovery_trajectory' : ['recovery_day']}
+    if 'recovery' in functionality.keys():
+        for state in functionality['recovery'].keys():
+            recovery = functionality['recovery'][state]
+            for group in per_realization_keys.keys():
+                if group in recovery.keys():
+                    for key in per_realization_keys[group]:
+                        if key in recovery[group].keys() and isinstance(recovery[group][key], dict) == False:
+                            recovery[group][key] = fn_realization_statistics(recovery[group][key])
+            if 'breakdowns' in recovery.keys() and 'component_breakdowns_all_reals' in recovery['breakdowns'].keys():
+                del recovery['breakdowns']['component_breakdowns_all_reals']
+
+    ## Impeding factors
+    if 'impeding_factors' in functionality.keys():
+        summarize_all(functionality['impeding_factors'])
+
+    ## Worker allocations (keep the peak workers and convergence diagnostics)
+    if 'worker_data' in functionality.keys() and 'total_workers' in functionality['worker_data'].keys():
+        functionality['worker_data']['peak_workers'] = fn_realization_statistics(np.nanmax(functionality['worker_data']['total_workers'], axis=1))
+        del functionality['worker_data']['total_workers']
+        del functionality['worker_data']['day_vector']
+
+    return functionality
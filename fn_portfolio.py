@@ -0,0 +1,270 @@
+"""
+Portfolio recovery assessment: many buildings, each at one or more
+intensities, listed in a manifest of input directories. Static tables are
+loaded once, building x intensity jobs are scheduled largest first across a
+pool of worker processes, outputs are written per building and intensity,
+and the recovery of each building is combined into portfolio recovery
+curves (expected fraction of the portfolio recovered by each day).
+
+The manifest is a json file:
+{"buildings" : [{"name" : "building_1", "weight" : 1,
+                 "input_dirs" : {"intensity_1" : "building_1/im_1",
+                                 "intensity_2" : "building_1/im_2"}},
+                ...]}
+Each input directory contains a simulated_inputs.json (relative paths are
+relative to the manifest). The optional weight (default 1) is the share of
+the building in the portfolio curves, e.g. its replacement value or the
+number of buildings it represents.
+"""
+import os
+import json
+import numpy as np
+
+# Static tables of each pool worker (see fn_init_portfolio_worker)
+worker_state = {}
+
+
+def fn_read_manifest(manifest_path):
+    '''Read a portfolio manifest into a list of building x intensity jobs
+
+    Parameters
+    ----------
+    manifest_path: string
+      path of the manifest json file
+
+    Returns
+    -------
+    jobs: list
+      each job is a dictionary with the building name, intensity, weight,
+      input_path (of simulated_inputs.json) and estimated cost (size of the
+      simulated inputs, which grows with the number of realizations and
+      component damage states)'''
+
+    import sys
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    jobs = []
+    names = []
+    for building in manifest['buildings']:
+        if building['name'] in names:
+            sys.exit('error! building names in the portfolio manifest must be unique: ' + str(building['name']))
+        names.append(building['name'])
+        weight = building['weight'] if 'weight' in building.keys() else 1
+        for intensity in building['input_dirs'].keys():
+            input_path = os.path.join(manifest_dir, building['input_dirs'][intensity], 'simulated_inputs.json')
+            if os.path.exists(input_path) == False:
+                sys.exit('error! simulated inputs of building ' + str(building['name']) + ' at intensity ' + str(intensity) + ' not found: ' + input_path)
+            jobs.append({'building' : building['name'],
+                         'intensity' : intensity,
+                         'weight' : weight,
+                         'input_path' : input_path,
+                         'cost' : os.path.getsize(input_path)})
+
+    return jobs
+
+
+def fn_init_portfolio_worker(static_tables):
+    '''Keep the static tables in each pool worker (loaded once by the
+    parent)'''
+
+    import warnings
+    warnings.filterwarnings('ignore')
+
+    worker_state['static_tables'] = static_tables
+
+
+def fn_assess_portfolio_job(task):
+    '''Assess one building at one intensity in a pool worker, and write its
+    outputs
+
+    Parameters
+    ----------
+    task: list
+      [index, job, output_dir, output_profile, seed]: index of the job in the
+      portfolio, job (see fn_read_manifest), directory of the portfolio
+      outputs, optional override of functionality_options['output_profile']
+      and random seed of the job
+
+    Returns
+    -------
+    index: int
+      index of the job
+
+    recovery_days: dictionary
+      building level recovery day of each realization, by recovery state'''
+
+    from driver_PBEE_recovery import fn_format_simulated_inputs, fn_arrays_to_lists
+    from fn_output_profile import fn_check_output_profile, fn_apply_output_profile
+    from fn_recovery_dag import fn_run_recovery_dag
+
+    index, job, output_dir, output_profile, seed = task
+    static_tables = worker_state['static_tables']
+
+    with open(job['input_path']) as f:
+        simulated_inputs = fn_format_simulated_inputs(json.load(f))
+    functionality_options = simulated_inputs['functionality_options']
+    if output_profile != None:
+        functionality_options['output_profile'] = output_profile
+    output_profile = fn_check_output_profile(functionality_options['output_profile']
+                                             if 'output_profile' in functionality_options.keys() else 'full')
+
+    # Stages run directly (see main_PBEE_recovery), to keep the per realization recovery days of any output profile
+    np.random.seed(seed)
+    state = fn_run_recovery_dag({'damage' : simulated_inputs['damage'], 'damage_consequences' : simulated_inputs['damage_consequences'],
+                                 'building_model' : simulated_inputs['building_model'], 'tenant_units' : simulated_inputs['tenant_units'],
+                                 'systems' : static_tables['systems'].copy(), 'subsystems' : static_tables['subsystems'].copy(),
+                                 'tmp_repair_class' : static_tables['tmp_repair_class'].copy(),
+                                 'impedance_options' : simulated_inputs['impedance_options'],
+                                 'impeding_factor_medians' : static_tables['impeding_factor_medians'].copy(),
+                                 'repair_time_options' : simulated_inputs['repair_time_options'],
+                                 'functionality' : simulated_inputs['functionality'],
+                                 'functionality_options' : functionality_options})
+    recovery_days = {state_name : np.array(state['recovery'][state_name]['building_level']['recovery_day'], dtype=float)
+                     for state_name in state['recovery'].keys()}
+
+    functionality = simulated_inputs['functionality']
+    for key in ['impeding_factors', 'worker_data', 'building_repair_schedule', 'recovery']:
+        functionality[key] = state[key]
+    functionality = fn_apply_output_profile(functionality, output_profile)
+    fn_arrays_to_lists(functionality)
+
+    job_dir = os.path.join(output_dir, str(job['building']), str(job['intensity']))
+    if os.path.exists(job_dir) == False:
+        os.makedirs(job_dir)
+    with open(os.path.join(job_dir, 'recovery_outputs.json'), 'w') as outfile:
+        outfile.write(json.dumps(functionality))
+
+    return index, recovery_days
+
+
+def fn_portfolio_recovery_curves(jobs, recovery_days):
+    '''Combine the recovery of each building into portfolio recovery curves
+
+    Parameters
+    ----------
+    jobs: list
+      building x intensity jobs (see fn_read_manifest)
+
+    recovery_days: list
+      building level recovery days of each job, by recovery state
+
+    Returns
+    -------
+    portfolio_recovery: dictionary
+      portfolio_recovery[intensity]['day']: days of the recovery curves;
+      portfolio_recovery[intensity][state]['fraction_recovered']: expected
+      fraction of the portfolio (by weight) recovered by each day;
+      portfolio_recovery[intensity]['buildings'] and ['total_weight'] '''
+
+    from functionality import other_functionality_functions
+
+    portfolio_recovery = {}
+    intensities = list(dict.fromkeys([job['intensity'] for job in jobs]))
+    for intensity in intensities:
+        job_ids = [i for i, job in enumerate(jobs) if job['intensity'] == intensity]
+        weights = np.array([jobs[i]['weight'] for i in job_ids], dtype=float)
+        max_day = np.max([np.nanmax(recovery_days[i][state], initial=0) for i in job_ids for state in recovery_days[i].keys()])
+        day = np.arange(0, np.ceil(max_day) + 1)
+
+        portfolio_recovery[intensity] = {'day' : day,
+                                         'buildings' : [jobs[i]['building'] for i in job_ids],
+                                         'total_weight' : np.sum(weights)}
+        for state in recovery_days[job_ids[0]].keys():
+            fraction_recovered = np.zeros(len(day))
+            for weight, i in zip(weights, job_ids):
+                days = recovery_days[i][state]
+                prob_exceed = other_functionality_functions.fn_exceedance_probability(np.reshape(days, (len(days), 1)), day)[0,:]
+                fraction_recovered = fraction_recovered + weight * (1 - prob_exceed)
+            portfolio_recovery[intensity][state] = {'fraction_recovered' : fraction_recovered / np.sum(weights)}
+
+    return portfolio_recovery
+
+
+def fn_run_portfolio(manifest_path, output_dir = None, max_workers = None,
+                     output_profile = None, seed = None):
+    '''Assess every building x intensity of a portfolio, and write the
+    building outputs and portfolio recovery curves
+
+    Parameters
+    ----------
+    manifest_path: string
+      path of the portfolio manifest (see module notes)
+
+    output_dir: string
+      directory of the outputs (default: outputs/<manifest name>). Outputs of
+      each building and intensity are saved in
+      <output_dir>/<building>/<intensity>/recovery_outputs.json and the
+      portfolio recovery curves in <output_dir>/portfolio_recovery.json
+
+    max_workers: int
+      number of worker processes (default: number of CPUs). With one
+      worker, jobs are assessed in this process.
+
+    output_profile: string
+      optional override of functionality_options['output_profile'] of every
+      building
+
+    seed: int
+      optional random seed of the portfolio; each job draws from its own
+      seed derived from it
+
+    Returns
+    -------
+    portfolio_recovery: dictionary
+      portfolio recovery curves (see fn_portfolio_recovery_curves)'''
+
+    import time
+    import copy
+    import multiprocessing
+    from driver_PBEE_recovery import fn_load_static_tables, fn_arrays_to_lists
+
+    start_time = time.time()
+
+    jobs = fn_read_manifest(manifest_path)
+    if output_dir == None:
+        output_dir = os.path.join(os.path.dirname(__file__), 'outputs', os.path.splitext(os.path.basename(manifest_path))[0])
+    if os.path.exists(output_dir) == False:
+        os.makedirs(output_dir)
+
+    ## Load the static data once for all buildings
+    static_tables = fn_load_static_tables()
+
+    ## Assess the jobs, largest first so the pool finishes together
+    job_seeds = np.random.SeedSequence(seed).generate_state(len(jobs))
+    tasks = [[i, job, output_dir, output_profile, int(job_seed)] for i, (job, job_seed) in enumerate(zip(jobs, job_seeds))]
+    tasks.sort(key = lambda task: -task[1]['cost'])
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+    num_workers = int(max(min(max_workers, len(jobs)), 1))
+
+    recovery_days = [None] * len(jobs)
+    def fn_record_job(num_complete, index, job_recovery_days):
+        recovery_days[index] = job_recovery_days
+        print('Recovery assessment of building ' + str(jobs[index]['building']) + ' at intensity ' +
+              str(jobs[index]['intensity']) + ' complete (' + str(num_complete + 1) + ' of ' + str(len(jobs)) + ')')
+
+    if num_workers == 1:
+        fn_init_portfolio_worker(static_tables)
+        for num_complete, task in enumerate(tasks):
+            fn_record_job(num_complete, *fn_assess_portfolio_job(task))
+        worker_state.clear()
+    else:
+        with multiprocessing.Pool(processes = num_workers, initializer = fn_init_portfolio_worker,
+                                  initargs = (static_tables,)) as pool:
+            for num_complete, job_result in enumerate(pool.imap_unordered(fn_assess_portfolio_job, tasks, chunksize = 1)):
+                fn_record_job(num_complete, *job_result)
+
+    ## Portfolio recovery curves
+    portfolio_recovery = fn_portfolio_recovery_curves(jobs, recovery_days)
+    portfolio_outputs = copy.deepcopy(portfolio_recovery)
+    fn_arrays_to_lists(portfolio_outputs)
+    with open(os.path.join(output_dir, 'portfolio_recovery.json'), 'w') as outfile:
+        outfile.write(json.dumps(portfolio_outputs))
+
+    print('Portfolio assessment of ' + str(len(jobs)) + ' building x intensity jobs complete')
+    print('time to run ' + str(round(time.time() - start_time, 2)) + 's')
+
+    return portfolio_recovery
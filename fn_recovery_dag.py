@@ -0,0 +1,343 @@
+"""
+The recovery assessment as a dependency graph of stages. Each stage declares
+its upstream stages, the inputs of main_PBEE_recovery it reads and the
+options it depends on, so a stage is only re-evaluated when something it
+depends on changes (see fn_stage_cache). Sweeps over options (fn_sweep_options)
+share the upstream stages of all variants in memory.
+"""
+import copy
+import numpy as np
+
+import fn_stage_cache
+
+def fn_option(state, key, default = None):
+    '''Value of a functionality option, or its default if not provided'''
+
+    options = state['functionality_options']
+
+    return options[key] if key in options.keys() else default
+
+
+def fn_preprocessing_stage(state):
+    '''Combine component attributes into recovery filters and simulate
+    temporary repair times (main_preprocessing)'''
+
+    from preprocessing import main_preprocessing
+
+    damage, tmp_repair_class, damage_consequences = main_preprocessing.main_preprocessing(state['damage']['comp_ds_table'],
+                                                state['damage'], state['repair_time_options'], state['tmp_repair_class'],
+                                                state['damage_consequences'], state['building_model']['num_stories'],
+                                                fn_option(state, 'precision', 'float64'), fn_option(state, 'sparse_damage', False))
+
+    return {'damage' : damage, 'tmp_repair_class' : tmp_repair_class, 'damage_consequences' : damage_consequences}
+
+
+def fn_red_tag_stage(state):
+    '''Calculate red tags (fn_red_tag), added to damage_consequences'''
+
+    from fn_red_tag import fn_red_tag
+
+    damage_consequences = state['damage_consequences']
+    RT, RTI, IT = fn_red_tag(state['functionality_options']['calculate_red_tag'],
+                                    state['damage'], state['building_model']['comps'],
+                                    np.array(damage_consequences['simulated_replacement_time']))
+
+    damage_consequences['red_tag'] = RT
+    damage_consequences['red_tag_impact'] = RTI
+    damage_consequences['inspection_trigger'] = IT
+
+    return {'damage_consequences' : damage_consequences}
+
+
+def fn_impeding_factors_stage(state):
+    '''Simulate ATC 138 impeding factors (main_impeding_factors)'''
+
+    from impedance import main_impedance_function
+
+    damage_consequences = state['damage_consequences']
+    impeding_factors = main_impedance_function.main_impeding_factors(state['damage'], state['impedance_options'],
+                                          damage_consequences['repair_cost_ratio_total'],
+                                          damage_consequences['repair_cost_ratio_engineering'],
+                                          damage_consequences['inspection_trigger'],
+                                          state['systems'], state['tmp_repair_class'],
+                                          state['building_model']['building_value'],
+                                          state['impeding_factor_medians'],
+                                          state['functionality_options']['include_flooding_impact'])
+
+    return {'impeding_factors' : impeding_factors}
+
+
+def fn_repair_schedule_stage(state):
+    '''Construct the building repair schedule (main_repair_schedule)'''
+
+    from repair_schedule import main_repair_schedule
+
+    damage_consequences = state['damage_consequences']
+    damage, worker_data, building_repair_schedule = main_repair_schedule.main_repair_schedule(state['damage'], state['building_model'],
+        damage_consequences['red_tag'], state['repair_time_options'], state['systems'], state['tmp_repair_class'],
+        state['impeding_factors'], damage_consequences['simulated_replacement_time'], fn_option(state, 'output_profile', 'full'))
+
+    return {'repair_schedule' : damage['repair_schedule'], 'worker_data' : worker_data,
+            'building_repair_schedule' : building_repair_schedule}
+
+
+def fn_functionality_stage(state):
+    '''Calculate the recovery of building reoccupancy and function
+    (main_functionality)'''
+
+    from functionality import main_functionality_function
+
+    damage = state['damage']
+    damage['repair_schedule'] = state['repair_schedule']
+    recovery = main_functionality_function.main_functionality(damage, state['building_model'],
+                                state['damage_consequences'], state['functionality']['utilities'],
+                                state['functionality_options'], state['tenant_units'], state['subsystems'],
+                                state['impeding_factors']['temp_repair'])
+
+    return {'recovery' : recovery}
+
+
+# Stages of the recovery assessment:
+#   upstream: stages whose outputs the stage reads
+#   inputs: inputs of main_PBEE_recovery the stage reads (in full)
+#   options: keys of the inputs the stage reads (e.g. single functionality
+#   options), so changes to other keys do not re-evaluate the stage
+#   modules: modules and packages the stage runs, so changes to their code
+#   re-evaluate the stage (see fn_stage_modules)
+recovery_stages = [
+    {'name' : 'preprocessing',
+     'upstream' : [],
+     'inputs' : ['damage', 'damage_consequences', 'tmp_repair_class'],
+     'options' : {'building_model' : ['num_stories'],
+                  'repair_time_options' : ['allow_tmp_repairs', 'allow_shoring'],
+                  'functionality_options' : ['precision', 'sparse_damage']},
+     'modules' : ['preprocessing'],
+     'function' : fn_preprocessing_stage},
+    {'name' : 'red_tag',
+     'upstream' : ['preprocessing'],
+     'inputs' : [],
+     'options' : {'building_model' : ['comps'],
+                  'functionality_options' : ['calculate_red_tag']},
+     'modules' : ['fn_red_tag', 'preprocessing'],
+     'function' : fn_red_tag_stage},
+    {'name' : 'impeding_factors',
+     'upstream' : ['preprocessing', 'red_tag'],
+     'inputs' : ['impedance_options', 'systems', 'impeding_factor_medians'],
+     'options' : {'building_model' : ['building_value'],
+                  'functionality_options' : ['include_flooding_impact']},
+     'modules' : ['impedance', 'preprocessing'],
+     'function' : fn_impeding_factors_stage},
+    {'name' : 'repair_schedule',
+     'upstream' : ['preprocessing', 'red_tag', 'impeding_factors'],
+     'inputs' : ['building_model', 'repair_time_options', 'systems'],
+     'options' : {'functionality_options' : ['output_profile']},
+     'modules' : ['repair_schedule', 'preprocessing'],
+     'function' : fn_repair_schedule_stage},
+    {'name' : 'functionality',
+     'upstream' : ['preprocessing', 'red_tag', 'impeding_factors', 'repair_schedule'],
+     'inputs' : ['building_model', 'functionality', 'tenant_units', 'subsystems'],
+     'options' : {'functionality_options' : ['egress_threshold', 'min_egress_paths', 'fire_watch',
+                                             'local_fire_damamge_threshold', 'exterior_safety_threshold',
+                                             'interior_safety_threshold', 'door_access_width_ft',
+                                             'include_local_stability_impact', 'red_tag_clear_time',
+                                             'red_tag_clear_beta', 'habitability_requirements',
+                                             'water_pressure_max_story', 'heat_utility', 'output_profile']},
+     'modules' : ['functionality', 'repair_schedule', 'preprocessing', 'fn_output_profile'],
+     'function' : fn_functionality_stage}
+    ]
+
+
+def fn_stage_order(stages):
+    '''Order the stages so each stage follows its upstream stages
+
+    Parameters
+    ----------
+    stages: list
+      stage definitions (see recovery_stages)
+
+    Returns
+    -------
+    ordered_stages: list
+      stage definitions in evaluation order (the listed order where
+      possible)'''
+
+    import sys
+
+    ordered_stages = []
+    ordered_names = []
+    remaining = list(stages)
+    while len(remaining) > 0:
+        ready = [stage for stage in remaining if all(name in ordered_names for name in stage['upstream'])]
+        if len(ready) == 0:
+            sys.exit('error! the recovery stages have a circular or missing dependency: ' + ', '.join(stage['name'] for stage in remaining))
+        ordered_stages.append(ready[0])
+        ordered_names.append(ready[0]['name'])
+        remaining.remove(ready[0])
+
+    return ordered_stages
+
+
+def fn_stage_modules(stage):
+    '''Modules and packages whose code a stage runs: the module of the stage
+    function and the modules the stage declares'''
+
+    return [stage['function'].__module__] + (stage['modules'] if 'modules' in stage.keys() else [])
+
+
+def fn_stage_seed(stage_seed, stage_name):
+    '''Seed of the random stream of a stage, derived from a common seed and
+    the stage name'''
+
+    import zlib
+
+    return int(np.random.SeedSequence([stage_seed, zlib.crc32(stage_name.encode())]).generate_state(1)[0])
+
+
+def fn_evaluate_stage(stage, state, inputs, copy_inputs):
+    '''Evaluate a stage, on copies of the inputs it reads if copy_inputs is
+    true (so the inputs can be reused by later runs)'''
+
+    stage_state = dict(state)
+    if copy_inputs:
+        for name in stage['inputs'] + list(stage['options'].keys()):
+            if stage_state[name] is inputs[name]:
+                stage_state[name] = copy.deepcopy(inputs[name])
+    outputs = stage['function'](stage_state)
+    state['evaluated_stages'].append(stage['name'])
+
+    return outputs
+
+
+def fn_run_recovery_dag(inputs, stage_cache = None, input_keys = None, copy_inputs = False, stages = None, stage_seed = None):
+    '''Evaluate the stages of the recovery assessment in dependency order
+
+    Parameters
+    ----------
+    inputs: dictionary
+      inputs of main_PBEE_recovery, by argument name
+
+    stage_cache: dictionary
+      optional stage cache (fn_stage_cache.fn_create_stage_cache). Stages
+      whose code, upstream stages, declared inputs and options and random
+      number generator state are unchanged are loaded rather than
+      re-evaluated.
+
+    input_keys: dictionary
+      precomputed content hashes of large inputs (e.g. input_keys['damage']
+      = fn_stage_cache.fn_content_hash(damage)), used in place of hashing
+      the input for each run
+
+    copy_inputs: logical
+      evaluate stages on copies of the inputs, leaving inputs unmodified
+
+    stages: list
+      stage definitions (default: recovery_stages)
+
+    stage_seed: int
+      if provided, each stage draws from its own random stream, seeded from
+      stage_seed and the stage name (see fn_stage_seed), so the random
+      numbers of a stage do not depend on the draws of the upstream stages
+      (common random numbers across runs with different options). Otherwise
+      all stages draw from numpy's global random state in turn.
+
+    Returns
+    -------
+    state: dictionary
+      the inputs, updated with the outputs of each stage (e.g.
+      state['damage'], state['impeding_factors'], state['recovery']);
+      state['stage_keys']: cache key of each stage (None without caching);
+      state['evaluated_stages']: stages evaluated rather than loaded'''
+
+    if stages == None:
+        stages = recovery_stages
+    if input_keys == None:
+        input_keys = {}
+
+    state = dict(inputs)
+    state['stage_keys'] = {}
+    state['evaluated_stages'] = []
+    for stage in fn_stage_order(stages):
+        if stage_seed != None:
+            np.random.seed(fn_stage_seed(stage_seed, stage['name']))
+        key_inputs = None
+        if stage_cache != None:
+            key_inputs = {'code' : fn_stage_cache.fn_code_version(fn_stage_modules(stage)),
+                          'upstream' : [state['stage_keys'][name] for name in stage['upstream']],
+                          'inputs' : [input_keys[name] if name in input_keys.keys() else inputs[name] for name in stage['inputs']],
+                          'options' : {name : [inputs[name][key] if key in inputs[name].keys() else None for key in stage['options'][name]]
+                                       for name in stage['options'].keys()}}
+        outputs, state['stage_keys'][stage['name']] = fn_stage_cache.fn_run_stage(stage_cache, stage['name'], key_inputs,
+                                                                                   fn_evaluate_stage, stage, state, inputs, copy_inputs)
+        state.update(outputs)
+
+    return state
+
+
+def fn_sweep_options(damage, damage_consequences, building_model,
+                     tenant_units, systems, subsystems, tmp_repair_class,
+                     impedance_options, impeding_factor_medians,
+                     repair_time_options, functionality,
+                     functionality_options, variants, seed = 0,
+                     stage_cache = None):
+    '''Run the recovery assessment for variants of the options, re-evaluating
+    only the stages affected by each variant
+
+    Parameters
+    ----------
+    damage, damage_consequences, building_model, tenant_units, systems,
+    subsystems, tmp_repair_class, impedance_options, impeding_factor_medians,
+    repair_time_options, functionality, functionality_options:
+      inputs of main_PBEE_recovery (not modified)
+
+    variants: list
+      changes of each variant, by input name, e.g.
+      [{'functionality_options' : {'exterior_safety_threshold' : 0.1}},
+       {'functionality_options' : {'exterior_safety_threshold' : 0.2}}]
+
+    seed: int
+      random seed of every variant, so variants share the simulated
+      upstream stages and differ only by their options
+
+    stage_cache: dictionary
+      stage cache (default: a new in-memory cache for the sweep)
+
+    Returns
+    -------
+    results: list
+      main_PBEE_recovery functionality outputs of each variant
+
+    evaluated_stages: list
+      stages evaluated (rather than reused) for each variant'''
+
+    from fn_output_profile import fn_check_output_profile, fn_apply_output_profile
+
+    if stage_cache == None:
+        stage_cache = fn_stage_cache.fn_create_stage_cache()
+
+    inputs = {'damage' : damage, 'damage_consequences' : damage_consequences, 'building_model' : building_model,
+              'tenant_units' : tenant_units, 'systems' : systems, 'subsystems' : subsystems,
+              'tmp_repair_class' : tmp_repair_class, 'impedance_options' : impedance_options,
+              'impeding_factor_medians' : impeding_factor_medians, 'repair_time_options' : repair_time_options,
+              'functionality' : functionality, 'functionality_options' : functionality_options}
+    input_keys = {'damage' : fn_stage_cache.fn_content_hash(damage)}
+
+    results = []
+    evaluated_stages = []
+    for variant in variants:
+        variant_inputs = dict(inputs)
+        for name in variant.keys():
+            variant_inputs[name] = copy.deepcopy(inputs[name])
+            variant_inputs[name].update(variant[name])
+        output_profile = fn_check_output_profile(variant_inputs['functionality_options']['output_profile']
+                                                 if 'output_profile' in variant_inputs['functionality_options'].keys() else 'full')
+
+        np.random.seed(seed)
+        state = fn_run_recovery_dag(variant_inputs, stage_cache, input_keys, copy_inputs = True)
+
+        variant_functionality = copy.deepcopy(functionality)
+        for key in ['impeding_factors', 'worker_data', 'building_repair_schedule', 'recovery']:
+            variant_functionality[key] = state[key]
+        results.append(fn_apply_output_profile(variant_functionality, output_profile))
+        evaluated_stages.append(state['evaluated_stages'])
+
+    return results, evaluated_stages
@@ -26,6 +26,7 @@ def fn_red_tag( calculate_red_tag, damage, comps, simulated_replacement_time):
       indicates the realizations that require inspection'''
     
     import numpy as np
+    from preprocessing import sparse_damage_fns
     
     def simulate_tagging(damage, comps, sc_ids, sc_thresholds):
         
@@ -45,7 +46,10 @@ def fn_red_tag( calculate_red_tag, damage, comps, simulated_replacement_time):
                 
                 dir_tag = np.zeros([num_reals, 3])
                 for direc in [1,2,3]: # Fix assume there are three direction, where direction 3 = nondirectional
-                    sc_dmg = np.array(damage['story'][s]['qnt_damaged_dir_' + str(direc)]) * sc_filt
+                    if 'sparse_damage' in damage.keys():
+                        dir_dmg = damage['sparse_damage']['story'][s]['qnt_damaged_dir_' + str(direc)] # safety class filter is applied to the columns below
+                    else:
+                        sc_dmg = np.array(damage['story'][s]['qnt_damaged_dir_' + str(direc)]) * sc_filt
                     num_comps = np.array(comps['story'][s]['qty_dir_' + str(direc)])
         
                     # For each structural system
@@ -67,7 +71,10 @@ def fn_red_tag( calculate_red_tag, damage, comps, simulated_replacement_time):
                             ser_filt_comp = np.array(comps['comp_table']['structural_series_id']) == series[ser] 
         
                             # Total damage within this series and system
-                            ser_dmg[:,ser] = np.sum(sc_dmg[:,ser_filt_ds & ss_filt_ds], axis=1)
+                            if 'sparse_damage' in damage.keys():
+                                ser_dmg[:,ser] = sparse_damage_fns.fn_sparse_row_sum(dir_dmg, ser_filt_ds & ss_filt_ds & sc_filt)
+                            else:
+                                ser_dmg[:,ser] = np.sum(sc_dmg[:,ser_filt_ds & ss_filt_ds], axis=1)
         
                             # Total number of components within this series and system
                             ser_qty[:,ser] = np.sum(num_comps[ser_filt_comp & ss_filt_comp])
@@ -83,7 +90,14 @@ def fn_red_tag( calculate_red_tag, damage, comps, simulated_replacement_time):
                         Take all damage that is part of this system at this story
                         in this direction that is damaged to this safety class
                         level, only where damage exceeds tagging threshold'''
-                        red_tag_impact = np.fmax(red_tag_impact, 1*sys_tag[:,sys].reshape(len(sys_tag),1) * ss_filt_ds.reshape(1,len(ss_filt_ds)) * sc_filt.reshape(1,len(ss_filt_ds)) * (sc_dmg>0))
+                        if 'sparse_damage' in damage.keys():
+                            # Only set the stored damaged entries of tagged realizations
+                            impact_cols = np.flatnonzero(ss_filt_ds & sc_filt)
+                            impact_dmg = dir_dmg[:, impact_cols].tocoo()
+                            is_impact = (impact_dmg.data > 0) & sys_tag[impact_dmg.row, sys]
+                            red_tag_impact[impact_dmg.row[is_impact], impact_cols[impact_dmg.col[is_impact]]] = 1
+                        else:
+                            red_tag_impact = np.fmax(red_tag_impact, 1*sys_tag[:,sys].reshape(len(sys_tag),1) * ss_filt_ds.reshape(1,len(ss_filt_ds)) * sc_filt.reshape(1,len(ss_filt_ds)) * (sc_dmg>0))
                     
                     
                     # Combine across all systems in this direction
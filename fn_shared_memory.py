@@ -0,0 +1,560 @@
+"""
+Shared-memory transport of the recovery assessment to pool workers: the per
+realization damage arrays, the comp_ds_table columns and the numeric columns
+of the static tables are published once in multiprocessing.shared_memory
+blocks, workers attach zero-copy views, and the per realization outputs of
+each chunk are written into shared output buffers
+"""
+import numpy as np
+from multiprocessing import shared_memory
+
+import fn_out_of_core
+import fn_output_profile
+
+# Inputs attached by each pool worker (see fn_init_worker)
+worker_state = {}
+
+
+def fn_share_array(values, blocks):
+    '''Copy an array into a new shared memory block
+
+    Parameters
+    ----------
+    values: array or list
+      numeric values to share (memory maps are copied without an extra
+      in-memory copy)
+
+    blocks: list
+      shared memory blocks of the transport, appended in place
+
+    Returns
+    -------
+    spec: dictionary
+      name, shape and dtype of the shared array (picklable, see
+      fn_attach_array)'''
+
+    values = np.asarray(values)
+    shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    shared_values = np.ndarray(np.shape(values), dtype=values.dtype, buffer=shm.buf)
+    shared_values[...] = values
+    blocks.append(shm)
+
+    spec = {'shm_name' : shm.name, 'shape' : np.shape(values), 'dtype' : values.dtype.str}
+
+    return spec
+
+
+def fn_attach_array(spec, blocks, writeable = False):
+    '''Attach a zero-copy view of a shared array
+
+    Parameters
+    ----------
+    spec: dictionary
+      output of fn_share_array
+
+    blocks: list
+      shared memory blocks attached by the process, appended in place (the
+      view is only valid while its block is open)
+
+    writeable: logical
+      allow writing into the shared array (output buffers). Inputs are
+      attached read-only so a worker cannot modify the inputs of the others.
+
+    Returns
+    -------
+    values: array
+      view of the shared array'''
+
+    shm = shared_memory.SharedMemory(name = spec['shm_name'])
+    blocks.append(shm)
+    values = np.ndarray(spec['shape'], dtype=np.dtype(spec['dtype']), buffer=shm.buf)
+    values.flags.writeable = writeable
+
+    return values
+
+
+def fn_share_table(table, blocks):
+    '''Share the numeric columns of a table (DataFrame or dictionary of
+    columns, e.g. comp_ds_table). Other columns (e.g. strings) are kept in
+    the spec and pickled.'''
+
+    import pandas as pd
+
+    columns = {}
+    for col in table.keys():
+        values = np.array(table[col])
+        if np.ndim(values) == 1 and values.dtype.kind in 'biuf':
+            columns[col] = {'shared' : fn_share_array(values, blocks)}
+        else:
+            columns[col] = {'values' : table[col]}
+
+    spec = {'is_dataframe' : isinstance(table, pd.DataFrame), 'columns' : columns}
+
+    return spec
+
+
+def fn_attach_table(spec, blocks):
+    '''Rebuild a table shared with fn_share_table. Dictionaries of columns
+    hold zero-copy views; DataFrames are rebuilt from the views.'''
+
+    import pandas as pd
+
+    table = {}
+    for col in spec['columns'].keys():
+        if 'shared' in spec['columns'][col].keys():
+            table[col] = fn_attach_array(spec['columns'][col]['shared'], blocks)
+        else:
+            table[col] = spec['columns'][col]['values']
+
+    if spec['is_dataframe']:
+        table = pd.DataFrame(table)
+
+    return table
+
+
+def fn_share_inputs(damage, damage_consequences, functionality, static_tables):
+    '''Publish the inputs of the recovery assessment in shared memory
+
+    Parameters
+    ----------
+    damage: dictionary
+      contains simulated damage info and damage state attributes (damage
+      arrays can be lists or memory maps)
+
+    damage_consequences: dictionary
+      simulated building consequences
+
+    functionality: dictionary
+      contains the simulated utility downtimes (functionality['utilities'])
+
+    static_tables: dictionary
+      DataFrames of the static tables (systems, subsystems, tmp_repair_class
+      and impeding_factor_medians)
+
+    Returns
+    -------
+    blocks: list
+      shared memory blocks created (release with fn_release_blocks, unlink =
+      True, once all workers are done)
+
+    spec: dictionary
+      picklable description of the shared inputs (see fn_attach_inputs)'''
+
+    blocks = []
+
+    ## Damage arrays of each tenant unit and story, and comp_ds_table columns
+    damage_spec = {key : damage[key] for key in damage.keys() if key not in ['tenant_units', 'story', 'comp_ds_table']}
+    for group, keys in [['tenant_units', fn_out_of_core.tenant_unit_damage_keys], ['story', fn_out_of_core.story_damage_keys]]:
+        if group not in damage.keys():
+            continue
+        damage_spec[group] = []
+        for i in range(len(damage[group])):
+            group_spec = {}
+            for key in damage[group][i].keys():
+                if key in keys:
+                    group_spec[key] = {'shared' : fn_share_array(np.asarray(damage[group][i][key], dtype=float), blocks)}
+                else:
+                    group_spec[key] = {'values' : damage[group][i][key]}
+            damage_spec[group].append(group_spec)
+    damage_spec['comp_ds_table'] = fn_share_table(damage['comp_ds_table'], blocks)
+
+    ## Per realization consequences and utility downtimes
+    num_reals = len(damage_consequences['simulated_replacement_time'])
+    damage_consequences_spec = {}
+    for key in damage_consequences.keys():
+        if np.ndim(damage_consequences[key]) >= 1 and len(damage_consequences[key]) == num_reals:
+            damage_consequences_spec[key] = {'shared' : fn_share_array(np.array(damage_consequences[key]), blocks)}
+        else:
+            damage_consequences_spec[key] = {'values' : damage_consequences[key]}
+
+    functionality_spec = {key : functionality[key] for key in functionality.keys() if key != 'utilities'}
+    functionality_spec['utilities'] = {key : fn_share_array(np.array(functionality['utilities'][key]), blocks)
+                                       for key in functionality['utilities'].keys()}
+
+    ## Static tables
+    static_tables_spec = {key : fn_share_table(static_tables[key], blocks) for key in static_tables.keys()}
+
+    spec = {'damage' : damage_spec,
+            'damage_consequences' : damage_consequences_spec,
+            'functionality' : functionality_spec,
+            'static_tables' : static_tables_spec,
+            'num_reals' : num_reals}
+
+    return blocks, spec
+
+
+def fn_attach_inputs(spec):
+    '''Attach the inputs published with fn_share_inputs
+
+    Parameters
+    ----------
+    spec: dictionary
+      output of fn_share_inputs
+
+    Returns
+    -------
+    blocks: list
+      shared memory blocks attached (close with fn_release_blocks when done)
+
+    inputs: dictionary
+      damage, damage_consequences, functionality and static_tables, with
+      read-only zero-copy views of the shared arrays'''
+
+    blocks = []
+
+    def fn_attach_value(value_spec):
+        if 'shared' in value_spec.keys():
+            return fn_attach_array(value_spec['shared'], blocks)
+        return value_spec['values']
+
+    damage = {key : spec['damage'][key] for key in spec['damage'].keys() if key not in ['tenant_units', 'story', 'comp_ds_table']}
+    for group in ['tenant_units', 'story']:
+        if group in spec['damage'].keys():
+            damage[group] = [{key : fn_attach_value(group_spec[key]) for key in group_spec.keys()} for group_spec in spec['damage'][group]]
+    damage['comp_ds_table'] = fn_attach_table(spec['damage']['comp_ds_table'], blocks)
+
+    damage_consequences = {key : fn_attach_value(spec['damage_consequences'][key]) for key in spec['damage_consequences'].keys()}
+
+    functionality = {key : spec['functionality'][key] for key in spec['functionality'].keys() if key != 'utilities'}
+    functionality['utilities'] = {key : fn_attach_array(spec['functionality']['utilities'][key], blocks)
+                                  for key in spec['functionality']['utilities'].keys()}
+
+    static_tables = {key : fn_attach_table(spec['static_tables'][key], blocks) for key in spec['static_tables'].keys()}
+
+    inputs = {'damage' : damage,
+              'damage_consequences' : damage_consequences,
+              'functionality' : functionality,
+              'static_tables' : static_tables}
+
+    return blocks, inputs
+
+
+def fn_create_output_buffers(probe_outputs, num_reals, probe_size, blocks):
+    '''Create shared output buffers [num_reals x ...] for the per realization
+    outputs of main_PBEE_recovery
+
+    Parameters
+    ----------
+    probe_outputs: dictionary
+      outputs of main_PBEE_recovery for a few realizations (sets the layout
+      and dtype of each buffer)
+
+    num_reals: int
+      total number of realizations
+
+    probe_size: int
+      number of realizations of probe_outputs
+
+    blocks: list
+      shared memory blocks of the transport, appended in place
+
+    Returns
+    -------
+    spec: dictionary
+      picklable description of the output buffers, with the output paths of
+      probe_outputs (see fn_attach_output_buffers)'''
+
+    spec = {}
+    for key in probe_outputs.keys():
+        value = probe_outputs[key]
+        if isinstance(value, dict) and key not in fn_out_of_core.aggregate_keys and fn_output_profile.fn_is_realization_statistics(value) == False:
+            spec[key] = fn_create_output_buffers(value, num_reals, probe_size, blocks)
+        elif fn_out_of_core.fn_is_per_realization(key, value, probe_size):
+            spec[key] = {'shared' : fn_share_array(np.zeros((num_reals,) + np.shape(value)[1:], dtype=value.dtype), blocks)}
+
+    return spec
+
+
+def fn_attach_output_buffers(spec, blocks):
+    '''Attach writeable views of the output buffers of fn_create_output_buffers'''
+
+    buffers = {}
+    for key in spec.keys():
+        if 'shared' in spec[key].keys() and isinstance(spec[key]['shared'], dict) and 'shm_name' in spec[key]['shared'].keys():
+            buffers[key] = fn_attach_array(spec[key]['shared'], blocks, writeable = True)
+        else:
+            buffers[key] = fn_attach_output_buffers(spec[key], blocks)
+
+    return buffers
+
+
+def fn_write_shared_outputs(chunk_outputs, buffers, start, stop):
+    '''Write the per realization outputs of a chunk into the shared output
+    buffers
+
+    Parameters
+    ----------
+    chunk_outputs: dictionary
+      outputs of main_PBEE_recovery for the chunk
+
+    buffers: dictionary
+      writeable views of the output buffers (fn_attach_output_buffers)
+
+    start, stop: int
+      realization index range of the chunk
+
+    Returns
+    -------
+    remaining: dictionary
+      outputs not written to the buffers, returned to the parent process:
+      aggregates of the chunk, and timelines (e.g. worker data) wider than
+      their buffer. Shorter timelines are padded with zeros.'''
+
+    remaining = {}
+    for key in chunk_outputs.keys():
+        value = chunk_outputs[key]
+        if isinstance(value, dict) and key not in fn_out_of_core.aggregate_keys and fn_output_profile.fn_is_realization_statistics(value) == False:
+            remaining[key] = fn_write_shared_outputs(value, buffers[key] if key in buffers.keys() else {}, start, stop)
+        elif (key in buffers.keys() and isinstance(buffers[key], np.ndarray) and fn_out_of_core.fn_is_per_realization(key, value, stop - start)
+              and np.ndim(value) == np.ndim(buffers[key]) and np.shape(value)[2:] == np.shape(buffers[key])[2:]
+              and (np.ndim(value) == 1 or np.size(value, 1) <= np.size(buffers[key], 1))):
+            if np.ndim(value) >= 2 and np.size(value, 1) < np.size(buffers[key], 1):
+                buffers[key][start:stop] = 0
+                buffers[key][start:stop, 0:np.size(value, 1)] = value
+            else:
+                buffers[key][start:stop] = value
+        else:
+            remaining[key] = value
+
+    return remaining
+
+
+def fn_collect_shared_outputs(buffers):
+    '''Copy the shared output buffers into process memory (before the
+    buffers are released)'''
+
+    outputs = {}
+    for key in buffers.keys():
+        if isinstance(buffers[key], dict):
+            outputs[key] = fn_collect_shared_outputs(buffers[key])
+        else:
+            outputs[key] = np.array(buffers[key])
+
+    return outputs
+
+
+def fn_merge_remaining_outputs(remaining, outputs, start, stop, num_reals):
+    '''Merge the outputs returned by a chunk (fn_write_shared_outputs) into
+    the collected outputs, in place: wide timelines are written into widened
+    per realization arrays, and aggregates are appended to a list with the
+    value of each chunk (see fn_out_of_core.fn_append_block_aggregate and
+    fn_combine_block_aggregates)'''
+
+    for key in remaining.keys():
+        value = remaining[key]
+        if isinstance(value, dict) and key not in fn_out_of_core.aggregate_keys and fn_output_profile.fn_is_realization_statistics(value) == False:
+            if key not in outputs.keys():
+                outputs[key] = {}
+            fn_merge_remaining_outputs(value, outputs[key], start, stop, num_reals)
+        elif fn_out_of_core.fn_is_per_realization(key, value, stop - start):
+            if key not in outputs.keys():
+                outputs[key] = np.zeros((num_reals,) + np.shape(value)[1:], dtype=value.dtype)
+            elif np.ndim(value) >= 2 and np.size(value, 1) > np.size(outputs[key], 1):
+                outputs[key] = np.pad(outputs[key], [(0, 0), (0, np.size(value, 1) - np.size(outputs[key], 1))] + [(0, 0)] * (np.ndim(value) - 2))
+            if np.ndim(value) >= 2 and np.size(value, 1) < np.size(outputs[key], 1):
+                outputs[key][start:stop] = 0
+                outputs[key][start:stop, 0:np.size(value, 1)] = value
+            else:
+                outputs[key][start:stop] = value
+        else:
+            fn_out_of_core.fn_append_block_aggregate(outputs, key, value, start)
+
+
+def fn_release_blocks(blocks, unlink = False):
+    '''Close shared memory blocks, and free them (unlink = True) in the
+    process that created them'''
+
+    for shm in blocks:
+        shm.close()
+        if unlink:
+            shm.unlink()
+    del blocks[:]
+
+
+def fn_init_worker(input_spec, output_spec, model_inputs):
+    '''Attach the shared inputs and output buffers once per pool worker
+
+    Parameters
+    ----------
+    input_spec: dictionary
+      output of fn_share_inputs
+
+    output_spec: dictionary
+      output of fn_create_output_buffers
+
+    model_inputs: dictionary
+      small inputs pickled to each worker (building_model, tenant_units,
+      impedance_options, repair_time_options and functionality_options)'''
+
+    blocks, inputs = fn_attach_inputs(input_spec)
+    worker_state['blocks'] = blocks
+    worker_state['inputs'] = inputs
+    worker_state['buffers'] = fn_attach_output_buffers(output_spec, blocks)
+    worker_state['model_inputs'] = model_inputs
+
+
+def fn_assess_shared_chunk(task):
+    '''Assess a chunk of realizations in a pool worker, from the shared
+    inputs attached by fn_init_worker
+
+    Parameters
+    ----------
+    task: list
+      [start, stop, seed]: realization index range of the chunk and seed of
+      its random variables (e.g. impeding times)
+
+    Returns
+    -------
+    start, stop: int
+      realization index range of the chunk
+
+    remaining: dictionary
+      outputs of the chunk not written to the shared output buffers (see
+      fn_write_shared_outputs)
+
+    recovery_days: dictionary
+      building level recovery day of each realization of the chunk, by
+      recovery state'''
+
+    import copy
+
+    start, stop, seed = task
+    inputs = worker_state['inputs']
+    model_inputs = worker_state['model_inputs']
+    static_tables = inputs['static_tables']
+
+    # Per realization inputs of the chunk are copied; comp_ds_table is used in place
+    damage = {key : inputs['damage'][key] for key in inputs['damage'].keys() if key != 'comp_ds_table'}
+    chunk_damage, chunk_damage_consequences, chunk_functionality = fn_out_of_core.fn_slice_realizations(damage, inputs['damage_consequences'], inputs['functionality'], start, stop)
+    chunk_damage['comp_ds_table'] = inputs['damage']['comp_ds_table']
+
+    np.random.seed(seed)
+    chunk_outputs, recovery_days = fn_out_of_core.fn_assess_realizations(chunk_damage, chunk_damage_consequences,
+                                          copy.deepcopy(model_inputs['building_model']), copy.deepcopy(model_inputs['tenant_units']),
+                                          static_tables['systems'].copy(), static_tables['subsystems'].copy(),
+                                          static_tables['tmp_repair_class'].copy(), copy.deepcopy(model_inputs['impedance_options']),
+                                          static_tables['impeding_factor_medians'].copy(), copy.deepcopy(model_inputs['repair_time_options']),
+                                          chunk_functionality, copy.deepcopy(model_inputs['functionality_options']))
+
+    remaining = fn_write_shared_outputs(chunk_outputs, worker_state['buffers'], start, stop)
+
+    return start, stop, remaining, recovery_days
+
+
+def fn_run_shared_pool(damage, damage_consequences, building_model,
+                       tenant_units, systems, subsystems, tmp_repair_class,
+                       impedance_options, impeding_factor_medians,
+                       repair_time_options, functionality,
+                       functionality_options, max_workers = None,
+                       memory_budget_mb = None, seed = None, probe_size = 10):
+    '''Perform the recovery assessment in chunks of realizations assessed by
+    a pool of worker processes, with the inputs and per realization outputs
+    transported in shared memory
+
+    Parameters
+    ----------
+    damage, damage_consequences, building_model, tenant_units, systems,
+    subsystems, tmp_repair_class, impedance_options, impeding_factor_medians,
+    repair_time_options, functionality, functionality_options:
+      inputs of main_PBEE_recovery. The damage arrays can be lists or memory
+      maps (see fn_out_of_core.fn_damage_memmap).
+
+    max_workers: int
+      largest number of worker processes (default: number of CPUs)
+
+    memory_budget_mb: number
+      memory budget of the workers (MB). Chunks and the number of workers
+      are sized with fn_memory_plan. Default: one chunk per worker.
+
+    seed: int
+      random seed of the chunk seeds (default: drawn from numpy's global
+      random state)
+
+    probe_size: int
+      realizations assessed in the parent process to lay out the shared
+      output buffers (outputs discarded)
+
+    Returns
+    -------
+    functionality: dictionary
+      main_PBEE_recovery outputs. Per realization outputs are arrays
+      [num_reals x ...]; aggregates and the statistics of the summary output
+      profile are combined across chunks (see
+      fn_out_of_core.fn_combine_block_aggregates), except the building level
+      recovery day statistics and performance targets, which are recomputed
+      from all realizations.
+
+    Notes
+    -----
+    Each chunk simulates its own random variables from its own seed, so
+    results do not depend on the number of workers or the order the chunks
+    finish in, and are statistically, not numerically, equivalent to a
+    single run. The inputs are published once rather than pickled to each
+    worker; the per realization outputs of all realizations are held in
+    memory (use fn_out_of_core.fn_run_realization_blocks for outputs larger
+    than memory).'''
+
+    import os
+    import copy
+    import multiprocessing
+    import fn_memory_plan
+
+    ## Plan chunks and workers
+    num_reals = len(damage_consequences['simulated_replacement_time'])
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+    precision = functionality_options['precision'] if 'precision' in functionality_options.keys() else 'float64'
+    estimate = fn_memory_plan.fn_estimate_memory(building_model, tenant_units, damage['comp_ds_table'], len(systems), precision)
+    if memory_budget_mb == None:
+        # No memory limit: one chunk per worker
+        memory_budget_mb = max_workers * (estimate['base_mb'] + estimate['bytes_per_realization'] / 1e6) + num_reals * estimate['bytes_per_realization'] / 1e6
+    plan = fn_memory_plan.fn_plan_chunks(num_reals, memory_budget_mb, estimate, max_workers)
+    chunks = fn_out_of_core.fn_realization_blocks(num_reals, plan['chunk_size'])
+    if seed == None:
+        seed = np.random.randint(2**31 - 1)
+    chunk_seeds = np.random.SeedSequence(seed).generate_state(len(chunks))
+
+    static_tables = {'systems' : systems, 'subsystems' : subsystems,
+                     'tmp_repair_class' : tmp_repair_class,
+                     'impeding_factor_medians' : impeding_factor_medians}
+    model_inputs = {'building_model' : building_model, 'tenant_units' : tenant_units,
+                    'impedance_options' : impedance_options, 'repair_time_options' : repair_time_options,
+                    'functionality_options' : functionality_options}
+
+    blocks = []
+    try:
+        ## Publish the inputs
+        input_blocks, input_spec = fn_share_inputs(damage, damage_consequences, functionality, static_tables)
+        blocks.extend(input_blocks)
+
+        ## Lay out the output buffers from a probe of a few realizations
+        probe_size = int(min(probe_size, num_reals))
+        probe_damage, probe_damage_consequences, probe_functionality = fn_out_of_core.fn_slice_realizations(damage, damage_consequences, functionality, 0, probe_size)
+        probe_outputs, _ = fn_out_of_core.fn_assess_realizations(probe_damage, probe_damage_consequences,
+                                              copy.deepcopy(building_model), copy.deepcopy(tenant_units),
+                                              systems.copy(), subsystems.copy(), tmp_repair_class.copy(),
+                                              copy.deepcopy(impedance_options), impeding_factor_medians.copy(),
+                                              copy.deepcopy(repair_time_options), probe_functionality,
+                                              copy.deepcopy(functionality_options))
+        output_spec = fn_create_output_buffers(probe_outputs, num_reals, probe_size, blocks)
+        del probe_damage, probe_damage_consequences, probe_functionality, probe_outputs
+
+        ## Assess the chunks
+        tasks = [[start, stop, int(chunk_seed)] for (start, stop), chunk_seed in zip(chunks, chunk_seeds)]
+        with multiprocessing.Pool(processes = plan['num_workers'], initializer = fn_init_worker,
+                                  initargs = (input_spec, output_spec, model_inputs)) as pool:
+            chunk_results = pool.map(fn_assess_shared_chunk, tasks, chunksize = 1)
+
+        ## Collect the outputs
+        output_blocks = []
+        outputs = fn_collect_shared_outputs(fn_attach_output_buffers(output_spec, output_blocks))
+        fn_release_blocks(output_blocks)
+    finally:
+        fn_release_blocks(blocks, unlink = True)
+
+    for start, stop, remaining, _ in chunk_results:
+        fn_merge_remaining_outputs(remaining, outputs, start, stop, num_reals)
+    fn_out_of_core.fn_combine_block_aggregates(outputs, [stop - start for start, stop in chunks])
+    fn_out_of_core.fn_building_performance_targets(outputs, fn_out_of_core.fn_concatenate_recovery_days([result[3] for result in chunk_results]))
+
+    return outputs
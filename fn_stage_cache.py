@@ -0,0 +1,313 @@
+"""
+Content-addressed cache of the recovery assessment stages (preprocessing,
+red tag, impeding factors, repair schedule and functionality) and of whole
+assessments. Each entry is stored under a hash of the exact inputs of the
+stage (the hash of the upstream stage standing in for its outputs), its
+options, the state of numpy's random number generator, the cache format
+version and the source code of the modules the stage runs, so reruns reuse
+the upstream stages whose inputs and code are unchanged and recompute only
+the downstream stages. Entries are pickle files (or pickled in memory),
+evicted least recently used first when the cache exceeds its size.
+"""
+import os
+import pickle
+import hashlib
+import numpy as np
+
+# Version of the layout of the cache entries (change to invalidate all entries)
+cache_format_version = 2
+
+# Source hash of each module or package (see fn_code_version)
+module_versions = {}
+
+
+def fn_create_stage_cache(cache_dir = None, max_size_mb = 1000):
+    '''Create (or open) a stage cache
+
+    Parameters
+    ----------
+    cache_dir: string
+      directory of the cache entries (created if needed, and reused by later
+      runs). If None, the entries are kept in memory, e.g. to share stages
+      across an option sweep.
+
+    max_size_mb: number
+      largest total size of the cache entries (MB)
+
+    Returns
+    -------
+    stage_cache: dictionary
+      stage_cache['cache_dir'] and ['max_size_mb'], and stage_cache['stats']:
+      number of hits and misses of each stage in this session. In-memory
+      caches keep their entries in stage_cache['entries'] (least recently
+      used first).'''
+
+    from collections import OrderedDict
+
+    if cache_dir != None and os.path.exists(cache_dir) == False:
+        os.makedirs(cache_dir)
+
+    stage_cache = {'cache_dir' : cache_dir,
+                   'max_size_mb' : max_size_mb,
+                   'stats' : {}}
+    if cache_dir == None:
+        stage_cache['entries'] = OrderedDict()
+
+    return stage_cache
+
+
+def fn_hash_value(value, hasher):
+    '''Update a hash with the content of a value (dictionaries, lists, arrays,
+    DataFrames and scalars). Numeric lists and arrays of equal values hash
+    equally.'''
+
+    import pandas as pd
+
+    if isinstance(value, dict):
+        hasher.update(b'dict')
+        for key in sorted(value.keys(), key=str):
+            hasher.update(repr(key).encode())
+            fn_hash_value(value[key], hasher)
+    elif isinstance(value, pd.DataFrame):
+        hasher.update(b'table')
+        for col in value.columns:
+            hasher.update(repr(col).encode())
+            fn_hash_value(value[col].to_numpy(), hasher)
+    elif isinstance(value, (list, tuple, np.ndarray)):
+        try:
+            values = np.asarray(value)
+        except ValueError:
+            values = None # ragged
+        if values is not None and values.dtype.kind in 'biuf':
+            hasher.update(b'array' + values.dtype.str.encode() + repr(np.shape(values)).encode())
+            hasher.update(np.ascontiguousarray(values).tobytes())
+        else:
+            hasher.update(b'list' + str(len(value)).encode())
+            for item in value:
+                fn_hash_value(item, hasher)
+    else:
+        hasher.update(type(value).__name__.encode() + repr(value).encode())
+
+
+def fn_content_hash(value):
+    '''Hash (hex digest) of the content of a value, e.g. to key the
+    simulated damage once for several stages'''
+
+    hasher = hashlib.sha256()
+    fn_hash_value(value, hasher)
+
+    return hasher.hexdigest()
+
+
+def fn_code_version(module_names):
+    '''Hash (hex digest) of the source code of modules and packages (all
+    .py files of a package), e.g. to key a stage by the code that computes
+    it. Each module is hashed once per session.
+
+    Parameters
+    ----------
+    module_names: list
+      importable module or package names (e.g. 'fn_red_tag',
+      'repair_schedule')
+
+    Returns
+    -------
+    code_version: string
+      hash of the sources of all the modules'''
+
+    import importlib
+
+    hasher = hashlib.sha256()
+    for name in sorted(set(module_names)):
+        if name not in module_versions.keys():
+            module = importlib.import_module(name)
+            if hasattr(module, '__path__'):
+                package_dir = list(module.__path__)[0]
+                file_paths = sorted(os.path.join(dir_path, file_name) for dir_path, _, file_names in os.walk(package_dir)
+                                    for file_name in file_names if file_name.endswith('.py'))
+            else:
+                package_dir = os.path.dirname(module.__file__)
+                file_paths = [module.__file__]
+            module_hasher = hashlib.sha256()
+            for file_path in file_paths:
+                module_hasher.update(os.path.relpath(file_path, package_dir).encode())
+                with open(file_path, 'rb') as f:
+                    module_hasher.update(f.read())
+            module_versions[name] = module_hasher.hexdigest()
+        hasher.update(name.encode() + module_versions[name].encode())
+
+    return hasher.hexdigest()
+
+
+def fn_stage_key(stage, key_inputs):
+    '''Cache key of a stage: hash of the cache format version, the stage
+    name, its inputs (including the code version of the stage, see
+    fn_code_version) and the current state of numpy's random number
+    generator'''
+
+    hasher = hashlib.sha256(('format ' + str(cache_format_version) + ' ').encode())
+    hasher.update(stage.encode())
+    fn_hash_value(key_inputs, hasher)
+    fn_hash_value(list(np.random.get_state()), hasher)
+
+    return hasher.hexdigest()
+
+
+def fn_cache_get(stage_cache, stage, key):
+    '''Look up the cached outputs of a stage
+
+    Returns
+    -------
+    is_cached: logical
+      true on a hit. The random number generator is then set to the state
+      the stage left it in. Entries that fail to load or were stored with
+      another cache format or key are misses.
+
+    outputs:
+      cached outputs of the stage (None on a miss)'''
+
+    if stage not in stage_cache['stats'].keys():
+        stage_cache['stats'][stage] = {'hits' : 0, 'misses' : 0}
+
+    entry = fn_cache_load(stage_cache, stage + '_' + key)
+    if (isinstance(entry, dict) == False or 'format' not in entry.keys() or entry['format'] != cache_format_version
+            or 'key' not in entry.keys() or entry['key'] != key):
+        stage_cache['stats'][stage]['misses'] += 1
+        return False, None
+
+    stage_cache['stats'][stage]['hits'] += 1
+    np.random.set_state(entry['rng_state'])
+
+    return True, entry['outputs']
+
+
+def fn_cache_put(stage_cache, stage, key, outputs):
+    '''Store the outputs of a stage, with the state the stage left the
+    random number generator in'''
+
+    fn_cache_store(stage_cache, stage + '_' + key, {'format' : cache_format_version, 'key' : key,
+                                                    'outputs' : outputs, 'rng_state' : np.random.get_state()})
+
+
+def fn_run_stage(stage_cache, stage, key_inputs, stage_fnc, *stage_args):
+    '''Run a stage of the assessment, or reuse its cached outputs
+
+    Parameters
+    ----------
+    stage_cache: dictionary
+      output of fn_create_stage_cache. If None, the stage is run without
+      caching.
+
+    stage: string
+      name of the stage
+
+    key_inputs: list
+      everything the stage outputs depend on: its inputs and options, with
+      the key of the upstream stage standing in for outputs of upstream
+      stages
+
+    stage_fnc: function
+      function that runs the stage
+
+    stage_args:
+      arguments of stage_fnc
+
+    Returns
+    -------
+    outputs:
+      outputs of stage_fnc (loaded from the cache on a hit)
+
+    key: string
+      cache key of the stage (None without caching), used as an input key of
+      the downstream stages'''
+
+    if stage_cache == None:
+        return stage_fnc(*stage_args), None
+
+    key = fn_stage_key(stage, key_inputs)
+    is_cached, outputs = fn_cache_get(stage_cache, stage, key)
+    if is_cached == False:
+        outputs = stage_fnc(*stage_args)
+        fn_cache_put(stage_cache, stage, key, outputs) # before downstream stages modify the outputs
+
+    return outputs, key
+
+
+def fn_cache_load(stage_cache, entry_name):
+    '''Load a cache entry (None if not cached or if it fails to unpickle),
+    and mark it as recently used'''
+
+    if stage_cache['cache_dir'] == None:
+        if entry_name not in stage_cache['entries'].keys():
+            return None
+        stage_cache['entries'].move_to_end(entry_name)
+        try:
+            return pickle.loads(stage_cache['entries'][entry_name])
+        except Exception:
+            return None
+
+    file_path = os.path.join(stage_cache['cache_dir'], entry_name + '.pkl')
+    try:
+        with open(file_path, 'rb') as f:
+            entry = pickle.load(f)
+        os.utime(file_path)
+    except OSError:
+        return None # not cached or evicted
+    except Exception:
+        return None # partially written, or pickled by code that has since changed (e.g. a removed class)
+
+    return entry
+
+
+def fn_cache_store(stage_cache, entry_name, entry):
+    '''Store a cache entry, then evict the least recently used entries until
+    the cache fits its size'''
+
+    if stage_cache['cache_dir'] == None:
+        # Pickled, so later changes to the outputs do not change the entry
+        stage_cache['entries'][entry_name] = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        stage_cache['entries'].move_to_end(entry_name)
+        fn_evict_entries(stage_cache)
+        return
+
+    file_path = os.path.join(stage_cache['cache_dir'], entry_name + '.pkl')
+    tmp_path = file_path + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, file_path)
+
+    fn_evict_entries(stage_cache)
+
+
+def fn_evict_entries(stage_cache):
+    '''Remove the least recently used cache entries until the total size of
+    the cache is within stage_cache['max_size_mb']'''
+
+    if stage_cache['cache_dir'] == None:
+        entries = stage_cache['entries']
+        total_size = np.sum([len(entry) for entry in entries.values()])
+        while len(entries) > 0 and total_size > stage_cache['max_size_mb'] * 1e6:
+            _, entry = entries.popitem(last = False)
+            total_size = total_size - len(entry)
+        return
+
+    entries = []
+    for file_name in os.listdir(stage_cache['cache_dir']):
+        if file_name.endswith('.pkl'):
+            file_path = os.path.join(stage_cache['cache_dir'], file_name)
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                continue
+            entries.append([file_stat.st_mtime, file_stat.st_size, file_path])
+
+    entries.sort()
+    total_size = np.sum([entry[1] for entry in entries])
+    for _, size, file_path in entries:
+        if total_size <= stage_cache['max_size_mb'] * 1e6:
+            break
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+        total_size = total_size - size
@@ -0,0 +1,74 @@
+def fn_validate_precision(damage, damage_consequences, building_model,
+                          tenant_units, systems, subsystems, tmp_repair_class,
+                          impedance_options, impeding_factor_medians,
+                          repair_time_options, functionality,
+                          functionality_options, percentiles = [10, 50, 90],
+                          tolerance_days = 1, tolerance_prob = 0.01, seed = 0):
+    '''Run the recovery assessment in double and single precision with the
+    same random numbers, and check that the recovery statistics agree
+
+    Parameters
+    ----------
+    damage, damage_consequences, building_model, tenant_units, systems,
+    subsystems, tmp_repair_class, impedance_options, impeding_factor_medians,
+    repair_time_options, functionality, functionality_options:
+      inputs of main_PBEE_recovery. The inputs are copied for each run, so
+      they are not modified.
+
+    percentiles: list
+      percentiles of the building level recovery days to compare
+
+    tolerance_days: number
+      largest accepted difference in the recovery day percentiles (days)
+
+    tolerance_prob: number
+      largest accepted difference in the probabilities of exceeding the
+      performance target days
+
+    seed: int
+      random seed used for both runs
+
+    Returns
+    -------
+    validation: dictionary
+      recovery day percentiles and probabilities of exceeding the performance
+      target days for reoccupancy and function in each precision, the
+      largest difference of each, and whether all differences are within
+      tolerance (validation['within_tolerance'])'''
+
+    import copy
+    import numpy as np
+    from main_PBEE_recovery import main_PBEE_recovery
+
+    ## Run the assessment in each precision
+    recovery = {}
+    for precision in ['float64', 'float32']:
+        options = copy.deepcopy(functionality_options)
+        options['precision'] = precision
+        options['output_profile'] = 'standard' # per realization recovery days are needed
+
+        np.random.seed(seed)
+        outputs, _ = main_PBEE_recovery(copy.deepcopy(damage), copy.deepcopy(damage_consequences),
+                                        copy.deepcopy(building_model), copy.deepcopy(tenant_units),
+                                        systems.copy(), subsystems.copy(), tmp_repair_class.copy(),
+                                        copy.deepcopy(impedance_options), impeding_factor_medians.copy(),
+                                        copy.deepcopy(repair_time_options), copy.deepcopy(functionality),
+                                        options)
+        recovery[precision] = outputs['recovery']
+
+    ## Compare recovery statistics
+    validation = {'float64' : {}, 'float32' : {}, 'max_difference' : {}, 'within_tolerance' : True}
+    for state in ['reoccupancy', 'functional']:
+        for precision in ['float64', 'float32']:
+            building_level = recovery[precision][state]['building_level']
+            validation[precision][state] = {'percentiles' : percentiles,
+                                            'recovery_day' : np.percentile(building_level['recovery_day'], percentiles),
+                                            'prob_of_target' : np.array(building_level['prob_of_target'])}
+
+        day_diff = np.max(np.abs(validation['float32'][state]['recovery_day'] - validation['float64'][state]['recovery_day']))
+        prob_diff = np.max(np.abs(validation['float32'][state]['prob_of_target'] - validation['float64'][state]['prob_of_target']))
+        validation['max_difference'][state] = {'recovery_day' : day_diff, 'prob_of_target' : prob_diff}
+        if day_diff > tolerance_days or prob_diff > tolerance_prob:
+            validation['within_tolerance'] = False
+
+    return validation
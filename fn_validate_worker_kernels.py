@@ -0,0 +1,155 @@
+def fn_random_story_inputs(rng, num_reals, num_stories):
+    '''Randomized inputs of the story worker allocation
+    (fn_allocate_workers_stories): undamaged stories and a few crews larger
+    than the building worker limit are drawn, so the fallback scheduler is
+    exercised too
+
+    Returns
+    -------
+    inputs: list
+      total_worker_days, required_workers_per_story, average_crew_size,
+      max_crews_building and max_workers_per_building'''
+
+    import numpy as np
+
+    is_damaged = rng.random((num_reals, num_stories)) < 0.7
+    total_worker_days = np.round(rng.lognormal(3, 1.5, (num_reals, num_stories)), int(rng.integers(0, 3))) * is_damaged
+    average_crew_size = rng.integers(1, 8, (num_reals, num_stories)).astype(float)
+    max_workers_per_building = int(rng.integers(20, 80))
+    num_crews = rng.integers(1, 4, (num_reals, num_stories))
+    num_crews[rng.random((num_reals, num_stories)) < 0.01] = max_workers_per_building # more workers than the building allows
+    required_workers_per_story = average_crew_size * num_crews * is_damaged
+    max_crews_building = rng.integers(1, 2 * num_stories, num_reals).astype(float)
+
+    return [total_worker_days, required_workers_per_story, average_crew_size, max_crews_building, max_workers_per_building]
+
+
+def fn_random_system_inputs(rng, systems, num_reals, repair_type):
+    '''Randomized inputs of the system worker allocation
+    (fn_allocate_workers_systems): repair days, crew sizes, per realization
+    priorities, red tags and impeding factors, with the repair constraints of
+    the repair type (fn_set_repair_constraints)
+
+    Returns
+    -------
+    inputs: list
+      systems, sys_repair_days, sys_crew_size, max_workers_per_building,
+      sys_idx_priority_matrix, sys_constraint_matrix, condition_tag and
+      sys_impeding_factors'''
+
+    import numpy as np
+    from repair_schedule import other_repair_schedule_functions
+
+    num_sys = len(systems)
+    is_damaged = rng.random((num_reals, num_sys)) < 0.6
+    sys_repair_days = np.round(rng.lognormal(3, 1.5, (num_reals, num_sys)), int(rng.integers(0, 3))) * is_damaged
+    max_workers_per_building = int(rng.integers(10, 80))
+    sys_crew_size = rng.integers(1, max_workers_per_building + 1, (num_reals, num_sys)) * is_damaged
+    sys_crew_size[rng.random((num_reals, num_sys)) < 0.01] = max_workers_per_building + 1 # more workers than the building allows
+    sys_idx_priority_matrix = np.argsort(rng.random((num_reals, num_sys)), axis=1)
+    condition_tag = rng.random(num_reals) < 0.3
+    sys_constraint_matrix = other_repair_schedule_functions.fn_set_repair_constraints(systems, repair_type, condition_tag)
+    if rng.random() < 0.2:
+        sys_impeding_factors = np.zeros((0, 0)) # repair times without impeding factors
+    else:
+        sys_impeding_factors = np.ceil(rng.lognormal(4, 1, (num_reals, num_sys))) * (rng.random((num_reals, num_sys)) < 0.8)
+
+    return [systems, sys_repair_days, sys_crew_size, max_workers_per_building,
+            sys_idx_priority_matrix, sys_constraint_matrix, condition_tag, sys_impeding_factors]
+
+
+def fn_validate_worker_kernels(num_trials = 50, num_reals = 200, num_stories = 8, seed = 0):
+    '''Run the numpy and numba worker allocation backends on randomized
+    allocation inputs, and check that they agree bit for bit (each backend
+    runs on its own copy of the inputs, which the numpy allocation updates
+    in place)
+
+    Parameters
+    ----------
+    num_trials: int
+      number of randomized inputs of each allocation (stories, and systems
+      for full and temporary repairs)
+
+    num_reals: int
+      realizations of each randomized input
+
+    num_stories: int
+      stories of the randomized story allocations
+
+    seed: int
+      random seed of the inputs
+
+    Returns
+    -------
+    validation: dictionary
+      validation['numba_available']: whether the kernels were compiled
+      (otherwise they ran as plain python); for 'stories' and 'systems', the
+      number of trials and the trials where any output differs, with the
+      names of the differing outputs; validation['bit_for_bit']: true if
+      every output of every trial is identical'''
+
+    import os
+    import copy
+    import numpy as np
+    import pandas as pd
+    from repair_schedule import other_repair_schedule_functions
+    from repair_schedule import worker_allocation_kernels
+
+    rng = np.random.default_rng(seed)
+    systems = pd.read_csv(os.path.join(os.path.dirname(__file__), 'static_tables', 'systems.csv'))
+
+    def fn_compare_outputs(numpy_outputs, numba_outputs, names):
+        mismatches = []
+        for name, numpy_output, numba_output in zip(names, numpy_outputs, numba_outputs):
+            if isinstance(numpy_output, dict):
+                is_equal = numpy_output == numba_output
+            else:
+                is_equal = (np.shape(numpy_output) == np.shape(numba_output) and np.asarray(numpy_output).dtype == np.asarray(numba_output).dtype
+                            and np.array_equal(numpy_output, numba_output, equal_nan=True))
+            if is_equal == False:
+                mismatches.append(name)
+        return mismatches
+
+    validation = {'numba_available' : worker_allocation_kernels.NUMBA_AVAILABLE,
+                  'stories' : {'num_trials' : 0, 'mismatched_trials' : []},
+                  'systems' : {'num_trials' : 0, 'mismatched_trials' : []}}
+
+    ## Story allocations
+    story_output_names = ['repair_start_day', 'repair_complete_day', 'max_workers_per_story', 'convergence']
+    for trial in range(num_trials):
+        inputs = fn_random_story_inputs(rng, num_reals, num_stories)
+        numpy_outputs = other_repair_schedule_functions.fn_allocate_workers_stories(*copy.deepcopy(inputs))
+        numba_outputs = worker_allocation_kernels.fn_allocate_workers_stories_numba(*copy.deepcopy(inputs))
+        mismatches = fn_compare_outputs(numpy_outputs, numba_outputs, story_output_names)
+        if len(mismatches) > 0:
+            validation['stories']['mismatched_trials'].append({'trial' : trial, 'outputs' : mismatches})
+        validation['stories']['num_trials'] += 1
+
+    ## System allocations
+    system_output_names = ['repair_complete_day_per_system', 'total_workers', 'day_vector', 'convergence']
+    for repair_type in ['full', 'temp']:
+        for trial in range(num_trials):
+            inputs = fn_random_system_inputs(rng, systems, num_reals, repair_type)
+            numpy_complete_day, numpy_worker_data = other_repair_schedule_functions.fn_allocate_workers_systems(*copy.deepcopy(inputs))
+            numba_complete_day, numba_worker_data = worker_allocation_kernels.fn_allocate_workers_systems_numba(*copy.deepcopy(inputs))
+            mismatches = fn_compare_outputs([numpy_complete_day] + [numpy_worker_data[key] for key in system_output_names[1:]],
+                                            [numba_complete_day] + [numba_worker_data[key] for key in system_output_names[1:]],
+                                            system_output_names)
+            if len(mismatches) > 0:
+                validation['systems']['mismatched_trials'].append({'repair_type' : repair_type, 'trial' : trial, 'outputs' : mismatches})
+            validation['systems']['num_trials'] += 1
+
+    validation['bit_for_bit'] = len(validation['stories']['mismatched_trials']) == 0 and len(validation['systems']['mismatched_trials']) == 0
+
+    return validation
+
+
+if __name__ == '__main__':
+
+    validation = fn_validate_worker_kernels()
+    print('numba available: ' + str(validation['numba_available']))
+    for allocation in ['stories', 'systems']:
+        print(allocation + ': ' + str(len(validation[allocation]['mismatched_trials'])) + ' of ' +
+              str(validation[allocation]['num_trials']) + ' randomized trials differ ' + str(validation[allocation]['mismatched_trials']))
+    print('numba and numpy worker allocations agree bit for bit' if validation['bit_for_bit'] else
+          'error! numba and numpy worker allocations differ')
@@ -41,6 +41,7 @@ def fn_calculate_functionality(damage, damage_consequences, utilities,
     ## Initial Set Up
     # import packages
     from functionality import other_functionality_functions
+    output_profile = functionality_options['output_profile'] if 'output_profile' in functionality_options.keys() else 'full'
     
     ## Define the day each system becomes functionl - Building level
     system_operation_day = other_functionality_functions.fn_building_level_system_operation(damage, 
@@ -67,14 +68,15 @@ def fn_calculate_functionality(damage, damage_consequences, utilities,
     ## Reformat outputs into functionality data strucutre
     functional = other_functionality_functions.fn_extract_recovery_metrics(day_tenant_unit_functional,
         recovery_day, comp_breakdowns, damage['comp_ds_table']['comp_id'], 
-        damage_consequences['simulated_replacement_time'])
+        damage_consequences['simulated_replacement_time'], damage['comp_groups'], output_profile)
     
     ## get the combined component breakdown between reoccupancy and function
     functional['breakdowns']['component_combined'] = other_functionality_functions.fn_combine_comp_breakdown(damage['comp_ds_table'], 
     functional['breakdowns']['perform_targ_days'], # assumes names are consistent in both objects
     functional['breakdowns']['comp_names'], # assumes names are consistent in both objects
     reoccupancy['breakdowns']['component_breakdowns_all_reals'],
-    functional['breakdowns']['component_breakdowns_all_reals'])
+    functional['breakdowns']['component_breakdowns_all_reals'],
+    damage['comp_groups'])
     
     return functional, recovery_day, comp_breakdowns
 
@@ -38,6 +38,7 @@ def fn_calculate_reoccupancy(damage, damage_consequences, utilities,
     # Import packages
     
     from functionality import other_functionality_functions    
+    output_profile = functionality_options['output_profile'] if 'output_profile' in functionality_options.keys() else 'full'
         
     ## Stage 1: Quantify the effect that component damage has on the building safety
     recovery_day={}
@@ -56,7 +57,6 @@ def fn_calculate_reoccupancy(damage, damage_consequences, utilities,
     if len(damage['tenant_units']) !=1: #FZ# Story is accessible on day zero for 1 story building
         for i in range(len(damage['tenant_units'])):
             # damage['tenant_units'][i]['num_comps'].pop(-1) 
-            damage['tenant_units'][i]['recovery']['repair_complete_day'] = damage['tenant_units'][i]['recovery']['repair_complete_day'][:,0:len(damage['comp_ds_table']['comp_id'])]
             for j in range(len(damage['tenant_units'][0]['qnt_damaged'])):
                 damage['tenant_units'][i]['qnt_damaged'][j].pop(-1)
         
@@ -86,6 +86,7 @@ def fn_calculate_reoccupancy(damage, damage_consequences, utilities,
     reoccupancy = other_functionality_functions.fn_extract_recovery_metrics(day_tenant_unit_reoccupiable, 
                                               recovery_day, comp_breakdowns, 
                                               damage['comp_ds_table']['comp_id'],
-                                              damage_consequences['simulated_replacement_time'])
+                                              damage_consequences['simulated_replacement_time'],
+                                              damage['comp_groups'], output_profile)
 
     return reoccupancy, recovery_day, comp_breakdowns
\ No newline at end of file
@@ -1,5 +1,5 @@
 def fn_check_habitability( damage, damage_consequences, reoc_meta, func_meta, 
-                          habitability_requirements):
+                          habitability_requirements, output_profile = 'full'):
     '''Overwrite reocuppancy with additional checks from the functionality check
     
     Parameters
@@ -16,6 +16,9 @@ def fn_check_habitability( damage, damage_consequences, reoc_meta, func_meta,
       meta data from functionality assessment
     habitability_requirements: dictionary
       basic requirements for habitability beyond basic reoccupancy.
+    output_profile: string, optional
+      output profile of the recovery metrics (see
+      other_functionality_functions.fn_extract_recovery_metrics)
     
     Returns
     -------
@@ -53,7 +56,8 @@ def fn_check_habitability( damage, damage_consequences, reoc_meta, func_meta,
     reoccupancy = other_functionality_functions.fn_extract_recovery_metrics(day_tenant_unit_reoccupiable, 
                                               recovery_day, comp_breakdowns, 
                                               damage['comp_ds_table']['comp_id'],
-                                              damage_consequences['simulated_replacement_time'])
+                                              damage_consequences['simulated_replacement_time'],
+                                              damage['comp_groups'], output_profile)
     
     return reoccupancy
 
@@ -32,12 +32,17 @@ def main_functionality(damage, building_model, damage_consequences,
      recovery trajectorires, and contributions from systems and components 
     recovery['functional']: dictionary
      contains data on the recovery of tenant- and building-level function, 
-     recovery trajectorires, and contributions from systems and components''' 
+     recovery trajectorires, and contributions from systems and components.
+     For the 'summary' output profile (functionality_options), the tenant
+     unit recovery days and recovery trajectories are statistics across
+     realizations (see fn_output_profile.fn_realization_statistics)''' 
     
     ## Import Packages
     from functionality import fn_calculate_reoccupancy
     from functionality import fn_calculate_functionality
     from functionality import fn_check_habitability
+    from fn_output_profile import fn_realization_statistics
+    output_profile = functionality_options['output_profile'] if 'output_profile' in functionality_options.keys() else 'full'
     ## Calaculate Building Functionality Restoration Curves
     # Downtime including external delays
     recovery = {}
@@ -60,7 +65,13 @@ def main_functionality(damage, building_model, damage_consequences,
         recovery['reoccupancy'] = fn_check_habitability.fn_check_habitability(damage, 
                                                         damage_consequences, 
                                                         reoc_meta, func_meta, 
-                                                        functionality_options['habitability_requirements'])
+                                                        functionality_options['habitability_requirements'],
+                                                        output_profile)
+    
+    ## Summarize the tenant unit recovery days (needed per realization until function is calculated)
+    if output_profile == 'summary':
+        for state in recovery.keys():
+            recovery[state]['tenant_unit']['recovery_day'] = fn_realization_statistics(recovery[state]['tenant_unit']['recovery_day'])
  
     return recovery
 
@@ -43,6 +43,9 @@ def fn_building_safety(damage, building_model, damage_consequences, utilities,
      simulation of recovery of operation for various systems in the building'''
     
     import numpy as np
+    from repair_schedule import other_repair_schedule_functions
+    from preprocessing import preprocessing_fns
+    fnc_idx = damage['fnc_filter_bits']['idx'] # column index of each function filter
     ## Initial Setup
     num_reals = len(damage_consequences['red_tag'])
     num_units = len(damage['tenant_units'])
@@ -56,28 +59,28 @@ def fn_building_safety(damage, building_model, damage_consequences, utilities,
                     'fire_suppression' : np.zeros(num_reals)}
     
     # check if building has fire supprsion system
-    fs_exists = any(damage['fnc_filters']['fire_building'])
+    fs_exists = np.size(fnc_idx['fire_building']) > 0
     
  
     # Check damage throughout the building
-    comp_breakdowns = {'red_tag' : np.empty([num_reals,num_comps,num_units]),
-                       'shoring' : np.empty([num_reals,num_comps,num_units]),
-                       'fire_suppression' : np.empty([num_reals,num_comps,num_units])
+    comp_breakdowns = {'red_tag' : np.empty([num_reals,num_comps,num_units], dtype=damage['precision']),
+                       'shoring' : np.empty([num_reals,num_comps,num_units], dtype=damage['precision']),
+                       'fire_suppression' : np.empty([num_reals,num_comps,num_units], dtype=damage['precision'])
                        }
     
 
     for tu in range(num_units):
         # Grab tenant and damage info for this tenant unit
-        repair_complete_day = damage['tenant_units'][tu]['recovery']['repair_complete_day'].copy()
-        repair_complete_day_w_tmp = damage['tenant_units'][tu]['recovery']['repair_complete_day_w_tmp'].copy()
+        repair_complete_day = other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day')
+        repair_complete_day_w_tmp = other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day_w_tmp')
         
         is_damaged = np.logical_and(np.array(damage['tenant_units'][tu]['qnt_damaged']) > 0, np.array(damage['tenant_units'][tu]['worker_days']) > 0)
         ## Red Tags
         # The day the red tag is resolved is the day when all damage (anywhere in building) that has
         # the potential to cause a red tag is fixed (ie max day)
-        if any(damage['fnc_filters']['red_tag']):
+        if np.size(fnc_idx['red_tag']) > 0:
             recovery_day['red_tag'] = np.fmax(recovery_day['red_tag'],
-                                          np.array(damage_consequences['red_tag'])*np.nanmax(repair_complete_day[:,damage['fnc_filters']['red_tag']], axis=1))
+                                          np.array(damage_consequences['red_tag'])*np.nanmax(repair_complete_day[:,fnc_idx['red_tag']], axis=1))
    
         # Component Breakdowns
         
@@ -85,11 +88,11 @@ def fn_building_safety(damage, building_model, damage_consequences, utilities,
         
         
         ## Local Shoring
-        if np.logical_and(any(damage['fnc_filters']['requires_shoring']), functionality_options['include_local_stability_impact']):
+        if np.logical_and(np.size(fnc_idx['requires_shoring']) > 0, functionality_options['include_local_stability_impact']):
             #Any unresolved damao documentatige (temporary or otherwise) that requires shoring,
             # blocks occupancy to the whole building
             recovery_day['shoring'] = np.fmax(recovery_day['shoring'],
-                                      np.nanmax(repair_complete_day_w_tmp[:,damage['fnc_filters']['requires_shoring']], axis=1)) 
+                                      np.nanmax(repair_complete_day_w_tmp[:,fnc_idx['requires_shoring']], axis=1)) 
         
             # Componet Breakdowns (the time it takes to shore or fully repair each
             # component is the time it blocks occupancy for)
@@ -100,7 +103,7 @@ def fn_building_safety(damage, building_model, damage_consequences, utilities,
         ## Day the fire suppression system is operating again (for the whole building)
         if np.logical_not(functionality_options['fire_watch']) and fs_exists:
             # any major damage fails the system for the whole building so take the max
-            recovery_day['fire_suppression'] = np.fmax(recovery_day['fire_suppression'], np.amax(repair_complete_day[:,damage['fnc_filters']['fire_building']], axis=1))
+            recovery_day['fire_suppression'] = np.fmax(recovery_day['fire_suppression'], np.amax(repair_complete_day[:,fnc_idx['fire_building']], axis=1))
     
             # Consider utilities (assume no backup water supply)
             recovery_day['fire_suppression'] = np.fmax(recovery_day['building']['fire'], np.array(utilities['water'])) # Assumes building does not have backup water supply
@@ -113,9 +116,9 @@ def fn_building_safety(damage, building_model, damage_consequences, utilities,
         # note: hazardous materials are accounted for in building functional
         #assessment here, but are not currently quantified in the component
         # breakdowns
-        if any(damage['fnc_filters']['global_hazardous_material']):
+        if np.size(fnc_idx['global_hazardous_material']) > 0:
             # Any global Nohazardous material shuts down the entire building
-            recovery_day['hazardous_material'] = np.fmax(recovery_day['hazardous_material'], np.amax(repair_complete_day[:,damage['fnc_filters']['global_hazardous_material']], axis=1))
+            recovery_day['hazardous_material'] = np.fmax(recovery_day['hazardous_material'], np.amax(repair_complete_day[:,fnc_idx['global_hazardous_material']], axis=1))
 
     
     ## Building Egress
@@ -138,18 +141,31 @@ def fn_building_safety(damage, building_model, damage_consequences, utilities,
     
     # Determine the quantity of falling hazard damage and when it will be resolved
     day_repair_fall_haz = np.zeros([num_reals,building_model['num_entry_doors']])
-    fall_haz_comps_day_rep = np.zeros([num_reals,num_comps,num_units,building_model['num_entry_doors']])
-    comp_affected_lf = np.zeros([num_reals,num_comps,num_units])
+    fall_haz_comps_day_rep = np.zeros([num_reals,num_comps,num_units,building_model['num_entry_doors']], dtype=damage['precision'])
+    comp_affected_lf = np.zeros([num_reals,num_comps,num_units], dtype=damage['precision'])
     scaffold_filt = damage['comp_ds_table']['resolved_by_scaffolding'].astype(bool)
     
-    repair_complete_day_w_tmp = np.empty([num_reals,num_comps,num_units])
+    # Only the exterior falling hazard columns of the damage per side are needed
+    edge_lengths = np.row_stack((np.array(building_model['edge_lengths']), np.array(building_model['edge_lengths'])))
+    ext_fall_haz_all = damage['fnc_filters']['ext_fall_haz_all']
+    ext_lf_filt = damage['fnc_filters']['ext_fall_haz_lf'][ext_fall_haz_all]
+    ext_sf_filt = damage['fnc_filters']['ext_fall_haz_sf'][ext_fall_haz_all]
+    ext_ea_filt = damage['fnc_filters']['ext_fall_haz_ea'][ext_fall_haz_all]
+    ext_lf_per_qnt = damage['comp_ds_table']['exterior_falling_length_factor'][ext_fall_haz_all] * damage['comp_ds_table']['unit_qty'][ext_fall_haz_all]
+
+    affected_ratio={}
+    for side in range(4):
+        affected_ratio['side_'+str(side+1)]=np.zeros([num_reals, num_units]) #FZ# Initiated with zeros. Check later if it works
+
+    repair_complete_day_w_tmp = np.empty([num_reals,num_comps,num_units], dtype=damage['precision'])
     for tu in range(num_units):
-        tmp_or_full_complete_day = damage['tenant_units'][tu]['recovery']['repair_complete_day_w_tmp'].copy()
+        tmp_or_full_complete_day = other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day_w_tmp')
 
         '''Effect of falling hazards on building safety are resolved either by
         full repair, local temp repair, or erecting scaffolding. Whatever
         occurs first'''
-        isdamaged = 1*(np.array(damage['tenant_units'][tu]['qnt_damaged']) > 0).astype('float')
+        qnt_damaged = np.array(damage['tenant_units'][tu]['qnt_damaged'])
+        isdamaged = 1*(qnt_damaged > 0).astype('float')
         isdamaged[isdamaged == 0] = np.nan # mark undamaged cases as NaN to help combine factors below
         
         scaffold_day = impeding_temp_repairs['scaffold_day'].reshape(num_reals,1) *  isdamaged[:,scaffold_filt]
@@ -157,32 +173,26 @@ def fn_building_safety(damage, building_model, damage_consequences, utilities,
         complete_day_w_scaffold[:,scaffold_filt] = np.fmin(tmp_or_full_complete_day[:,scaffold_filt], scaffold_day)
         repair_complete_day_w_tmp[:,:,tu] = complete_day_w_scaffold
 
-    # Loop through component repair times to determine the day it stops affecting re-occupancy
-    num_repair_time_increments = np.sum(damage['fnc_filters']['ext_fall_haz_all'])*num_units # possible unique number of loop increments
-    edge_lengths = np.row_stack((np.array(building_model['edge_lengths']), np.array(building_model['edge_lengths'])))
-    
-    affected_ratio={}
-    for side in range(4):
-        affected_ratio['side_'+str(side+1)]=np.zeros([num_reals, num_units]) #FZ# Initiated with zeros. Check later if it works
-    for i in range(num_repair_time_increments):
-        # Calculate the falling hazards per side
-        for tu in range(num_units):
-            for side in range(4): # assumes there are 4 sides
-                lf_affected_direct_scale_all_comps = damage['comp_ds_table']['exterior_falling_length_factor'] * damage['comp_ds_table']['unit_qty'] * damage['tenant_units'][tu]['qnt_damaged_side_' + str(side+1)]  #FZ# +1 done to account for python indexing starting with 0.       
-                lf_affected_sf_all_comps = damage['comp_ds_table']['exterior_falling_length_factor'] * damage['comp_ds_table']['unit_qty'] * damage['tenant_units'][tu]['qnt_damaged_side_' + str(side+1)] / building_model['ht_per_story_ft'][tu]
-                
-                comp_affected_lf[:,damage['fnc_filters']['ext_fall_haz_lf'],tu] = lf_affected_direct_scale_all_comps[:,damage['fnc_filters']['ext_fall_haz_lf']]
-                comp_affected_lf[:,damage['fnc_filters']['ext_fall_haz_sf'],tu] = lf_affected_sf_all_comps[:,damage['fnc_filters']['ext_fall_haz_sf']]
-                comp_affected_lf[:,damage['fnc_filters']['ext_fall_haz_ea'],tu] = lf_affected_direct_scale_all_comps[:,damage['fnc_filters']['ext_fall_haz_ea']]    
-                
-                comp_affected_ft_this_story = comp_affected_lf[:,:,tu].copy()
-                affected_ft_this_story = np.fmin(np.sum(comp_affected_ft_this_story,axis = 1), edge_lengths[side,tu]) # Assumes cladding components do not occupy the same perimeter space
-                
-                affected_ratio['side_'+str(side+1)][:,tu] = np.fmin((affected_ft_this_story)/ edge_lengths[side,tu],1)
+        # Calculate the falling hazards per side (the same for all repair time increments below)
+        for side in range(4): # assumes there are 4 sides
+            qnt_damaged_side = preprocessing_fns.fn_damage_per_side(damage, tu, side, ext_fall_haz_all, qnt_damaged)
+            lf_affected_direct_scale_all_comps = ext_lf_per_qnt * qnt_damaged_side
+            lf_affected_sf_all_comps = lf_affected_direct_scale_all_comps / building_model['ht_per_story_ft'][tu]
 
+            comp_affected_lf[:,fnc_idx['ext_fall_haz_lf'],tu] = lf_affected_direct_scale_all_comps[:,ext_lf_filt]
+            comp_affected_lf[:,fnc_idx['ext_fall_haz_sf'],tu] = lf_affected_sf_all_comps[:,ext_sf_filt]
+            comp_affected_lf[:,fnc_idx['ext_fall_haz_ea'],tu] = lf_affected_direct_scale_all_comps[:,ext_ea_filt]
+            
+            affected_ft_this_story = np.fmin(np.sum(comp_affected_lf[:,:,tu],axis = 1), edge_lengths[side,tu]) # Assumes cladding components do not occupy the same perimeter space
+            
+            affected_ratio['side_'+str(side+1)][:,tu] = np.fmin((affected_ft_this_story)/ edge_lengths[side,tu],1)
+        del qnt_damaged, isdamaged
 
+    # Loop through component repair times to determine the day it stops affecting re-occupancy
+    num_repair_time_increments = len(fnc_idx['ext_fall_haz_all'])*num_units # possible unique number of loop increments
+    for i in range(num_repair_time_increments):
         # Calculate the time increment for this loop
-        delta_day = np.nanmin(np.nanmin(repair_complete_day_w_tmp[:,damage['fnc_filters']['ext_fall_haz_all'],:],axis =2), axis=1)
+        delta_day = np.nanmin(np.nanmin(repair_complete_day_w_tmp[:,fnc_idx['ext_fall_haz_all'],:],axis =2), axis=1)
         delta_day[np.isnan(delta_day)] = 0
         if sum(delta_day) == 0:
             break # everything has been fixed
@@ -264,12 +274,12 @@ def fn_building_safety(damage, building_model, damage_consequences, utilities,
     
     ## Fire Safety
     if np.logical_not(functionality_options['fire_watch']) and fs_exists:
-        comp_breakdowns_local_fire = np.zeros([num_reals,num_comps,num_units])
+        comp_breakdowns_local_fire = np.zeros([num_reals,num_comps,num_units], dtype=damage['precision'])
         fire_safety_day = np.zeros([num_reals,num_units]) # Day the local fire sprinkler system becomes operational
         filt_fs_drop = damage['fnc_filters']['fire_drops']
         filt_fs_branch = damage['fnc_filters']['fire_unit']
         for tu in range(num_units):
-            repair_complete_day = damage['tenant_units'][tu]['recovery']['repair_complete_day'].copy()
+            repair_complete_day = other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day')
             repair_complete_day[repair_complete_day == 0] = np.nan # Make sure zero repair days are NaN
             damaged_comps = damage['tenant_units'][tu]['qnt_damaged']
             num_drops = max(np.array(damage['tenant_units'][tu]['num_comps'])* filt_fs_drop) # Assumes drops are all in one performance group
@@ -358,6 +368,8 @@ def fn_story_access(damage, building_model, damage_consequences,
      simulation of each components contributions to each of the fault tree events''' 
     
     import numpy as np
+    from repair_schedule import other_repair_schedule_functions
+    fnc_idx = damage['fnc_filter_bits']['idx'] # column index of each function filter
     
     ## Initial Setup
     num_reals = len(damage_consequences['red_tag'])
@@ -372,19 +384,19 @@ def fn_story_access(damage, building_model, damage_consequences,
     recovery_day['stair_doors'] = np.zeros([num_reals,num_units])
     recovery_day['flooding'] = np.zeros([num_reals,num_units])
     recovery_day['horizontal_egress'] = np.zeros([num_reals,num_units])
-    comp_breakdowns['stairs'] = np.zeros([num_reals,num_comps,num_units])
-    comp_breakdowns['flooding'] = np.zeros([num_reals,num_comps,num_units])
-    comp_breakdowns['horizontal_egress'] = np.zeros([num_reals,num_comps,num_units])
+    comp_breakdowns['stairs'] = np.zeros([num_reals,num_comps,num_units], dtype=damage['precision'])
+    comp_breakdowns['flooding'] = np.zeros([num_reals,num_comps,num_units], dtype=damage['precision'])
+    comp_breakdowns['horizontal_egress'] = np.zeros([num_reals,num_comps,num_units], dtype=damage['precision'])
     
     
     ## Horizontal Egress - Fire breaks
-    if any(damage['fnc_filters']['fire_break']):
+    if np.size(fnc_idx['fire_break']) > 0:
         for tu in range(num_stories):
             # Grab tenant and damage info for this tenant unit
-            repair_complete_day_w_tmp = damage['tenant_units'][tu]['recovery']['repair_complete_day_w_tmp'].copy()
+            repair_complete_day_w_tmp = other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day_w_tmp')
     
             # Any significant damage to fire breaks in the story impairs the horizontal egress
-            recovery_day['horizontal_egress'][:,tu] = np.fmax(recovery_day['horizontal_egress'][:,tu], np.nanmax(repair_complete_day_w_tmp[:, damage['fnc_filters']['fire_break']], axis=1))
+            recovery_day['horizontal_egress'][:,tu] = np.fmax(recovery_day['horizontal_egress'][:,tu], np.nanmax(repair_complete_day_w_tmp[:, fnc_idx['fire_break']], axis=1))
     
             # Componet Breakdowns
             comp_breakdowns['horizontal_egress'][:,:,tu] = damage['fnc_filters']['fire_break'].reshape(1,num_comps) * repair_complete_day_w_tmp
@@ -393,7 +405,7 @@ def fn_story_access(damage, building_model, damage_consequences,
     ## STORY FLOODING
     for tu in reversed(range(num_stories)): # Go from top to bottom
         is_damaged = np.array(damage['tenant_units'][tu]['qnt_damaged']) > 0
-        flooding_this_story = np.any(is_damaged[:,damage['fnc_filters']['causes_flooding']], axis=1); # Any major piping damage causes interior flooding
+        flooding_this_story = np.any(is_damaged[:,fnc_idx['causes_flooding']], axis=1); # Any major piping damage causes interior flooding
         flooding_cleanup_day = flooding_this_story * impeding_temp_repairs['flooding_cleanup_day']
     
         # Save clean up time per component causing flooding
@@ -415,14 +427,16 @@ def fn_story_access(damage, building_model, damage_consequences,
     ## Go through each story and check if there is sufficient story access (stairs and stairdoors)
     # if stairs don't exist on a story, this will assume they are rugged (along with the stair doors)
     for tu in range(num_stories):
+        # Grab the component repair days before the damage matrix is augmented
+        repair_complete_day = other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day')
+        
         # Augment damage matrix with door data
         racked_stair_doors = np.fmin(np.array(damage_consequences['racked_stair_doors_per_story'])[:,tu], building_model['stairs_per_story'][tu])
         damage['tenant_units'][tu]['qnt_damaged'] = (np.column_stack((np.array(damage['tenant_units'][tu]['qnt_damaged']), racked_stair_doors))).tolist() #FZ# Converted back to alist to keep it consistent with other objects in the dictionary damage['tenant_units'][tu]
         door_repair_day = 1*(racked_stair_doors > 0) * impeding_temp_repairs['door_racking_repair_day']
-        damage['tenant_units'][tu]['recovery']['repair_complete_day'] = np.column_stack((damage['tenant_units'][tu]['recovery']['repair_complete_day'], door_repair_day))
+        repair_complete_day = np.column_stack((repair_complete_day, door_repair_day))
     
         # Quantify damaged stairs on this story
-        repair_complete_day = damage['tenant_units'][tu]['recovery']['repair_complete_day'].copy()
         damaged_comps = np.array(damage['tenant_units'][tu]['qnt_damaged']).copy()
         
         # Make sure zero repair days are NaN
@@ -511,11 +525,13 @@ def fn_tenant_safety( damage, building_model, functionality_options,
      simulation of each components contributions to each of the fault tree events''' 
     
     import numpy as np
+    from repair_schedule import other_repair_schedule_functions
+    fnc_idx = damage['fnc_filter_bits']['idx'] # column index of each function filter
     
     ##Initial Setup
     num_reals, num_comps = np.shape(damage['tenant_units'][0]['qnt_damaged'])
     num_units = len(damage['tenant_units'])
-    comp_types_interior_check = np.unique(damage['comp_ds_table']['comp_type_id'][damage['fnc_filters']['int_fall_haz_all']])
+    comp_types_interior_check = np.unique(damage['comp_ds_table']['comp_type_id'][fnc_idx['int_fall_haz_all']])
     
     recovery_day={}
     recovery_day['exterior'] = np.zeros([num_reals, num_units])
@@ -523,8 +539,8 @@ def fn_tenant_safety( damage, building_model, functionality_options,
     recovery_day['hazardous_material'] = np.zeros([num_reals, num_units])     
     
     comp_breakdowns = {}
-    comp_breakdowns['exterior'] = np.empty([num_reals,num_comps,num_units])
-    comp_breakdowns['interior'] = np.empty([num_reals,num_comps,num_units])
+    comp_breakdowns['exterior'] = np.empty([num_reals,num_comps,num_units], dtype=damage['precision'])
+    comp_breakdowns['interior'] = np.empty([num_reals,num_comps,num_units], dtype=damage['precision'])
     
     # go through each tenant unit and quantify the affect that each system has on reoccpauncy
     for tu in range(num_units):
@@ -532,8 +548,7 @@ def fn_tenant_safety( damage, building_model, functionality_options,
         unit={}
         for key in list(tenant_units.keys()):
             unit[key] = tenant_units[key][tu]
-        repair_complete_day_w_tmp = tuple(map(tuple,(damage['tenant_units'][tu]['recovery']['repair_complete_day_w_tmp']))) # day each component (and DS) is reparied of this TU
-        #FZ# Made tuple to bypass the issue of mutable numpy array
+        repair_complete_day_w_tmp = other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day_w_tmp') # day each component (and DS) is reparied of this TU
         '''#Exterior Enclosure 
            Calculated the affected perimeter area of exterior components
            (assuming all exterior components have either lf or sf units)'''
@@ -542,8 +557,8 @@ def fn_tenant_safety( damage, building_model, functionality_options,
         
         # construct a matrix of affected areas from the various damaged component types
         comp_affected_area = np.zeros([num_reals,num_comps])
-        comp_affected_area[:,damage['fnc_filters']['exterior_safety_lf']] = area_affected_all_linear_comps[:,damage['fnc_filters']['exterior_safety_lf']]
-        comp_affected_area[:,damage['fnc_filters']['exterior_safety_sf']] = area_affected_all_direct_scale_comps[:,damage['fnc_filters']['exterior_safety_sf']]
+        comp_affected_area[:,fnc_idx['exterior_safety_lf']] = area_affected_all_linear_comps[:,fnc_idx['exterior_safety_lf']]
+        comp_affected_area[:,fnc_idx['exterior_safety_sf']] = area_affected_all_direct_scale_comps[:,fnc_idx['exterior_safety_sf']]
         
         '''Go each possible unique repair time contributing to interior safety check
            Find when enough repairs are complete such that interior damage no
@@ -552,7 +567,7 @@ def fn_tenant_safety( damage, building_model, functionality_options,
         comps_day_repaired = np.array(comps_day_repaired)
         ext_repair_day = np.zeros(num_reals)
         all_comps_day_repaired = np.zeros([num_reals,num_comps])
-        num_repair_time_increments = np.sum(damage['fnc_filters']['exterior_safety_all']) # possible unique number of loop increments
+        num_repair_time_increments = len(fnc_idx['exterior_safety_all']) # possible unique number of loop increments
         for i in range(num_repair_time_increments):
             
             # Quantify Affected Area
@@ -563,7 +578,7 @@ def fn_tenant_safety( damage, building_model, functionality_options,
             affects_occupancy = percent_area_affected > functionality_options['exterior_safety_threshold']
     
             # Determine step increment based on the component with the shortest repair time
-            delta_day = np.nanmin(comps_day_repaired[:,damage['fnc_filters']['exterior_safety_all']], axis=1)
+            delta_day = np.nanmin(comps_day_repaired[:,fnc_idx['exterior_safety_all']], axis=1)
             delta_day[np.isnan(delta_day)] = 0
             
             # Add increment to the tally of days until the interior damage stops affecting occupancy
@@ -596,18 +611,18 @@ def fn_tenant_safety( damage, building_model, functionality_options,
         repair_complete_day_w_tmp_w_instabilities = np.array(repair_complete_day_w_tmp_w_instabilities) #FZ# coverted to array from tuple
         if tu > 0: #FZ# changed to zero to account for python indexing starting from 0.
             area_affected_below = damage['comp_ds_table']['interior_area_factor'] * building_model['struct_bay_area_per_story'][tu-1] * damage['tenant_units'][tu-1]['qnt_damaged']
-            area_affected_all_bay_comps[:,damage['fnc_filters']['vert_instabilities']] = np.fmax(area_affected_below[:,damage['fnc_filters']['vert_instabilities']], area_affected_all_bay_comps[:,damage['fnc_filters']['vert_instabilities']])
-            repair_time_below = damage['tenant_units'][tu-1]['recovery']['repair_complete_day_w_tmp']
-            repair_complete_day_w_tmp_w_instabilities[:,damage['fnc_filters']['vert_instabilities']] = np.fmax(repair_time_below[:,damage['fnc_filters']['vert_instabilities']],np.array(repair_complete_day_w_tmp)[:,damage['fnc_filters']['vert_instabilities']])
+            area_affected_all_bay_comps[:,fnc_idx['vert_instabilities']] = np.fmax(area_affected_below[:,fnc_idx['vert_instabilities']], area_affected_all_bay_comps[:,fnc_idx['vert_instabilities']])
+            repair_time_below = other_repair_schedule_functions.fn_component_repair_day(damage, tu-1, 'repair_complete_day_w_tmp')
+            repair_complete_day_w_tmp_w_instabilities[:,fnc_idx['vert_instabilities']] = np.fmax(repair_time_below[:,fnc_idx['vert_instabilities']],np.array(repair_complete_day_w_tmp)[:,fnc_idx['vert_instabilities']])
         
     
         # construct a matrix of affected areas from the various damaged component types
         comp_affected_area = np.zeros([num_reals,num_comps])
-        comp_affected_area[:,damage['fnc_filters']['int_fall_haz_lf']] = area_affected_all_linear_comps[:,damage['fnc_filters']['int_fall_haz_lf']]
-        comp_affected_area[:,damage['fnc_filters']['int_fall_haz_sf']] = area_affected_all_direct_scale_comps[:,damage['fnc_filters']['int_fall_haz_sf']]
-        comp_affected_area[:,damage['fnc_filters']['int_fall_haz_ea']] = area_affected_all_direct_scale_comps[:,damage['fnc_filters']['int_fall_haz_ea']]        
-        comp_affected_area[:,damage['fnc_filters']['int_fall_haz_bay']] = area_affected_all_bay_comps[:,damage['fnc_filters']['int_fall_haz_bay']]
-        comp_affected_area[:,damage['fnc_filters']['int_fall_haz_build']] = area_affected_all_build_comps[:,damage['fnc_filters']['int_fall_haz_build']]
+        comp_affected_area[:,fnc_idx['int_fall_haz_lf']] = area_affected_all_linear_comps[:,fnc_idx['int_fall_haz_lf']]
+        comp_affected_area[:,fnc_idx['int_fall_haz_sf']] = area_affected_all_direct_scale_comps[:,fnc_idx['int_fall_haz_sf']]
+        comp_affected_area[:,fnc_idx['int_fall_haz_ea']] = area_affected_all_direct_scale_comps[:,fnc_idx['int_fall_haz_ea']]        
+        comp_affected_area[:,fnc_idx['int_fall_haz_bay']] = area_affected_all_bay_comps[:,fnc_idx['int_fall_haz_bay']]
+        comp_affected_area[:,fnc_idx['int_fall_haz_build']] = area_affected_all_build_comps[:,fnc_idx['int_fall_haz_build']]
         
         '''Go each possible unique repair time contributing to interior safety check
         Find when enough repairs are complete such that interior damage no
@@ -615,7 +630,7 @@ def fn_tenant_safety( damage, building_model, functionality_options,
         comps_day_repaired = repair_complete_day_w_tmp_w_instabilities # define as initial repair day considering tmp repairs
         int_repair_day = np.zeros(num_reals)
         all_comps_day_repaired = np.zeros([num_reals,num_comps])
-        num_repair_time_increments = np.sum(damage['fnc_filters']['int_fall_haz_all']) # possible unique number of loop increments
+        num_repair_time_increments = len(fnc_idx['int_fall_haz_all']) # possible unique number of loop increments
         for i in range(num_repair_time_increments):
             # Quantify Affected Area
             diff_comp_areas = np.empty([num_reals, len(comp_types_interior_check)])
@@ -630,7 +645,7 @@ def fn_tenant_safety( damage, building_model, functionality_options,
             affects_occupancy = percent_area_affected > functionality_options['interior_safety_threshold']
             
             # Determine step increment based on the component with the shortest repair time
-            delta_day = np.nanmin(comps_day_repaired[:,damage['fnc_filters']['int_fall_haz_all']], axis=1)
+            delta_day = np.nanmin(comps_day_repaired[:,fnc_idx['int_fall_haz_all']], axis=1)
             delta_day[np.isnan(delta_day)] = 0
             
             # Add increment to the tally of days until the interior damage
@@ -656,9 +671,9 @@ def fn_tenant_safety( damage, building_model, functionality_options,
           note: hazardous materials are accounted for in building functional
           assessment here, but are not currently quantified in the component
           breakdowns'''
-        if any(damage['fnc_filters']['local_hazardous_material']):
+        if np.size(fnc_idx['local_hazardous_material']) > 0:
             # Any local hazardous material shuts down the entire tenant unit
-            recovery_day['hazardous_material'][:,tu] = np.nanmax(repair_complete_day_w_tmp[:,damage['fnc_filters']['local_hazardous_material']], axis=1) 
+            recovery_day['hazardous_material'][:,tu] = np.nanmax(repair_complete_day_w_tmp[:,fnc_idx['local_hazardous_material']], axis=1) 
         else:
             recovery_day['hazardous_material'][:,tu] = np.zeros(num_reals)
     
@@ -700,23 +715,25 @@ def fn_calc_subsystem_recovery(subsys_filt, damage,
     import numpy as np    
     ## Initial Setup
     num_reals = len(repair_complete_day)
-    if len(damage['comp_ds_table']['parallel_operation'][subsys_filt])>0:
-        is_redundant = max(damage['comp_ds_table']['parallel_operation'][subsys_filt]) # should all be the same within a subsystem
+    subsys_idx = np.flatnonzero(subsys_filt) # only the columns of this subsystem are evaluated below
+    if len(subsys_idx)>0:
+        is_redundant = max(damage['comp_ds_table']['parallel_operation'][subsys_idx]) # should all be the same within a subsystem
     else: 
         is_redundant = 0
-    any_comps = any(subsys_filt)
+    any_comps = len(subsys_idx) > 0
     
     ## Check if the componet has redundancy
     if any_comps:
         if is_redundant == 1:
             ## go through each component in this subsystem and find number of damaged units
-            comps = np.unique(damage['comp_ds_table']['comp_idx'][subsys_filt])
+            subsys_comp_idx = damage['comp_ds_table']['comp_idx'][subsys_idx]
+            comps = np.unique(subsys_comp_idx)
             num_tot_comps = np.zeros(len(comps))
             num_damaged_comps = np.zeros([num_reals,len(comps)])
             for c in range(len(comps)):
-                this_comp = np.logical_and(subsys_filt, damage['comp_ds_table']['comp_idx'] == comps[c])
-                num_tot_comps[c] = max(total_num_comps * this_comp) # number of units across all ds should be the same
-                num_damaged_comps[:,c] = np.nanmax(damaged_comps * this_comp, axis=1)
+                this_comp = subsys_idx[subsys_comp_idx == comps[c]]
+                num_tot_comps[c] = np.max(total_num_comps[this_comp], initial=0) # number of units across all ds should be the same
+                num_damaged_comps[:,c] = np.fmax.reduce(damaged_comps[:,this_comp], axis=1, initial=0)
 
     
             ## sum together multiple components in this subsystem
@@ -726,7 +743,7 @@ def fn_calc_subsystem_recovery(subsys_filt, damage,
     
             ## Check failed component against the ratio of components required for system operation
             # system fails when there is an insufficient number of operating components
-            n1_redundancy = max(damage['comp_ds_table']['n1_redundancy'][subsys_filt]) # should all be the same within a subsystem
+            n1_redundancy = max(damage['comp_ds_table']['n1_redundancy'][subsys_idx]) # should all be the same within a subsystem
             if subsystem_num_comps == 0: # No components at this level
                 subsystem_failure = np.zeros([num_reals,1])
             elif subsystem_num_comps == 1: # Not actually redundant
@@ -738,20 +755,20 @@ def fn_calc_subsystem_recovery(subsys_filt, damage,
                 subsystem_failure = subsystem_num_damaged_comps > 1
             else:
                 # Use a predefined ratio
-                redundancy_threshold = max(damage['comp_ds_table']['redundancy_threshold'][subsys_filt]) # should all be the same within a subsystem
+                redundancy_threshold = max(damage['comp_ds_table']['redundancy_threshold'][subsys_idx]) # should all be the same within a subsystem
                 subsystem_failure = ratio_damaged > redundancy_threshold
     
             ## Calculate recovery day and combine with other subsystems for this tenant unit
             # assumes all quantities in each subsystem are repaired at
             # once, which is true for our current repair schedule (ie
             # system level at each story)
-            subsys_repair_day = np.nanmax(subsystem_failure.reshape(len(subsystem_failure),1) * subsys_filt.reshape(1, len(subsys_filt)) * repair_complete_day, axis=1) 
+            subsys_repair_day = np.fmax.reduce(subsystem_failure.reshape(len(subsystem_failure),1) * repair_complete_day[:,subsys_idx], axis=1, initial=0) 
         
             '''else: This subsystem has no redundancy
                 any major damage to the components fails the subsystem at this
                 tenant unit'''
         else: 
-            subsys_repair_day = np.nanmax(repair_complete_day * subsys_filt.reshape(1, len(subsys_filt)), axis=1)
+            subsys_repair_day = np.fmax.reduce(repair_complete_day[:,subsys_idx], axis=1, initial=0)
 
     else: # No components were populated in this subsystem
         subsys_repair_day = np.zeros(num_reals)
@@ -798,9 +815,11 @@ def fn_building_level_system_operation( damage, damage_consequences,
     # import packages
     from functionality import other_functionality_functions
     import numpy as np
+    from repair_schedule import other_repair_schedule_functions
     
     system_operation_day = {'building' : {}, 'comp' : {}}
     ## Initial Setep
+    fnc_idx = damage['fnc_filter_bits']['idx'] # column index of each function filter
     num_stories = building_model['num_stories']
     num_reals = len(damage_consequences['red_tag'])
     num_comps = len(damage['comp_ds_table']['comp_id'])
@@ -820,38 +839,37 @@ def fn_building_level_system_operation( damage, damage_consequences,
         damaged_comps = np.array(damage['tenant_units'][tu]['qnt_damaged'])
         initial_damaged = damaged_comps > 0
         total_num_comps = np.array(damage['tenant_units'][tu]['num_comps'])
-        repair_complete_day = damage['tenant_units'][tu]['recovery']['repair_complete_day']
+        repair_complete_day = other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day')
         
         ## Elevators
         # Assumed all components affect entire height of shaft
-        system_operation_day['comp']['elev_quant_damaged'] = np.fmax(
-            system_operation_day['comp']['elev_quant_damaged'], 
-            damage['tenant_units'][tu]['qnt_damaged'] * 
-            damage['fnc_filters']['elevators'])
+        system_operation_day['comp']['elev_quant_damaged'][:,fnc_idx['elevators']] = np.fmax(
+            system_operation_day['comp']['elev_quant_damaged'][:,fnc_idx['elevators']], 
+            damaged_comps[:,fnc_idx['elevators']])
         
-        system_operation_day['comp']['elev_day_repaired'] = np.fmax(
-            system_operation_day['comp']['elev_day_repaired'], 
-            repair_complete_day * damage['fnc_filters']['elevators'])
+        system_operation_day['comp']['elev_day_repaired'][:,fnc_idx['elevators']] = np.fmax(
+            system_operation_day['comp']['elev_day_repaired'][:,fnc_idx['elevators']], 
+            repair_complete_day[:,fnc_idx['elevators']])
         
         # Motor Control system - Elevators
-        system_operation_day['comp']['elevator_mcs'] = np.fmax(
-            system_operation_day['comp']['elevator_mcs'], 
-            repair_complete_day * damage['fnc_filters']['elevator_mcs'])
+        system_operation_day['comp']['elevator_mcs'][:,fnc_idx['elevator_mcs']] = np.fmax(
+            system_operation_day['comp']['elevator_mcs'][:,fnc_idx['elevator_mcs']], 
+            repair_complete_day[:,fnc_idx['elevator_mcs']])
         
         ## Electrical
-        system_operation_day['comp']['electrical_main'] = np.fmax(
-            system_operation_day['comp']['electrical_main'], 
-            repair_complete_day * damage['fnc_filters']['electrical_main'])
+        system_operation_day['comp']['electrical_main'][:,fnc_idx['electrical_main']] = np.fmax(
+            system_operation_day['comp']['electrical_main'][:,fnc_idx['electrical_main']], 
+            repair_complete_day[:,fnc_idx['electrical_main']])
         
 
         ## Water
-        system_operation_day['comp']['water_potable_main'] = np.fmax(
-            system_operation_day['comp']['water_potable_main'], 
-            repair_complete_day * damage['fnc_filters']['water_main'])
+        system_operation_day['comp']['water_potable_main'][:,fnc_idx['water_main']] = np.fmax(
+            system_operation_day['comp']['water_potable_main'][:,fnc_idx['water_main']], 
+            repair_complete_day[:,fnc_idx['water_main']])
         
-        system_operation_day['comp']['water_sanitary_main'] = np.fmax(
-            system_operation_day['comp']['water_sanitary_main'], 
-            repair_complete_day * damage['fnc_filters']['sewer_main'])        
+        system_operation_day['comp']['water_sanitary_main'][:,fnc_idx['sewer_main']] = np.fmax(
+            system_operation_day['comp']['water_sanitary_main'][:,fnc_idx['sewer_main']], 
+            repair_complete_day[:,fnc_idx['sewer_main']])        
         
         
         ## HVAC
@@ -882,7 +900,7 @@ def fn_building_level_system_operation( damage, damage_consequences,
                 system_operation_day['comp'][subsys_label] = np.fmax(system_operation_day['comp'][subsys_label], comps_breakdown)
                 
         ## Data
-        system_operation_day['comp']['data_main'] = np.fmax(system_operation_day['comp']['data_main'], repair_complete_day * damage['fnc_filters']['data_main'])
+        system_operation_day['comp']['data_main'][:,fnc_idx['data_main']] = np.fmax(system_operation_day['comp']['data_main'][:,fnc_idx['data_main']], repair_complete_day[:,fnc_idx['data_main']])
         
     ## Calculate building level consequences for systems where any major main damage leads to system failure
     system_operation_day['building']['electrical_main'] = np.nanmax(system_operation_day['comp']['electrical_main'], axis=1)  # any major damage to the main equipment fails the system for the entire building
@@ -951,7 +969,10 @@ def fn_tenant_function( damage, building_model, system_operation_day,
       fault tree events''' 
 
     import numpy as np
+    from repair_schedule import other_repair_schedule_functions
     import sys
+    from preprocessing import preprocessing_fns
+    fnc_idx = damage['fnc_filter_bits']['idx'] # column index of each function filter
     
     '''Subfunction'''
     def subsystem_recovery(subsystem, damage, repair_complete_day, 
@@ -1040,26 +1061,26 @@ def fn_tenant_function( damage, building_model, system_operation_day,
         }
     
     comp_breakdowns = {
-        'elevators' : np.zeros([num_reals,num_comps,num_units]),
-        'electrical' : np.zeros([num_reals,num_comps,num_units]),
-        'exterior' : np.zeros([num_reals,num_comps,num_units]),
-        'roof' : np.zeros([num_reals,num_comps,num_units]),
-        'interior' : np.zeros([num_reals,num_comps,num_units]),
-        'flooding' : np.zeros([num_reals,num_comps,num_units]),
-        'water_potable' : np.zeros([num_reals,num_comps,num_units]),
-        'water_sanitary' : np.zeros([num_reals,num_comps,num_units]),
-        'hvac_ventilation' : np.zeros([num_reals,num_comps,num_units]),
-        'hvac_cooling' : np.zeros([num_reals,num_comps,num_units]),
-        'hvac_heating' : np.zeros([num_reals,num_comps,num_units]),
-        'hvac_exhaust' : np.zeros([num_reals,num_comps,num_units]),
-        'data' : np.zeros([num_reals,num_comps,num_units]),        
+        'elevators' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'electrical' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'exterior' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'roof' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'interior' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'flooding' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'water_potable' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'water_sanitary' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'hvac_ventilation' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'hvac_cooling' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'hvac_heating' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'hvac_exhaust' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),
+        'data' : np.zeros([num_reals,num_comps,num_units], dtype=damage['precision']),        
         }
     
     ## Go through each tenant unit, define system level performacne and determine tenant unit recovery time
     ## STORY FLOODING
     for tu in reversed(range(num_stories)): # Go from top to bottom
         is_damaged = np.array(damage['tenant_units'][tu]['qnt_damaged']) > 0
-        flooding_this_story = np.any(is_damaged[:,damage['fnc_filters']['causes_flooding']], axis=1) # Any major piping damage causes interior flooding
+        flooding_this_story = np.any(is_damaged[:,fnc_idx['causes_flooding']], axis=1) # Any major piping damage causes interior flooding
         flooding_recovery_day = flooding_this_story * impeding_temp_repairs['flooding_repair_day']
     
         # Save clean up time per component causing flooding
@@ -1080,8 +1101,8 @@ def fn_tenant_function( damage, building_model, system_operation_day,
         for key in list(tenant_units.keys()):
             unit[key] = tenant_units[key][tu]        
         
-        repair_complete_day = tuple(map(tuple,damage['tenant_units'][tu]['recovery']['repair_complete_day'])) #FZ# Made tuple to bypass the issue of mutable numpy array
-        repair_complete_day_w_tmp = tuple(map(tuple, damage['tenant_units'][tu]['recovery']['repair_complete_day_w_tmp'])) #FZ# Made tuple to bypass the issue of mutable numpy array
+        repair_complete_day = other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day')
+        repair_complete_day_w_tmp = other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day_w_tmp')
         
         ## Elevators
         if unit['is_elevator_required'] == 1:
@@ -1092,7 +1113,7 @@ def fn_tenant_function( damage, building_model, system_operation_day,
             comps_quant_damaged = np.array(comps_quant_damaged)
             elev_function_recovery_day = np.zeros(num_reals)
             elev_comps_day_fnc = np.zeros([num_reals,num_comps])
-            num_repair_time_increments = sum(damage['fnc_filters']['elevators']) # possible unique number of loop increments
+            num_repair_time_increments = len(fnc_idx['elevators']) # possible unique number of loop increments
             # Loop through each unique repair time increment and determine when
             # stops affecting function
             for i in range(num_repair_time_increments):
@@ -1106,8 +1127,8 @@ def fn_tenant_function( damage, building_model, system_operation_day,
                 elevators have simultaneous damage states, it is not possible
                 to count the number of damaged elevators without additional
                 information'''
-                num_elev_pgs = len(np.unique(damage['comp_ds_table']['comp_idx'][damage['fnc_filters']['elevators']]))
-                is_sim_ds = any(damage['comp_ds_table']['is_sim_ds'][damage['fnc_filters']['elevators']])
+                num_elev_pgs = len(np.unique(damage['comp_ds_table']['comp_idx'][fnc_idx['elevators']]))
+                is_sim_ds = any(damage['comp_ds_table']['is_sim_ds'][fnc_idx['elevators']])
                 if (num_elev_pgs > 1) and is_sim_ds:
                     sys.exit('Error! PBEE_Recovery:Function','Elevator Function check does not handle multiple performance groups with simultaneous damage states')
                 
@@ -1122,7 +1143,7 @@ def fn_tenant_function( damage, building_model, system_operation_day,
                 # affects_function = building_occ_per_elev > max(unit['occ_per_elev'])
                 affects_function = building_occ_per_elev > unit['occ_per_elev'] #FZ# Check. Why max is done . Only a single value per unit
                 # Add days in this increment to the tally
-                delta_day = np.nanmin(comps_day_repaired[:,damage['fnc_filters']['elevators']], axis=1)
+                delta_day = np.nanmin(comps_day_repaired[:,fnc_idx['elevators']], axis=1)
                 delta_day[np.isnan(delta_day)] = 0
                 elev_function_recovery_day = elev_function_recovery_day + affects_function * delta_day
                 
@@ -1149,14 +1170,14 @@ def fn_tenant_function( damage, building_model, system_operation_day,
         area_affected_direct_scale_all_comps = damage['comp_ds_table']['exterior_surface_area_factor'] * damage['comp_ds_table']['unit_qty'] * damage['tenant_units'][tu]['qnt_damaged']
        
         comp_affected_area = np.zeros([num_reals,num_comps])
-        comp_affected_area[:,damage['fnc_filters']['exterior_seal_lf']] = area_affected_lf_all_comps[:,damage['fnc_filters']['exterior_seal_lf']]
-        comp_affected_area[:,damage['fnc_filters']['exterior_seal_sf']] = area_affected_direct_scale_all_comps[:,damage['fnc_filters']['exterior_seal_sf']]
-        comp_affected_area[:,damage['fnc_filters']['exterior_seal_ea']] = area_affected_direct_scale_all_comps[:,damage['fnc_filters']['exterior_seal_ea']]
+        comp_affected_area[:,fnc_idx['exterior_seal_lf']] = area_affected_lf_all_comps[:,fnc_idx['exterior_seal_lf']]
+        comp_affected_area[:,fnc_idx['exterior_seal_sf']] = area_affected_direct_scale_all_comps[:,fnc_idx['exterior_seal_sf']]
+        comp_affected_area[:,fnc_idx['exterior_seal_ea']] = area_affected_direct_scale_all_comps[:,fnc_idx['exterior_seal_ea']]
         
         comps_day_repaired = np.array(repair_complete_day)
         ext_function_recovery_day = np.zeros(num_reals)
         all_comps_day_ext = np.zeros([num_reals,num_comps])
-        num_repair_time_increments = sum(damage['fnc_filters']['exterior_seal_all']) # possible unique number of loop increments
+        num_repair_time_increments = len(fnc_idx['exterior_seal_all']) # possible unique number of loop increments
         # Loop through each unique repair time increment and determine when stops affecting function
         for i in range(num_repair_time_increments):
             # Determine the area of wall which has severe exterior encolusure damage 
@@ -1169,7 +1190,7 @@ def fn_tenant_function( damage, building_model, system_operation_day,
             affects_function = percent_area_affected > unit['exterior'] 
             
             # Add days in this increment to the tally
-            delta_day = np.nanmin(comps_day_repaired[:,damage['fnc_filters']['exterior_seal_all']], axis=1)
+            delta_day = np.nanmin(comps_day_repaired[:,fnc_idx['exterior_seal_all']], axis=1)
             delta_day[np.isnan(delta_day)] = 0
             ext_function_recovery_day = ext_function_recovery_day + affects_function * delta_day
             # Add days to components that are affecting occupancy
@@ -1214,26 +1235,26 @@ def fn_tenant_function( damage, building_model, system_operation_day,
         repair_complete_day_w_tmp_w_instabilities = np.array(repair_complete_day_w_tmp)
         if tu > 0: #FZ# changed to 0 to account for python index starting from 0.
             area_affected_below = damage['comp_ds_table']['interior_area_factor'] * building_model['struct_bay_area_per_story'][tu-1] * damage['tenant_units'][tu-1]['qnt_damaged']
-            area_affected_bay_all_comps[:,damage['fnc_filters']['vert_instabilities']] = np.fmax(
-                area_affected_below[:,damage['fnc_filters']['vert_instabilities']],area_affected_bay_all_comps[:,damage['fnc_filters']['vert_instabilities']])
-            repair_time_below = damage['tenant_units'][tu-1]['recovery']['repair_complete_day_w_tmp']
-            repair_complete_day_w_tmp_w_instabilities[:,damage['fnc_filters']['vert_instabilities']] = np.fmax(
-                repair_time_below[:,damage['fnc_filters']['vert_instabilities']], np.array(repair_complete_day_w_tmp)[:,damage['fnc_filters']['vert_instabilities']])
+            area_affected_bay_all_comps[:,fnc_idx['vert_instabilities']] = np.fmax(
+                area_affected_below[:,fnc_idx['vert_instabilities']],area_affected_bay_all_comps[:,fnc_idx['vert_instabilities']])
+            repair_time_below = other_repair_schedule_functions.fn_component_repair_day(damage, tu-1, 'repair_complete_day_w_tmp')
+            repair_complete_day_w_tmp_w_instabilities[:,fnc_idx['vert_instabilities']] = np.fmax(
+                repair_time_below[:,fnc_idx['vert_instabilities']], np.array(repair_complete_day_w_tmp)[:,fnc_idx['vert_instabilities']])
 
     
         comp_affected_area = np.zeros([num_reals,num_comps])
-        comp_affected_area[:,damage['fnc_filters']['interior_function_lf']] = area_affected_lf_all_comps[:,damage['fnc_filters']['interior_function_lf']]
-        comp_affected_area[:,damage['fnc_filters']['interior_function_sf']] = area_affected_direct_scale_all_comps[:,damage['fnc_filters']['interior_function_sf']]
-        comp_affected_area[:,damage['fnc_filters']['interior_function_ea']] = area_affected_direct_scale_all_comps[:,damage['fnc_filters']['interior_function_ea']]        
-        comp_affected_area[:,damage['fnc_filters']['interior_function_bay']] = area_affected_bay_all_comps[:,damage['fnc_filters']['interior_function_bay']]
-        comp_affected_area[:,damage['fnc_filters']['interior_function_build']] = area_affected_build_all_comps[:,damage['fnc_filters']['interior_function_build']]
+        comp_affected_area[:,fnc_idx['interior_function_lf']] = area_affected_lf_all_comps[:,fnc_idx['interior_function_lf']]
+        comp_affected_area[:,fnc_idx['interior_function_sf']] = area_affected_direct_scale_all_comps[:,fnc_idx['interior_function_sf']]
+        comp_affected_area[:,fnc_idx['interior_function_ea']] = area_affected_direct_scale_all_comps[:,fnc_idx['interior_function_ea']]        
+        comp_affected_area[:,fnc_idx['interior_function_bay']] = area_affected_bay_all_comps[:,fnc_idx['interior_function_bay']]
+        comp_affected_area[:,fnc_idx['interior_function_build']] = area_affected_build_all_comps[:,fnc_idx['interior_function_build']]
     
-        frag_types_in_check = np.unique(damage['comp_ds_table']['comp_type_id'][damage['fnc_filters']['interior_function_all']])
+        frag_types_in_check = np.unique(damage['comp_ds_table']['comp_type_id'][fnc_idx['interior_function_all']])
         comps_day_repaired = repair_complete_day_w_tmp_w_instabilities.copy()
     
         int_function_recovery_day = np.zeros(num_reals)
         int_comps_day_repaired = np.zeros([num_reals,num_comps])
-        num_repair_time_increments = sum(damage['fnc_filters']['interior_function_all']) # possible unique number of loop increments
+        num_repair_time_increments = len(fnc_idx['interior_function_all']) # possible unique number of loop increments
         # Loop through each unique repair time increment and determine when stops affecting function
         for i in range(num_repair_time_increments):
             # Quantify the affected area (based on srss of differenct component
@@ -1252,7 +1273,7 @@ def fn_tenant_function( damage, building_model, system_operation_day,
             affects_function = percent_area_affected > unit['interior'] 
             
             # Add days in this increment to the tally
-            delta_day = np.nanmin(comps_day_repaired[:,damage['fnc_filters']['interior_function_all']], axis=1)
+            delta_day = np.nanmin(comps_day_repaired[:,fnc_idx['interior_function_all']], axis=1)
             delta_day[np.isnan(delta_day)] = 0
             int_function_recovery_day = int_function_recovery_day + affects_function * delta_day
             
@@ -1273,11 +1294,12 @@ def fn_tenant_function( damage, building_model, system_operation_day,
         # Water and Plumbing System
         # determine effect on funciton at this tenant unit
         # any major damage to the branch pipes (small diameter) failes for this tenant unit
-        tenant_sys_recovery_day = np.nanmax(np.array(repair_complete_day) * damage['fnc_filters']['water_unit'], axis=1) 
+        tenant_sys_recovery_day = np.fmax.reduce(repair_complete_day[:,fnc_idx['water_unit']], axis=1, initial=0) 
         recovery_day['water_potable'][:,tu] = np.fmax(system_operation_day['building']['water_potable_main'],tenant_sys_recovery_day)
               
         # distribute effect to the components
-        comp_breakdowns['water_potable'][:,:,tu] = np.fmax(system_operation_day['comp']['water_potable_main'], np.array(repair_complete_day) * damage['fnc_filters']['water_unit'])
+        comp_breakdowns['water_potable'][:,:,tu] = system_operation_day['comp']['water_potable_main']
+        comp_breakdowns['water_potable'][:,fnc_idx['water_unit'],tu] = np.fmax(system_operation_day['comp']['water_potable_main'][:,fnc_idx['water_unit']], repair_complete_day[:,fnc_idx['water_unit']])
         
         # In taller buildings, water needs to be pumped to reach upper stories
         #and therefore requires electrical power
@@ -1291,11 +1313,12 @@ def fn_tenant_function( damage, building_model, system_operation_day,
         ## Sanitary Waste System
         # determine effect on funciton at this tenant unit
         # any major damage to the branch pipes (small diameter) failes for this tenant unit
-        tenant_sys_recovery_day = np.nanmax(repair_complete_day * damage['fnc_filters']['sewer_unit'], axis=1) 
+        tenant_sys_recovery_day = np.fmax.reduce(repair_complete_day[:,fnc_idx['sewer_unit']], axis=1, initial=0) 
         recovery_day['water_sanitary'][:,tu] = np.fmax(system_operation_day['building']['water_sanitary_main'], tenant_sys_recovery_day)
     
         # distribute effect to the components
-        comp_breakdowns['water_sanitary'][:,:,tu] = np.fmax(system_operation_day['comp']['water_sanitary_main'], np.array(repair_complete_day) * damage['fnc_filters']['water_unit'])
+        comp_breakdowns['water_sanitary'][:,:,tu] = system_operation_day['comp']['water_sanitary_main']
+        comp_breakdowns['water_sanitary'][:,fnc_idx['water_unit'],tu] = np.fmax(system_operation_day['comp']['water_sanitary_main'][:,fnc_idx['water_unit']], repair_complete_day[:,fnc_idx['water_unit']])
     
         # Sanitary waste operation at this tenant unit depends on the 
         # operation of the potable water system at this tenant unit
@@ -1307,11 +1330,12 @@ def fn_tenant_function( damage, building_model, system_operation_day,
         if unit['is_electrical_required'] == 1:
             # determine effect on funciton at this tenant unit
             # any major damage to the unit level electrical equipment fails for this tenant unit
-            tenant_sys_recovery_day = np.nanmax(np.array(repair_complete_day) * damage['fnc_filters']['electrical_unit'], axis=1)
+            tenant_sys_recovery_day = np.fmax.reduce(repair_complete_day[:,fnc_idx['electrical_unit']], axis=1, initial=0)
             recovery_day['electrical'][:,tu] =np.fmax(system_operation_day['building']['electrical_main'], tenant_sys_recovery_day)
                       
             # distribute effect to the components
-            comp_breakdowns['electrical'][:,:,tu] = np.fmax(system_operation_day['comp']['electrical_main'], np.array(repair_complete_day) * damage['fnc_filters']['electrical_unit'])
+            comp_breakdowns['electrical'][:,:,tu] = system_operation_day['comp']['electrical_main']
+            comp_breakdowns['electrical'][:,fnc_idx['electrical_unit'],tu] = np.fmax(system_operation_day['comp']['electrical_main'][:,fnc_idx['electrical_unit']], repair_complete_day[:,fnc_idx['electrical_unit']])
 
         ## HVAC System
         # HVAC: Control System
@@ -1364,10 +1388,10 @@ def fn_tenant_function( damage, building_model, system_operation_day,
                                                   dependancy)    
 
         ## Data
-        if unit['is_data_required'] == 1 and any(damage['fnc_filters']['data_unit'] | damage['fnc_filters']['data_main']):
+        if unit['is_data_required'] == 1 and np.size(preprocessing_fns.fn_fnc_filter_idx(damage['fnc_filter_bits'], ['data_unit', 'data_main'])) > 0:
         # determine effect on funciton at this tenant unit
         # any major damage to the unit level electrical equipment fails for this tenant unit
-            tenant_sys_recovery_day = np.nanmax(repair_complete_day * damage['fnc_filters']['data_unit'], axis=1)
+            tenant_sys_recovery_day = np.fmax.reduce(repair_complete_day[:,fnc_idx['data_unit']], axis=1, initial=0)
             recovery_day['data'][:,tu] = np.fmax(system_operation_day['building']['data_main'], tenant_sys_recovery_day)
 
             # Consider effect of external power network
@@ -1375,39 +1399,21 @@ def fn_tenant_function( damage, building_model, system_operation_day,
             recovery_day['data'] = np.fmax(recovery_day['data'], system_operation_day['building']['electrical_main'].reshape(num_reals,1))
     
             # distribute effect to the components
-            comp_breakdowns['data'][:,:,tu] = np.fmax(system_operation_day['comp']['data_main'], np.array(repair_complete_day) * damage['fnc_filters']['data_unit'])
-
-        ## Post process for tenant-specific requirements 
-        # Zero out systems that are not required by the tenant
-        # Still need to calculate above due to dependancies between options
-        if unit['is_water_potable_required'] != 1:
-            recovery_day['water_potable'] = np.zeros([num_reals,num_units])
-            comp_breakdowns['water_potable'] = np.zeros([num_reals,num_comps,num_units])
-
-        if unit['is_water_sanitary_required'] != 1:
-            recovery_day['water_sanitary'] = np.zeros([num_reals,num_units])
-            comp_breakdowns['water_sanitary'] = np.zeros([num_reals,num_comps,num_units])
+            comp_breakdowns['data'][:,:,tu] = system_operation_day['comp']['data_main']
+            comp_breakdowns['data'][:,fnc_idx['data_unit'],tu] = np.fmax(system_operation_day['comp']['data_main'][:,fnc_idx['data_unit']], repair_complete_day[:,fnc_idx['data_unit']])
 
-        if unit['is_hvac_ventilation_required'] != 1:
-            recovery_day['hvac_ventilation'] = np.zeros([num_reals,num_units])
-            comp_breakdowns['hvac_ventilation'] = np.zeros([num_reals,num_comps,num_units])
-
-        if unit['is_hvac_heating_required'] != 1:
-            recovery_day['hvac_heating'] = np.zeros([num_reals,num_units])
-            comp_breakdowns['hvac_heating'] = np.zeros([num_reals,num_comps,num_units])
-
-        if unit['is_hvac_cooling_required'] != 1:
-            recovery_day['hvac_cooling'] = np.zeros([num_reals,num_units])
-            comp_breakdowns['hvac_cooling'] = np.zeros([num_reals,num_comps,num_units])
-
-        if unit['is_hvac_exhaust_required'] != 1:
-            recovery_day['hvac_exhaust'] = np.zeros([num_reals,num_units])
-            comp_breakdowns['hvac_exhaust'] = np.zeros([num_reals,num_comps,num_units])
+    ## Post process for tenant-specific requirements 
+    # Zero out systems that are not required by each tenant unit
+    # Still need to calculate above due to dependancies between options
+    for system in ['water_potable', 'water_sanitary', 'hvac_ventilation', 'hvac_heating', 'hvac_cooling', 'hvac_exhaust']:
+        not_required = np.array(tenant_units['is_' + system + '_required']) != 1
+        recovery_day[system][:,not_required] = 0
+        comp_breakdowns[system][:,:,not_required] = 0
 
     return recovery_day, comp_breakdowns    
 
 
-def fn_combine_comp_breakdown(comp_ds_table, perform_targ_days, comp_names, reoccupancy, functional):
+def fn_combine_comp_breakdown(comp_ds_table, perform_targ_days, comp_names, reoccupancy, functional, comp_groups = None):
     '''get the combined reoccupancy/functionality effect of components
     
     Parameters
@@ -1424,6 +1430,9 @@ def fn_combine_comp_breakdown(comp_ds_table, perform_targ_days, comp_names, reoc
     functional: array [num reals x num comp_ds]
       realizations of functional recovery time broken down for each damage
       state of each component
+    comp_groups: dictionary, optional
+      component damage states grouped by component (damage['comp_groups']).
+      Created from comp_ds_table['comp_id'] if not provided.
     
     Returns
     -------
@@ -1432,19 +1441,155 @@ def fn_combine_comp_breakdown(comp_ds_table, perform_targ_days, comp_names, reoc
       considering both consequenses from reoccupancy and functional recovery'''
     
     import numpy as np
+    from preprocessing import preprocessing_fns
     ## Method
+    if comp_groups is None:
+        comp_groups = preprocessing_fns.fn_create_comp_groups(comp_ds_table['comp_id'])
     combined = np.zeros([len(comp_names),len(perform_targ_days)])
     max_reocc_func = np.fmax(reoccupancy, functional)
-    for c in range(len(comp_names)):
-        comp_filt = comp_ds_table['comp_id'] == comp_names[c] # find damage states associated with this component    
-        combined[c,:] = np.mean(np.nanmax(max_reocc_func[:,comp_filt], axis=1).reshape(len(max_reocc_func),1) > np.array(perform_targ_days).reshape(1, len(perform_targ_days)), axis=0)
+    
+    # Max day of the damage states of each component (ignoring NaNs)
+    comp_max_day = preprocessing_fns.fn_comp_group_reduce(max_reocc_func, comp_groups, np.fmax)
+    if len(comp_names) > 0:
+        comp_pos = np.searchsorted(comp_groups['comp_names'], comp_names) # position of each requested component in the groups
+        combined = fn_exceedance_probability(comp_max_day[:,comp_pos], perform_targ_days)
 
     return combined
 
 
+def fn_exceedance_probability(values, targ_days):
+    '''Fraction of realizations where each column of values exceeds each
+    target day, from one sort of each column and an ECDF lookup of the target
+    days
+    
+    Parameters
+    ----------
+    values: array [num_reals x num columns]
+     simulated days (e.g. recovery day of each system). NaN never exceeds
+     the target days but still counts as a realization
+     
+    targ_days: array [num target days]
+     target days, in ascending order
+    
+    Returns
+    -------
+    prob_exceed: array [num columns x num target days]
+     fraction of realizations where the day is greater than each target day'''
+    
+    import numpy as np
+    
+    values = np.array(values, dtype=float)
+    targ_days = np.array(targ_days, dtype=float)
+    num_reals, num_cols = np.shape(values)
+    
+    sorted_values = np.sort(values, axis=0) # NaNs are sorted to the end
+    num_valid = num_reals - np.sum(np.isnan(values), axis=0)
+    
+    prob_exceed = np.zeros([num_cols, len(targ_days)])
+    for c in range(num_cols):
+        num_not_exceeding = np.searchsorted(sorted_values[0:num_valid[c],c], targ_days, side='right')
+        prob_exceed[c,:] = (num_valid[c] - num_not_exceeding) / num_reals
+
+    return prob_exceed
+
+
+def fn_recovery_curve(recovery_trajectory, time_grid, statistic = 'mean'):
+    '''Fraction of tenant units recovered at each day of a time grid,
+    computed on request from the stored recovery trajectory
+
+    Parameters
+    ----------
+    recovery_trajectory: dictionary
+     recovery['recovery_trajectory'] of fn_extract_recovery_metrics (or the
+     same data loaded from the json outputs). recovery_day is the sorted
+     recovery day of each tenant unit [num_reals x num_units]; a single
+     realization can also be passed as a vector
+
+    time_grid: array [num days]
+     days after the earthquake to evaluate the recovery curve at
+
+    statistic: string or number
+     'mean' or 'median' of the fraction recovered across realizations, or a
+     percentile between 0 and 100
+
+    Returns
+    -------
+    fraction_recovered: array [num days]
+     statistic of the fraction of tenant units recovered on each day of the
+     time grid'''
+
+    import numpy as np
+
+    recovery_day = np.array(recovery_trajectory['recovery_day'], dtype=float)
+    if recovery_day.ndim == 1:
+        recovery_day = recovery_day.reshape(1, len(recovery_day))
+    recovery_day = np.sort(recovery_day, axis=1)
+    time_grid = np.array(time_grid, dtype=float).ravel()
+    num_reals, num_units = np.shape(recovery_day)
+
+    # Mean curve is the ECDF of all tenant unit recovery days
+    if statistic == 'mean':
+        num_recovered = np.searchsorted(np.sort(recovery_day, axis=None), time_grid, side='right')
+        return num_recovered / (num_reals * num_units)
+
+    # Otherwise count the recovered units of each realization with a single
+    # lookup, shifting each realization into its own interval of days
+    low = min(np.min(recovery_day), np.min(time_grid))
+    shift = (max(np.max(recovery_day), np.max(time_grid)) - low + 1) * np.arange(num_reals).reshape(num_reals, 1)
+    shifted_days = (recovery_day - low + shift).ravel()
+    num_recovered = np.searchsorted(shifted_days, time_grid.reshape(1, len(time_grid)) - low + shift, side='right') - num_units * np.arange(num_reals).reshape(num_reals, 1)
+
+    percentile = 50 if statistic == 'median' else statistic
+    fraction_recovered = np.percentile(num_recovered / num_units, percentile, axis=0)
+
+    return fraction_recovered
+
+
+def fn_performance_target_days(recovery_day_max):
+    '''Performance target days of the recovery breakdowns, extended by
+    quarters of a year when recovery takes longer than a year
+    
+    Parameters
+    ----------
+    recovery_day_max: number
+     maximum recovery day among all tenant units and realizations
+    
+    Returns
+    -------
+    perform_targ_days: list
+     target recovery days'''
+    
+    import numpy as np
+    
+    # Define performance targets
+    perform_targ_days = [0, 3, 7, 14, 30, 60, 90, 120, 182, 270, 365]
+
+    #FZ# Append perform target days with more milestones if repair time exceeds 1 year  
+    if recovery_day_max <= 365:
+        perform_targ_days = perform_targ_days # Number of days for each performance target stripe
+    if recovery_day_max > 365:
+        num_years = (int(np.floor((recovery_day_max)/365)))
+        
+        # If number of complete years is more than 2
+        for yr in range(num_years-1):
+            quarters =[1,2,3]
+            for qtr in quarters:
+                perform_targ_days.append(365*(yr+1) + qtr * 90)
+            perform_targ_days.append(365*(yr+2))
+        
+        # For final incomplete year
+        num_quarters = int(np.floor((recovery_day_max - perform_targ_days[-1])/90))
+        for qtr in range(num_quarters):
+            perform_targ_days.append(perform_targ_days[-1] +  90)
+        perform_targ_days.append(recovery_day_max)
+        
+    return perform_targ_days
+
+
 def fn_extract_recovery_metrics( tenant_unit_recovery_day, 
                                  recovery_day, comp_breakdowns, comp_id, 
-                                 simulated_replacement_time):
+                                 simulated_replacement_time, comp_groups = None,
+                                 output_profile = 'full'):
     '''Reformant tenant level recovery outcomes into outcomes at the building level, 
     system level, and compoennt level
     
@@ -1468,6 +1613,16 @@ def fn_extract_recovery_metrics( tenant_unit_recovery_day,
      simulated time when the building needs to be replaced, and how long it
      will take (in days). NaN represents no replacement needed (ie
      building will be repaired)
+     
+    comp_groups: dictionary, optional
+     component damage states grouped by component (damage['comp_groups'],
+     see preprocessing_fns.fn_create_comp_groups). Created from comp_id if
+     not provided.
+     
+    output_profile: string, optional
+     'full', 'standard' or 'summary' (see fn_output_profile). For 'summary',
+     the recovery trajectory is stored as statistics across realizations
+     rather than per realization.
     Returns
     -------
     recovery['tenant_unit']['recovery_day']: array [num_reals x num_tenant_units]
@@ -1480,11 +1635,12 @@ def fn_extract_recovery_metrics( tenant_unit_recovery_day,
     simulated fraction of the building with initial loss of
     reoccupancy/function
     
-    recovery['recovery_trajectory']['recovery_day']: array [num_reals x num recovery steps]
-    simulated recovery trajectory y-axis
+    recovery['recovery_trajectory']['recovery_day']: int array [num_reals x num_tenant_units]
+    simulated recovery day of each tenant unit, rounded up to whole days and
+    sorted in the order of recovery (see fn_recovery_curve)
     
-    recovery['recovery_trajectory']['percent_recovered']: array [1 x num recovery steps]
-    recovery trajectory x-axis
+    recovery['recovery_trajectory']['percent_recovered']: array [num_tenant_units]
+    fraction of tenant units recovered at each sorted recovery day
     
     recovery['breakdowns']['system_breakdowns']: array [num fault tree events x target days]
     fraction of realizations affected by various fault tree events beyond
@@ -1504,35 +1660,19 @@ def fn_extract_recovery_metrics( tenant_unit_recovery_day,
     fragility IDs of each component'''
     
     import numpy as np
+    from preprocessing import preprocessing_fns
+    from fn_output_profile import fn_realization_statistics
     
     recovery={'tenant_unit' : {}, 'building_level' : {}, 'recovery_trajectory' : {}, 'breakdowns' : {}, 'partial' : {}}
     
     ## Initial Setup
     num_units = np.size(tenant_unit_recovery_day,1)
 
-    # Define performance targets
-    perform_targ_days = [0, 3, 7, 14, 30, 60, 90, 120, 182, 270, 365]
     #FZ# Maximum day for recovery amongs all tenant units and all realizations
     recovery_day_max = max(np.nanmax(tenant_unit_recovery_day, axis=1))
 
-    #FZ# Append perform target days with more milestones if repair time exceeds 1 year  
-    if recovery_day_max <= 365:
-        perform_targ_days = perform_targ_days # Number of days for each performance target stripe
-    if recovery_day_max > 365:
-        num_years = (int(np.floor((recovery_day_max)/365)))
-        
-        # If number of complete years is more than 2
-        for yr in range(num_years-1):
-            quarters =[1,2,3]
-            for qtr in quarters:
-                perform_targ_days.append(365*(yr+1) + qtr * 90)
-            perform_targ_days.append(365*(yr+2))
-        
-        # For final incomplete year
-        num_quarters = int(np.floor((recovery_day_max - perform_targ_days[-1])/90))
-        for qtr in range(num_quarters):
-            perform_targ_days.append(perform_targ_days[-1] +  90)
-        perform_targ_days.append(recovery_day_max)
+    # Define performance targets
+    perform_targ_days = fn_performance_target_days(recovery_day_max)
         
         
     # Determine replacement cases
@@ -1554,10 +1694,15 @@ def fn_extract_recovery_metrics( tenant_unit_recovery_day,
     recovery['building_level']['initial_percent_affected'] = np.mean(tenant_unit_recovery_day > 0, axis=1) # percent of building affected, not the percent of realizations
     
     ## Recovery Trajectory -- calcualte from the tenant breakdowns
-    recovery['recovery_trajectory']['recovery_day'] = np.sort(np.column_stack((tenant_unit_recovery_day, tenant_unit_recovery_day)), axis=1)
-    recovery['recovery_trajectory']['percent_recovered'] = np.sort(np.concatenate((np.arange(num_units), np.arange(1, num_units+1)))/num_units)
+    # Stored once per tenant unit, in whole days; curves are evaluated on
+    # request with fn_recovery_curve
+    if output_profile == 'summary':
+        recovery['recovery_trajectory']['recovery_day'] = fn_realization_statistics(np.sort(np.ceil(tenant_unit_recovery_day), axis=1))
+    else:
+        recovery['recovery_trajectory']['recovery_day'] = np.sort(np.ceil(tenant_unit_recovery_day), axis=1).astype(int)
+    recovery['recovery_trajectory']['percent_recovered'] = np.arange(1, num_units+1)/num_units
     recovery['building_level']['perform_targ_days'] = perform_targ_days
-    recovery['building_level']['prob_of_target'] = np.mean(recovery['building_level']['recovery_day'].reshape(len(recovery['building_level']['recovery_day']),1) > np.array(perform_targ_days).reshape(1,len(perform_targ_days)), axis=0)
+    recovery['building_level']['prob_of_target'] = fn_exceedance_probability(recovery['building_level']['recovery_day'].reshape(len(recovery['building_level']['recovery_day']),1), perform_targ_days)[0,:]
     
     
     # Save specific breakdowns for red tags
@@ -1566,10 +1711,6 @@ def fn_extract_recovery_metrics( tenant_unit_recovery_day,
         red_tag_day[replace_cases] = np.array(simulated_replacement_time)[replace_cases]
         recovery['building_level']['recovery_day_red_tag'] = red_tag_day
 
-    
-    ## Recovery Trajectory -- calcualte from the tenant breakdowns
-    recovery['recovery_trajectory']['recovery_day'] = np.sort(np.column_stack((tenant_unit_recovery_day, tenant_unit_recovery_day)), axis =1)
-    recovery['recovery_trajectory']['percent_recovered'] = np.sort(np.concatenate((np.arange(0, (num_units)), np.arange(1, (num_units+1))))) / num_units
 
     #partial recovery
     pct_recovered_targets = [0.1, 0.5, 0.75, 0.8, 1]
@@ -1578,26 +1719,33 @@ def fn_extract_recovery_metrics( tenant_unit_recovery_day,
     # are required
     ordered_tenant_repair_days = np.sort(tenant_unit_recovery_day, axis = 1)
     
+    # number of tenant units recovered by each target day for each realization
+    # (ECDF of each realization evaluated at the target days)
+    num_reals = np.size(tenant_unit_recovery_day,0)
+    num_targ_days = len(perform_targ_days)
+    first_targ_idx = np.searchsorted(np.array(perform_targ_days), tenant_unit_recovery_day, side='left') # first target day each unit is recovered by
+    targ_idx_count = np.bincount((np.arange(num_reals).reshape(num_reals,1)*(num_targ_days+1) + first_targ_idx).ravel(), minlength=num_reals*(num_targ_days+1)).reshape(num_reals,num_targ_days+1)
+    pct_recovered_per_real = np.cumsum(targ_idx_count[:,0:num_targ_days], axis=1) / num_units
+
+    # how many units need to be repaired to meet each percent required, and
+    # the day they are recovered (all percentiles in one pass)
+    reqd_units = np.ceil(num_units * np.array(pct_recovered_targets)).astype(int)
+    reqd_units_day = np.ascontiguousarray(ordered_tenant_repair_days[:, reqd_units-1].T) #FZ reqd_units - 1 because pytho indexing start from zero.
+    reqd_units_day_mean = np.mean(reqd_units_day, axis=1)
+    reqd_units_day_fractiles = np.quantile(reqd_units_day, [0.5, 0.75, 0.9], axis=1)
+
     for i_pct in range(len(pct_recovered_targets)):
         recovery['partial'][i_pct] = {}
         target_recovery_ratio_units = pct_recovered_targets[i_pct]
         recovery['partial'][i_pct]['target_recovery_ratio_units'] = target_recovery_ratio_units
         recovery['partial'][i_pct]['target_recovery_day'] = perform_targ_days;
-        recovery['partial'][i_pct]['prob_of_target'] = {}
-        for i_targ_day in range(len(perform_targ_days)):
-            targ_day = perform_targ_days[i_targ_day]
-            # get the percentage of tenant units recovered at the given day
-            # pct_recovered_per_real = np.mean(np.sum(tenant_unit_recovery_day <= targ_day, axis=1) / num_units, axis=1);
-            pct_recovered_per_real = np.sum(tenant_unit_recovery_day <= targ_day, axis=1) / num_units
-            recovery['partial'][i_pct]['prob_of_target'][i_targ_day] = np.mean(pct_recovered_per_real < target_recovery_ratio_units)
-           
-            # how many units need to be repaired to meet the percent required 
-            reqd_units = int(np.ceil(num_units * target_recovery_ratio_units))
-            recovery['partial'][i_pct]['reqd_units'] = reqd_units
-            recovery['partial'][i_pct]['mean'] = np.mean(ordered_tenant_repair_days[:, reqd_units-1]) #FZ reqd_units - 1 because pytho indexing start from zero.
-            recovery['partial'][i_pct]['median'] = np.percentile(ordered_tenant_repair_days[:, reqd_units-1], 50)
-            recovery['partial'][i_pct]['fractile_75'] = np.percentile(ordered_tenant_repair_days[:, reqd_units-1], 75)
-            recovery['partial'][i_pct]['fractile_90'] = np.percentile(ordered_tenant_repair_days[:, reqd_units-1], 90)
+        prob_of_target = np.mean(pct_recovered_per_real < target_recovery_ratio_units, axis=0)
+        recovery['partial'][i_pct]['prob_of_target'] = {i_targ_day : prob_of_target[i_targ_day] for i_targ_day in range(num_targ_days)}
+        recovery['partial'][i_pct]['reqd_units'] = int(reqd_units[i_pct])
+        recovery['partial'][i_pct]['mean'] = reqd_units_day_mean[i_pct]
+        recovery['partial'][i_pct]['median'] = reqd_units_day_fractiles[0,i_pct]
+        recovery['partial'][i_pct]['fractile_75'] = reqd_units_day_fractiles[1,i_pct]
+        recovery['partial'][i_pct]['fractile_90'] = reqd_units_day_fractiles[2,i_pct]
 
 
 
@@ -1660,21 +1808,23 @@ def fn_extract_recovery_metrics( tenant_unit_recovery_day,
     system_names = list(system_breakdowns.keys())
     
     # pre-allocating variables
-    comps = np.unique(comp_id)
+    if comp_groups is None:
+        comp_groups = preprocessing_fns.fn_create_comp_groups(comp_id)
+    comps = comp_groups['comp_names']
     recovery['breakdowns']['system_breakdowns'] = np.zeros([len(system_names),len(perform_targ_days)])
     recovery['breakdowns']['component_breakdowns'] = np.zeros([len(comps),len(perform_targ_days)])
     
     # Calculate fraction of realization each system affects recovery for each
     # performance target time
-    for s in range(len(system_names)):
-        recovery['breakdowns']['system_breakdowns'][s,:] = np.mean(system_breakdowns[system_names[s]] > perform_targ_days, axis=0)
+    if len(system_names) > 0:
+        recovery['breakdowns']['system_breakdowns'] = fn_exceedance_probability(np.column_stack([system_breakdowns[name] for name in system_names]), perform_targ_days)
 
     
     # Calculate fraction of realization each component affects recovery for each
-    # performance target time
-    for c in range(len(comps)):
-        comp_filt = comp_id == comps[c] # find damage states associated with this component
-        recovery['breakdowns']['component_breakdowns'][c,:] = np.nanmean(np.max(component_breakdowns[:,comp_filt], axis=1).reshape(len(component_breakdowns),1) > perform_targ_days, axis=0)
+    # performance target time (max of the damage states of each component,
+    # NaN if any damage state is NaN)
+    comp_max_day = preprocessing_fns.fn_comp_group_reduce(component_breakdowns, comp_groups, np.maximum)
+    recovery['breakdowns']['component_breakdowns'] = fn_exceedance_probability(comp_max_day, perform_targ_days)
 
     # store this so we can properly overalap the reoccupancy and functionality
     recovery['breakdowns']['component_breakdowns_all_reals'] = component_breakdowns
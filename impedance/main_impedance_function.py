@@ -56,6 +56,7 @@ def main_impeding_factors(damage, impedance_options, repair_cost_ratio_total,
     import numpy as np
     from scipy.stats import truncnorm
     from impedance import other_impedance_functions
+    from preprocessing import sparse_damage_fns
 
     # Initialize parameters
     num_reals = len(inspection_trigger)
@@ -103,9 +104,21 @@ def main_impeding_factors(damage, impedance_options, repair_cost_ratio_total,
         'redesign' : np. zeros([num_reals, num_sys]),
         'flooding' : np. zeros(num_reals)
         }
+    trigger_fnc_filters = {'rapid_permit' : 'permit_rapid', 'full_permit' : 'permit_full', 'redesign' : 'redesign'}
     for sys in range(num_sys):
         sys_filt = np.array(damage['comp_ds_table']['system']) == sys+1 #FZ +1 is done to coorrelate with python indexing starting from 0. 
         for tu in range(len(damage['tenant_units'])): 
+            if 'sparse_damage' in damage.keys():
+                # Only check the stored damaged entries of the sparse damage
+                is_damaged = damage['sparse_damage']['tenant_units'][tu]['is_damaged_full']
+                sys_repair_trigger['any'][:,sys] = np.maximum(sys_repair_trigger['any'][:,sys], sparse_damage_fns.fn_sparse_row_any(is_damaged, sys_filt))
+                for trigger in ['rapid_permit', 'full_permit', 'redesign']:
+                    trigger_filt = np.logical_and(sys_filt, np.array(damage['fnc_filters'][trigger_fnc_filters[trigger]], dtype=bool))
+                    sys_repair_trigger[trigger][:,sys] = np.maximum(sys_repair_trigger[trigger][:,sys], sparse_damage_fns.fn_sparse_row_any(is_damaged, trigger_filt))
+                flood_filt = np.logical_and(sys_filt, np.array(damage['fnc_filters']['causes_flooding'], dtype=bool))
+                sys_repair_trigger['flooding'] = np.maximum(sys_repair_trigger['flooding'], sparse_damage_fns.fn_sparse_row_any(is_damaged, flood_filt))
+                continue
+            
             is_damaged = np.logical_and(np.array(damage['tenant_units'][tu]['qnt_damaged']) > 0, np.array(damage['tenant_units'][tu]['worker_days']) > 0) # There is damage that needs to be fixed
             # Track if any damage exists that requires repair (assumes all
             # damage requires repair)
@@ -171,6 +184,11 @@ def main_impeding_factors(damage, impedance_options, repair_cost_ratio_total,
             sim_long_lead = np.exp(x_vals_std_n * beta + np.log(np.array(damage['comp_ds_table']['long_lead_time'])))
             
             for tu in range(len(damage['tenant_units'])):
+                if 'sparse_damage' in damage.keys():
+                    duration['long_lead'][:,sys] = np.maximum(duration['long_lead'][:,sys], 
+                                                    sparse_damage_fns.fn_sparse_row_max(damage['sparse_damage']['tenant_units'][tu]['is_damaged_full'], sys_filt, sim_long_lead))
+                    continue
+                
                 is_damaged = np.logical_and(np.array(damage['tenant_units'][tu]['qnt_damaged']) > 0, np.array(damage['tenant_units'][tu]['worker_days']) > 0)
                 
                 #Track if any damage exists that requires repair (assumes all
@@ -231,6 +249,10 @@ def main_impeding_factors(damage, impedance_options, repair_cost_ratio_total,
     for sys in range(len(tmp_repair_class)): 
         sys_filt = np.array(damage['comp_ds_table']['tmp_repair_class']) == sys+1
         for tu in range(len(damage['tenant_units'])):
+            if 'sparse_damage' in damage.keys():
+                tmp_repair_class_trigger[:,sys] = np.maximum(tmp_repair_class_trigger[:,sys], sparse_damage_fns.fn_sparse_row_any(damage['sparse_damage']['tenant_units'][tu]['is_damaged_full'], sys_filt))
+                continue
+            
             is_damaged = np.logical_and(np.array(damage['tenant_units'][tu]['qnt_damaged']) > 0 , np.array( damage['tenant_units'][tu]['worker_days']) > 0)
             # Track if any damage exists that requires repair (assumes all damage requires repair)
             tmp_repair_class_trigger[:,sys] = np.maximum(tmp_repair_class_trigger[:,sys], np.nanmax(is_damaged * sys_filt, axis = 1))
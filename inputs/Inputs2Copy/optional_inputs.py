@@ -62,7 +62,9 @@ optional_inputs = {
  "max_workers_building_min" :  20,
  "max_workers_building_max" :  260,
  "allow_tmp_repairs" : 1,
- "allow_shoring" : 1
+ "allow_shoring" : 1,
+ "discrete_scheduler" : False,
+ "worker_allocation_backend" : "numpy"
                          },
 
 # Functionality Assessment Options
@@ -90,6 +92,9 @@ optional_inputs = {
                              },
 "water_pressure_max_story" : 4,
 "heat_utility" : 'gas',
+"output_profile" : 'full',
+"precision" : 'float64',
+"sparse_damage" : False,
                         }
 
                 }
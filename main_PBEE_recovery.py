@@ -2,7 +2,7 @@ def main_PBEE_recovery(damage, damage_consequences, building_model,
                       tenant_units, systems, subsystems, tmp_repair_class, 
                       impedance_options, impeding_factor_medians, 
                       repair_time_options, functionality, 
-                      functionality_options):
+                      functionality_options, stage_cache = None):
     '''Perform the ATC-138 functional recovery time assessement given similation
     of component damage for a single shaking intensity
     
@@ -45,7 +45,17 @@ def main_PBEE_recovery(damage, damage_consequences, building_model,
       dictionary containing simulated utility downtimes
     
     functionality_options: dictionary
-      recovery time optional inputs such as various damage thresholds
+      recovery time optional inputs such as various damage thresholds, and
+      the output_profile ('full', 'standard' or 'summary'; default 'full') and
+      the precision of the simulated damage arrays ('float64' or 'float32';
+      default 'float64') and whether to use sparse damage matrices
+      (sparse_damage; default False)
+    
+    stage_cache: dictionary
+      optional cache of the assessment stages (see
+      fn_stage_cache.fn_create_stage_cache). Stages whose code, inputs,
+      options and random number generator state are unchanged since a
+      previous run are loaded rather than recomputed.
     
     
     Returns
@@ -53,50 +63,56 @@ def main_PBEE_recovery(damage, damage_consequences, building_model,
     functionality: dictionary
       contains data on the recovery of tenant- and building-level function, 
       recovery trajectorires, and contributions from systems and components, 
-      simulated repair schedule breakdowns and impeding times.'''
+      simulated repair schedule breakdowns and impeding times. For the
+      'summary' output profile, per realization outputs are replaced by their
+      statistics.'''
     
     ## Import Packages
-    import numpy as np
-    from preprocessing import main_preprocessing
-    from fn_red_tag import fn_red_tag
-    from impedance import main_impedance_function
-    from repair_schedule import main_repair_schedule
-    from functionality import main_functionality_function
-    
-    ## Combine compoment attributes into recovery filters to expidite recovery assessment
-    damage, tmp_repair_class, damage_consequences = main_preprocessing.main_preprocessing(damage['comp_ds_table'], 
-                                                damage , repair_time_options, tmp_repair_class, damage_consequences, 
-                                                building_model['num_stories'])
-    
-    ## Calculate Red Tags
-    RT, RTI, IT = fn_red_tag(functionality_options['calculate_red_tag'], 
-                                    damage, building_model['comps'],
-                                    np.array(damage_consequences['simulated_replacement_time']))
-    
-    damage_consequences['red_tag'] = RT 
-    damage_consequences['red_tag_impact'] = RTI 
-    damage_consequences['inspection_trigger'] = IT
-    
-    ## Simulate ATC 138 Impeding Factors
-    functionality['impeding_factors'] = main_impedance_function.main_impeding_factors(damage, impedance_options, 
-                                          damage_consequences['repair_cost_ratio_total'],
-                                          damage_consequences['repair_cost_ratio_engineering'], 
-                                          damage_consequences['inspection_trigger'],
-                                          systems, tmp_repair_class, 
-                                          building_model['building_value'], 
-                                          impeding_factor_medians,
-                                          functionality_options['include_flooding_impact'])
-    
-    ## Construct the Building Repair Schedule
-    damage, functionality['worker_data'], functionality['building_repair_schedule'] = main_repair_schedule.main_repair_schedule(damage, building_model, damage_consequences['red_tag'], 
-        repair_time_options, systems, tmp_repair_class, functionality['impeding_factors'], 
-        damage_consequences['simulated_replacement_time'])
-    
-    ## Calculate the Recovery of Building Reoccupancy and Function
-    functionality['recovery'] = main_functionality_function.main_functionality(damage, building_model, 
-                                damage_consequences, functionality['utilities'], 
-                                functionality_options, tenant_units, subsystems, 
-                                functionality['impeding_factors']['temp_repair'])
+    from fn_output_profile import fn_check_output_profile, fn_apply_output_profile
+    from fn_recovery_dag import fn_run_recovery_dag
+    
+    output_profile = fn_check_output_profile(functionality_options['output_profile'] if 'output_profile' in functionality_options.keys() else 'full')
+    
+    ## Reuse a cached run of the same assessment, if available
+    if stage_cache != None:
+        from fn_stage_cache import fn_content_hash, fn_code_version, fn_stage_key, fn_cache_get, fn_cache_put
+        from fn_recovery_dag import recovery_stages, fn_stage_modules
+        damage_key = fn_content_hash(damage)
+        code_version = fn_code_version(['main_PBEE_recovery', 'fn_output_profile'] + 
+                                       [module for stage in recovery_stages for module in fn_stage_modules(stage)])
+        assessment_key = fn_stage_key('assessment', [code_version, damage_key, damage_consequences, building_model, tenant_units, 
+                                                     systems, subsystems, tmp_repair_class, impedance_options, 
+                                                     impeding_factor_medians, repair_time_options, functionality, 
+                                                     functionality_options])
+        is_cached, outputs = fn_cache_get(stage_cache, 'assessment', assessment_key)
+        if is_cached:
+            return outputs[0], outputs[1]
+    else:
+        damage_key = None
+    
+    ## Run the stages of the assessment in dependency order: combine component
+    ## attributes into recovery filters, calculate red tags, simulate ATC 138
+    ## impeding factors, construct the building repair schedule and calculate
+    ## the recovery of building reoccupancy and function (see fn_recovery_dag)
+    state = fn_run_recovery_dag({'damage' : damage, 'damage_consequences' : damage_consequences, 
+                                 'building_model' : building_model, 'tenant_units' : tenant_units, 
+                                 'systems' : systems, 'subsystems' : subsystems, 
+                                 'tmp_repair_class' : tmp_repair_class, 'impedance_options' : impedance_options, 
+                                 'impeding_factor_medians' : impeding_factor_medians, 
+                                 'repair_time_options' : repair_time_options, 'functionality' : functionality, 
+                                 'functionality_options' : functionality_options}, 
+                                stage_cache, {'damage' : damage_key})
+    damage_consequences = state['damage_consequences']
+    functionality['impeding_factors'] = state['impeding_factors']
+    functionality['worker_data'] = state['worker_data']
+    functionality['building_repair_schedule'] = state['building_repair_schedule']
+    functionality['recovery'] = state['recovery']
+    
+    ## Reduce the outputs to the requested output profile
+    functionality = fn_apply_output_profile(functionality, output_profile)
+    
+    if stage_cache != None:
+        fn_cache_put(stage_cache, 'assessment', assessment_key, [functionality, damage_consequences])
     
     return functionality, damage_consequences
 
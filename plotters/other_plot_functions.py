@@ -220,6 +220,7 @@ def plt_recovery_trajectory( recovery, full_repair_time, plot_dir):
     import matplotlib.pyplot as plt
     import os
     import numpy as np
+    from functionality.other_functionality_functions import fn_recovery_curve
     
     ## Initial Setup
     if os.path.exists(plot_dir) == False:
@@ -228,20 +229,23 @@ def plt_recovery_trajectory( recovery, full_repair_time, plot_dir):
     
     
 
-    # Calculate mean recovery times
-    reoc = np.mean(np.array(recovery['reoccupancy']['recovery_trajectory']['recovery_day']), axis=0)
-    func = np.mean(np.array(recovery['functional']['recovery_trajectory']['recovery_day']), axis=0)
-    med = np.median(np.array(recovery['functional']['recovery_trajectory']['recovery_day']), axis=0)
-    per_10 = np.percentile(np.array(recovery['functional']['recovery_trajectory']['recovery_day']), 10, axis=0)
-    per_90 = np.percentile(np.array(recovery['functional']['recovery_trajectory']['recovery_day']), 90, axis=0)
+    # Calculate mean recovery curves on a daily time grid
     full = np.mean(full_repair_time)
-    level_of_repair = recovery['functional']['recovery_trajectory']['percent_recovered']
+    reoc_trajectory = recovery['reoccupancy']['recovery_trajectory']
+    func_trajectory = recovery['functional']['recovery_trajectory']
+    max_day = np.max(np.array(func_trajectory['recovery_day']))
+    day_vector = np.arange(0, max(max_day, np.ceil(full)) + 2)
+    reoc = fn_recovery_curve(reoc_trajectory, day_vector, 'mean')
+    func = fn_recovery_curve(func_trajectory, day_vector, 'mean')
+    med = fn_recovery_curve(func_trajectory, day_vector, 'median')
+    per_10 = fn_recovery_curve(func_trajectory, day_vector, 10)
+    per_90 = fn_recovery_curve(func_trajectory, day_vector, 90)
     
     # Plot Recovery Trajectory
     plt.rcParams["font.family"] = "Times New Roman"
     plt.figure(figsize=(6,4)) 
-    plt.plot(reoc, level_of_repair,'r-', linewidth = 1.5, label = 'Re-Occupancy') 
-    plt.plot(func, level_of_repair,'b-', linewidth = 1.5, label= 'Functional') 
+    plt.step(day_vector, reoc,'r-', where = 'post', linewidth = 1.5, label = 'Re-Occupancy') 
+    plt.step(day_vector, func,'b-', where = 'post', linewidth = 1.5, label= 'Functional') 
     plt.plot([full, full], [0, 1],'k-', linewidth = 1.5, label= 'Fully Repaired') 
     plt.xlim([0,np.ceil((full+1)/10)*10])
     plt.xlabel('Days After Earthquake')
@@ -253,12 +257,13 @@ def plt_recovery_trajectory( recovery, full_repair_time, plot_dir):
     plt.savefig(plot_dir + 'recovery_trajectory.png', dpi=300)
     
     plt.figure(figsize=(6,4))
-    for i in range(len(recovery['functional']['recovery_trajectory']['recovery_day'])):
-        plt.plot(recovery['functional']['recovery_trajectory']['recovery_day'][i] , level_of_repair, color = 'lightgrey', linewidth = 0.5)
-    plt.plot(med, level_of_repair,'r-', linewidth = 1.5, label= 'Median')
-    plt.plot(per_10, level_of_repair,'b--', linewidth = 1.0, label= '10th percentile')
-    plt.plot(per_90, level_of_repair,'b--', linewidth = 1.0, label= '90th percentile')
-    plt.xlim([0,np.ceil((max(max(recovery['functional']['recovery_trajectory']['recovery_day'])))/10)*10])
+    level_of_repair = np.concatenate(([0], np.array(func_trajectory['percent_recovered'])))
+    for i in range(len(func_trajectory['recovery_day'])):
+        plt.step(np.concatenate(([0], func_trajectory['recovery_day'][i])), level_of_repair, color = 'lightgrey', where = 'post', linewidth = 0.5)
+    plt.step(day_vector, med,'r-', where = 'post', linewidth = 1.5, label= 'Median')
+    plt.step(day_vector, per_10,'b--', where = 'post', linewidth = 1.0, label= '10th percentile')
+    plt.step(day_vector, per_90,'b--', where = 'post', linewidth = 1.0, label= '90th percentile')
+    plt.xlim([0,np.ceil(max_day/10)*10])
     plt.title('Functional Recovery Trajectories')
     plt.xlabel('Days After Earthquake')
     plt.ylabel('Fraction of Floor Area')
@@ -322,10 +327,10 @@ def plt_gantt_chart(p_idx, recovery, full_repair_time, workers, schedule, impede
     
     ## Format Gantt Chart Data
     recovery_trajectory = {
-        'reoc' : np.array(recovery['reoccupancy']['recovery_trajectory']['recovery_day'])[p_idx,:],
-        'func' : np.array(recovery['functional']['recovery_trajectory']['recovery_day'])[p_idx,:],
-        'level_of_repair' : np.array(recovery['reoccupancy']['recovery_trajectory']['percent_recovered']),
-        'ful_rep' : np.ones(len(recovery['reoccupancy']['recovery_trajectory']['percent_recovered'])) * np.ceil(full_repair_time[p_idx])
+        'reoc' : np.concatenate(([0], np.array(recovery['reoccupancy']['recovery_trajectory']['recovery_day'])[p_idx,:])),
+        'func' : np.concatenate(([0], np.array(recovery['functional']['recovery_trajectory']['recovery_day'])[p_idx,:])),
+        'level_of_repair' : np.concatenate(([0], np.array(recovery['reoccupancy']['recovery_trajectory']['percent_recovered']))),
+        'ful_rep' : np.ones(len(recovery['reoccupancy']['recovery_trajectory']['percent_recovered']) + 1) * np.ceil(full_repair_time[p_idx])
         }
     
     # Collect Worker Data
@@ -383,8 +388,8 @@ def plt_gantt_chart(p_idx, recovery, full_repair_time, workers, schedule, impede
     G3.grid(which = 'major', axis = 'x', alpha=0.5) 
     
     # Plot Recovery Trajectory
-    G4.plot(recovery_trajectory['reoc'], recovery_trajectory['level_of_repair'],'r-', linewidth = 1.5, label = 'Re-Occupancy')
-    G4.plot(recovery_trajectory['func'], recovery_trajectory['level_of_repair'],'b-', linewidth = 1.5, label = 'Functional')
+    G4.step(recovery_trajectory['reoc'], recovery_trajectory['level_of_repair'],'r-', where = 'post', linewidth = 1.5, label = 'Re-Occupancy')
+    G4.step(recovery_trajectory['func'], recovery_trajectory['level_of_repair'],'b-', where = 'post', linewidth = 1.5, label = 'Functional')
     G4.plot(recovery_trajectory['ful_rep'], recovery_trajectory['level_of_repair'],'k-', linewidth = 1.5, label = 'Fully Repaired')
     G4.set_ylim([0,1])
     G4.set_xlabel('Days After Earthquake')
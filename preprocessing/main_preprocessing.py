@@ -1,4 +1,4 @@
-def main_preprocessing(comp_ds_table, damage, repair_time_options, temp_repair_class, damage_consequences, num_stories):
+def main_preprocessing(comp_ds_table, damage, repair_time_options, temp_repair_class, damage_consequences, num_stories, precision = 'float64', sparse_damage = False):
     '''Parameterize variables and simplifying assumptions to expedite the ATC138
     recovery assessment
 
@@ -27,6 +27,15 @@ def main_preprocessing(comp_ds_table, damage, repair_time_options, temp_repair_c
     
     num_stories: int
       Integer number of stories in the building being assessed
+    
+    precision: string
+      floating point precision of the simulated damage arrays, 'float64'
+      (default) or 'float32' (see preprocessing_fns.fn_set_precision)
+    
+    sparse_damage: logical
+      if true, also store the simulated damage as sparse matrices (see
+      sparse_damage_fns.fn_create_sparse_damage), used by the red tag,
+      impedance trigger and repair sequence calculations
 
     Returns
     -------
@@ -40,7 +49,9 @@ def main_preprocessing(comp_ds_table, damage, repair_time_options, temp_repair_c
       dictionary containing simulated building consequences, such as red'''
     
     # Import Packages
+    import numpy as np
     from preprocessing import preprocessing_fns
+    from preprocessing import sparse_damage_fns
     
     ## Define simulated damage in each tenant unit if not provided by the user
     damage = preprocessing_fns.fn_populate_damage_per_tu(damage)
@@ -48,8 +59,19 @@ def main_preprocessing(comp_ds_table, damage, repair_time_options, temp_repair_c
     ##Simulate damage per side, if not provided by the user
     damage = preprocessing_fns.fn_simulate_damage_per_side(damage)
     
-    ## Combine compoment attributes into recovery filters to expidite recovery assessment
-    damage['fnc_filters'] = preprocessing_fns.fn_create_fnc_filters(comp_ds_table)
+    ## Combine compoment attributes into recovery filters to expidite recovery
+    ## assessment, and group component damage states by component for per
+    ## component breakdowns (unless already compiled for the model, e.g. by the
+    ## assessment server)
+    if 'model_filters' in damage.keys():
+        model_filters = damage.pop('model_filters')
+        for key in list(comp_ds_table.keys()):
+            comp_ds_table[key] = np.array(comp_ds_table[key]) # as in fn_create_fnc_filters
+    else:
+        model_filters = preprocessing_fns.fn_compile_model_filters(comp_ds_table)
+    damage['fnc_filters'] = model_filters['fnc_filters']
+    damage['fnc_filter_bits'] = model_filters['fnc_filter_bits']
+    damage['comp_groups'] = model_filters['comp_groups']
     
     ## Simulate Temporary Repair Times for each component
     damage, temp_repair_class = preprocessing_fns.fn_simulate_temp_worker_days(damage, temp_repair_class, repair_time_options)
@@ -57,6 +79,13 @@ def main_preprocessing(comp_ds_table, damage, repair_time_options, temp_repair_c
     ## Set door racking damage if not provided by user
     damage_consequences = preprocessing_fns.fn_define_door_racking(damage_consequences, num_stories)
     
+    ## Set the precision of the simulated damage arrays
+    damage = preprocessing_fns.fn_set_precision(damage, precision)
+    
+    ## Store sparse damage for large component models, if requested
+    if sparse_damage:
+        damage = sparse_damage_fns.fn_create_sparse_damage(damage)
+    
     return damage, temp_repair_class, damage_consequences
 
     
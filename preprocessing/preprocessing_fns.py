@@ -38,25 +38,71 @@ def fn_simulate_damage_per_side(damage):
     Returns
     -------
     damage: dictionary
-      contains simulated damage info and damage state attributes'''
-    
-    
+      contains simulated damage info and damage state attributes. Simulated
+      damage per side is stored as the ratio of damage on each side
+      (damage['ratio_damage_per_side'], num reals x 4) and read through
+      fn_damage_per_side'''
+
+
     # Simulate damage per side, if not provided by the user
     if ('qnt_damaged_side_1' in damage['tenant_units'][0].keys()) == False:
         num_reals = len(damage['tenant_units'][0]['qnt_damaged'])
-        
+
         # Randomly split damage between 4 sides
         # (this will only matter for cladding components)
         ratio_damage_per_side = np.random.rand(num_reals,4) # assumes square footprint
         ratio_damage_per_side = ratio_damage_per_side / np.sum(ratio_damage_per_side, axis=1).reshape(num_reals,1) # force it to add to one
-    
-        # Assing damage
-        for tu in range(len(damage['tenant_units'])):
-            for s in range(4):
-                damage['tenant_units'][tu]['qnt_damaged_side_' +str(s+1)] = ratio_damage_per_side[:,s].reshape(num_reals, 1) * np.array(damage['tenant_units'][tu]['qnt_damaged'])
-                
+
+        # Store the ratio only (shared by all tenant units); damage per side
+        # is scaled from qnt_damaged when needed
+        damage['ratio_damage_per_side'] = ratio_damage_per_side
+
     return damage
 
+def fn_damage_per_side(damage, tu, side, comp_filt=None, qnt_damaged=None):
+    '''Get the quantity of damage on one side of the building for one tenant
+    unit, either as provided by the user or scaled from the simulated ratio of
+    damage per side
+
+    Parameters
+    ----------
+    damage: dictionary
+      contains simulated damage info and damage state attributes
+
+    tu: int
+      tenant unit index
+
+    side: int
+      side index (0 to 3)
+
+    comp_filt: logical array [num comp_ds], optional
+      component damage states to return (e.g. exterior falling hazards).
+      All component damage states are returned if not provided.
+
+    qnt_damaged: array [num reals x num comp_ds], optional
+      damage of the tenant unit (damage['tenant_units'][tu]['qnt_damaged'])
+      already converted to an array, to avoid converting it for each side
+
+    Returns
+    -------
+    qnt_damaged_side: array [num reals x num comp_ds in comp_filt]
+      quantity of damage on this side'''
+
+    tenant_unit = damage['tenant_units'][tu]
+    if ('qnt_damaged_side_' + str(side+1)) in tenant_unit.keys():
+        qnt_damaged_side = np.array(tenant_unit['qnt_damaged_side_' + str(side+1)])
+        if comp_filt is not None:
+            qnt_damaged_side = qnt_damaged_side[:,comp_filt]
+    else:
+        if qnt_damaged is None:
+            qnt_damaged = np.array(tenant_unit['qnt_damaged'])
+        if comp_filt is not None:
+            qnt_damaged = qnt_damaged[:,comp_filt]
+        num_reals = np.size(qnt_damaged, 0)
+        qnt_damaged_side = damage['ratio_damage_per_side'][:,side].reshape(num_reals, 1) * qnt_damaged
+
+    return qnt_damaged_side
+
 def fn_create_fnc_filters(comp_ds_table):
     '''Define function filter arrays that allow rapid sampling of simulated
     damage for use within the fault tree analysis
@@ -236,10 +282,209 @@ def fn_create_fnc_filters(comp_ds_table):
     
     # Horizontal Egress: Fire break partitions
     fnc_filters['fire_break'] = np.logical_and(comp_ds_table['system'] == 3, comp_ds_table['weakens_fire_break'] == 1) # only collect interior fire break partitions
-    
+
     return fnc_filters
 
+def fn_compile_fnc_filters(fnc_filters):
+    '''Compile the function filter arrays into one packed bit matrix, with one
+    bit per filter for each component damage state, and the column index of
+    the component damage states of each filter. Nested filters (e.g. hvac
+    subsystems) are flattened with "/" separated names, such as
+    'hvac/building/hvac_cooling/chiller'.
+
+    Parameters
+    ----------
+    fnc_filters: dictionary
+      output of fn_create_fnc_filters
+
+    Returns
+    -------
+    fnc_filter_bits: dictionary
+      fnc_filter_bits['names']: list of the flattened filter names (bit order)
+      fnc_filter_bits['bits']: uint64 array [num comp_ds x num words]. Bit j
+      of word j // 64 is set where the component damage state is in filter j
+      fnc_filter_bits['idx']: dictionary of int arrays, column index of the
+      component damage states in each filter'''
+
+    # Flatten nested filters
+    names = []
+    masks = []
+    def flatten(filters, prefix):
+        for key in filters.keys():
+            if isinstance(filters[key], dict):
+                flatten(filters[key], prefix + key + '/')
+            else:
+                names.append(prefix + key)
+                masks.append(np.array(filters[key]).astype(bool))
+    flatten(fnc_filters, '')
+
+    # Pack 64 filters per word (distinct powers of two, so the sum is the bitwise or)
+    masks = np.column_stack(masks)
+    num_words = int(np.ceil(len(names) / 64))
+    bits = np.zeros([np.size(masks, 0), num_words], dtype=np.uint64)
+    for w in range(num_words):
+        word_masks = masks[:, w*64:(w+1)*64].astype(np.uint64)
+        bits[:,w] = np.sum(word_masks << np.arange(np.size(word_masks, 1), dtype=np.uint64), axis=1, dtype=np.uint64)
+
+    fnc_filter_bits = {'names': names,
+                       'bits': bits,
+                       'idx': {names[f]: np.flatnonzero(masks[:,f]) for f in range(len(names))}
+                       }
+
+    return fnc_filter_bits
+
+def fn_fnc_filter_mask(fnc_filter_bits, names, combine='any'):
+    '''Combine compiled function filters with a single pass over the packed
+    bit matrix
+
+    Parameters
+    ----------
+    fnc_filter_bits: dictionary
+      output of fn_compile_fnc_filters
+
+    names: string or list of strings
+      flattened names of the filters to combine
+
+    combine: string
+      'any' for the union of the filters or 'all' for their intersection
+
+    Returns
+    -------
+    mask: logical array [num comp_ds]
+      component damage states in the combined filter'''
+
+    import sys
+
+    if isinstance(names, str):
+        names = [names]
+
+    # Word masks of the requested filters
+    word_masks = np.zeros(np.size(fnc_filter_bits['bits'], 1), dtype=np.uint64)
+    for name in names:
+        f = fnc_filter_bits['names'].index(name)
+        word_masks[f // 64] |= np.uint64(1) << np.uint64(f % 64)
+
+    selected_bits = fnc_filter_bits['bits'] & word_masks
+    if combine == 'any':
+        mask = np.any(selected_bits != 0, axis=1)
+    elif combine == 'all':
+        mask = np.all(selected_bits == word_masks, axis=1)
+    else:
+        sys.exit('error! unknown filter combination ' + str(combine))
+
+    return mask
+
+def fn_fnc_filter_idx(fnc_filter_bits, names, combine='any'):
+    '''Column index of the component damage states in one or more compiled
+    function filters
+
+    Parameters
+    ----------
+    fnc_filter_bits: dictionary
+      output of fn_compile_fnc_filters
+
+    names: string or list of strings
+      flattened names of the filters to combine
+
+    combine: string
+      'any' for the union of the filters or 'all' for their intersection
+
+    Returns
+    -------
+    idx: int array
+      column index of the component damage states in the combined filter'''
+
+    if isinstance(names, str):
+        return fnc_filter_bits['idx'][names]
+
+    return np.flatnonzero(fn_fnc_filter_mask(fnc_filter_bits, names, combine))
+
     
+def fn_compile_model_filters(comp_ds_table):
+    '''Compile the recovery filters and component groups of a building model,
+    which only depend on the component damage state attributes
+
+    Parameters
+    ----------
+    comp_ds_table: DataFrame
+      various component attributes by damage state for each component
+
+    Returns
+    -------
+    model_filters: dictionary
+      model_filters['fnc_filters']: output of fn_create_fnc_filters
+      model_filters['fnc_filter_bits']: output of fn_compile_fnc_filters
+      model_filters['comp_groups']: output of fn_create_comp_groups'''
+
+    fnc_filters = fn_create_fnc_filters(comp_ds_table)
+    model_filters = {'fnc_filters': fnc_filters,
+                     'fnc_filter_bits': fn_compile_fnc_filters(fnc_filters),
+                     'comp_groups': fn_create_comp_groups(comp_ds_table['comp_id'])
+                     }
+
+    return model_filters
+
+def fn_create_comp_groups(comp_id):
+    '''Group the component damage states of each component, so per component
+    aggregations can be done as segmented reductions over the damage state
+    columns (see fn_comp_group_reduce)
+
+    Parameters
+    ----------
+    comp_id: array [num comp_ds]
+      fragility id of each component damage state
+
+    Returns
+    -------
+    comp_groups: dictionary
+      comp_groups['comp_names']: array [num comps], unique fragility ids
+      (sorted, same as np.unique)
+      comp_groups['group_idx']: int array [num comp_ds], component of each
+      damage state
+      comp_groups['order']: int array [num comp_ds], damage state columns
+      sorted by component
+      comp_groups['start']: int array [num comps], first column of each
+      component in the sorted order'''
+
+    comp_names, group_idx = np.unique(np.array(comp_id), return_inverse=True)
+    order = np.argsort(group_idx, kind='stable')
+    start = np.searchsorted(group_idx[order], np.arange(len(comp_names)))
+
+    comp_groups = {'comp_names': comp_names,
+                   'group_idx': group_idx,
+                   'order': order,
+                   'start': start
+                   }
+
+    return comp_groups
+
+def fn_comp_group_reduce(values, comp_groups, reduce_fnc):
+    '''Reduce the damage state columns of each component
+
+    Parameters
+    ----------
+    values: array [... x num comp_ds]
+      per component damage state values
+
+    comp_groups: dictionary
+      output of fn_create_comp_groups
+
+    reduce_fnc: numpy ufunc
+      reduction applied to the damage states of each component (e.g.
+      np.maximum, or np.fmax / np.fmin to ignore NaNs)
+
+    Returns
+    -------
+    comp_values: array [... x num comps]
+      reduced values of each component, in the order of
+      comp_groups['comp_names']'''
+
+    values = np.asarray(values)
+    if len(comp_groups['comp_names']) == 0:
+        return np.zeros(np.shape(values)[:-1] + (0,))
+
+    return reduce_fnc.reduceat(values[...,comp_groups['order']], comp_groups['start'], axis=-1)
+
 def fn_simulate_temp_worker_days(damage, temp_repair_class, repair_time_options):
     '''Simulate Temporary Repair Times for each component, if not already
         defined by the user. In a perfect system this should be done alongside 
@@ -285,25 +530,30 @@ def fn_simulate_temp_worker_days(damage, temp_repair_class, repair_time_options)
             total_damaged = total_damaged + np.array(damage['tenant_units'][tu+1]['qnt_damaged'])
     
         # Aggregate the total number of damaged components accross each damage
-        # state in a component
-        num_reals = len(damage['tenant_units'][0]['qnt_damaged']) 
-        tmp_worker_days_per_unit = np.zeros([num_reals, len(damage['comp_ds_table']['comp_id'])])
-        for c in range(len(damage['comp_ds_table']['comp_id'])): # for each comp ds
-            # comp = comp_ds_table(c,:);
-            if damage['comp_ds_table']['tmp_repair_class'][c] > 0: # For damage that has temporary repair
-                filt = np.array(damage['comp_ds_table']['comp_id']) == damage['comp_ds_table']['comp_id'][c]
-                total_damaged_all_ds = np.sum(total_damaged[:,filt], axis=1)
-            
-                if float(damage['comp_ds_table']['tmp_repair_time_lower_qnty'][c]) == float(damage['comp_ds_table']['tmp_repair_time_upper_qnty'][c]):
-                    tmp_worker_days_per_unit[:,c] = damage['comp_ds_table']['tmp_repair_time_lower'][c]
-                else:
-                # Interpolate to get per unit temp repair times
-                    tmp_worker_days_per_unit[:,c] = np.interp(np.minimum(np.maximum(total_damaged_all_ds, float(damage['comp_ds_table']['tmp_repair_time_lower_qnty'][c])), float(damage['comp_ds_table']['tmp_repair_time_upper_qnty'][c])),
-                                np.array([float(damage['comp_ds_table']['tmp_repair_time_lower_qnty'][c]), float(damage['comp_ds_table']['tmp_repair_time_upper_qnty'][c])]),
-                                np.array([damage['comp_ds_table']['tmp_repair_time_lower'][c], damage['comp_ds_table']['tmp_repair_time_upper'][c]]),
-                                )
-            else:
-                tmp_worker_days_per_unit[:,c] = np.nan
+        # state in a component (sum over the damage states of each component,
+        # with the columns grouped by component)
+        comp_ds_table = damage['comp_ds_table']
+        comp_groups, comp_group_idx = np.unique(np.array(comp_ds_table['comp_id']), return_inverse=True)
+        group_order = np.argsort(comp_group_idx, kind='stable')
+        group_start = np.searchsorted(comp_group_idx[group_order], np.arange(len(comp_groups)))
+        total_damaged_per_comp = np.add.reduceat(total_damaged[:,group_order], group_start, axis=1)
+        total_damaged_all_ds = total_damaged_per_comp[:,comp_group_idx]
+        
+        # Interpolate to get per unit temp repair times for each comp ds
+        # (equal lower and upper quantities use the lower repair time)
+        has_tmp_repair = np.array(comp_ds_table['tmp_repair_class'], dtype=float) > 0 # For damage that has temporary repair
+        lower_qnty = np.array(comp_ds_table['tmp_repair_time_lower_qnty'], dtype=float)
+        upper_qnty = np.array(comp_ds_table['tmp_repair_time_upper_qnty'], dtype=float)
+        lower_time = np.array(comp_ds_table['tmp_repair_time_lower'], dtype=float)
+        upper_time = np.array(comp_ds_table['tmp_repair_time_upper'], dtype=float)
+        is_interp = has_tmp_repair & (lower_qnty != upper_qnty)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(is_interp, (upper_time - lower_time) / (upper_qnty - lower_qnty), 0)
+        qnty = np.minimum(np.maximum(total_damaged_all_ds, lower_qnty), upper_qnty)
+        tmp_worker_days_per_unit = np.where(qnty >= upper_qnty, upper_time, slope * (qnty - lower_qnty) + lower_time)
+        tmp_worker_days_per_unit[:, has_tmp_repair & np.logical_not(is_interp)] = lower_time[has_tmp_repair & np.logical_not(is_interp)]
+        tmp_worker_days_per_unit[:, np.logical_not(has_tmp_repair)] = np.nan
 
         '''Simulate uncertainty in per unit temp repair times
         Assumes distribution is lognormal with beta = 0.4
@@ -356,3 +606,45 @@ def fn_define_door_racking(damage_consequences, num_stories):
 
 
 
+
+def fn_set_precision(damage, precision='float64'):
+    '''Store the simulated per realization damage arrays of each tenant unit
+    at the requested floating point precision
+    
+    Parameters
+    ----------
+    damage: dictionary
+      contains simulated damage info and damage state attributes
+    precision: string
+      'float64' (default; damage is left as provided) or 'float32'. Single
+      precision halves the memory of the damage arrays and of the repair
+      schedule and recovery arrays computed from them. Damaged quantities and
+      whole days are exact in single precision (up to 2^24)
+    
+    Returns
+    -------
+    damage: dictionary
+      contains simulated damage info and damage state attributes, and the
+      floating point type of the per realization arrays of the repair
+      schedule and recovery assessment (damage['precision'])'''
+    
+    import sys
+    
+    if precision not in ['float64', 'float32']:
+        sys.exit('error! precision must be "float64" or "float32", not ' + str(precision))
+    
+    if precision == 'float32':
+        per_realization_keys = ['qnt_damaged', 'worker_days', 'tmp_worker_day',
+                                'qnt_damaged_side_1', 'qnt_damaged_side_2', 
+                                'qnt_damaged_side_3', 'qnt_damaged_side_4']
+        for tu in range(len(damage['tenant_units'])):
+            for key in per_realization_keys:
+                if key in damage['tenant_units'][tu].keys():
+                    damage['tenant_units'][tu][key] = np.array(damage['tenant_units'][tu][key], dtype=np.float32)
+                    
+        if 'ratio_damage_per_side' in damage.keys():
+            damage['ratio_damage_per_side'] = np.array(damage['ratio_damage_per_side'], dtype=np.float32)
+    
+    damage['precision'] = precision
+    
+    return damage
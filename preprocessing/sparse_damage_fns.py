@@ -0,0 +1,150 @@
+"""
+Sparse (compressed sparse row) storage of the simulated damage arrays, and
+row reductions over filtered component damage state columns whose cost
+tracks the number of damaged entries rather than num_reals x num_comp_ds
+"""
+import numpy as np
+
+def fn_create_sparse_damage(damage):
+    '''Store the simulated per realization damage arrays of each tenant unit
+    and story as compressed sparse row matrices
+
+    Parameters
+    ----------
+    damage: dictionary
+      contains simulated damage info and damage state attributes
+
+    Returns
+    -------
+    damage: dictionary
+      contains simulated damage info and damage state attributes. The sparse
+      damage is stored in damage['sparse_damage']:
+        ['tenant_units'][tu]['qnt_damaged'], ['worker_days'] and
+        ['tmp_worker_day']: csr matrix [num reals x num comp_ds]
+        ['tenant_units'][tu]['is_damaged_full'] and ['is_damaged_temp']:
+        boolean csr matrix [num reals x num comp_ds], damaged and needs full
+        (or temporary) repair
+        ['story'][s]['qnt_damaged_dir_1'], ['qnt_damaged_dir_2'] and
+        ['qnt_damaged_dir_3']: csr matrix [num reals x num comp_ds]'''
+
+    from scipy import sparse
+
+    sparse_damage = {'tenant_units' : [], 'story' : []}
+    for tu in range(len(damage['tenant_units'])):
+        unit_damage = damage['tenant_units'][tu]
+        qnt_damaged = np.array(unit_damage['qnt_damaged'])
+        sparse_unit = {'qnt_damaged' : sparse.csr_matrix(qnt_damaged)}
+        for repair_time_var, damaged_var in [['worker_days', 'is_damaged_full'], ['tmp_worker_day', 'is_damaged_temp']]:
+            if repair_time_var in unit_damage.keys():
+                repair_time = np.array(unit_damage[repair_time_var])
+                sparse_unit[repair_time_var] = sparse.csr_matrix(repair_time) # NaNs are kept as stored entries
+                sparse_unit[damaged_var] = sparse.csr_matrix(np.logical_and(qnt_damaged > 0, repair_time > 0))
+        sparse_damage['tenant_units'].append(sparse_unit)
+
+    for s in range(len(damage['story'])):
+        sparse_story = {}
+        for direc in [1,2,3]:
+            if 'qnt_damaged_dir_' + str(direc) in damage['story'][s].keys():
+                sparse_story['qnt_damaged_dir_' + str(direc)] = sparse.csr_matrix(np.array(damage['story'][s]['qnt_damaged_dir_' + str(direc)]))
+        sparse_damage['story'].append(sparse_story)
+
+    damage['sparse_damage'] = sparse_damage
+
+    return damage
+
+
+def fn_sparse_row_sum(matrix, col_filt):
+    '''Sum of the filtered columns of each row of a sparse matrix
+
+    Parameters
+    ----------
+    matrix: csr matrix [num reals x num comp_ds]
+      sparse damage array
+
+    col_filt: logical array [num comp_ds]
+      component damage states to sum
+
+    Returns
+    -------
+    row_sum: array [num reals]
+      sum of the filtered columns of each realization'''
+
+    return np.asarray(matrix[:, np.flatnonzero(col_filt)].sum(axis=1)).ravel()
+
+
+def fn_sparse_row_any(matrix, col_filt):
+    '''Check if any filtered column of each row of a sparse matrix is stored
+    (nonzero)
+
+    Parameters
+    ----------
+    matrix: csr matrix [num reals x num comp_ds]
+      sparse damage array (e.g. is_damaged_full)
+
+    col_filt: logical array [num comp_ds]
+      component damage states to check
+
+    Returns
+    -------
+    row_any: logical array [num reals]
+      true where any filtered column of the realization is stored'''
+
+    return matrix[:, np.flatnonzero(col_filt)].getnnz(axis=1) > 0
+
+
+def fn_sparse_row_max(matrix, col_filt, values):
+    '''Largest value at the stored entries of the filtered columns of each row
+    of a sparse matrix
+
+    Parameters
+    ----------
+    matrix: csr matrix [num reals x num comp_ds]
+      sparse damage array (e.g. is_damaged_full)
+
+    col_filt: logical array [num comp_ds]
+      component damage states to check
+
+    values: array [num reals x num comp_ds]
+      values to take the maximum of (e.g. simulated long lead times). NaN
+      values are ignored
+
+    Returns
+    -------
+    row_max: array [num reals]
+      largest value at the stored entries of each realization; zero where
+      no filtered column is stored'''
+
+    col_idx = np.flatnonzero(col_filt)
+    sub_matrix = matrix[:, col_idx].tocoo()
+    row_max = np.zeros(np.size(matrix, 0))
+    np.fmax.at(row_max, sub_matrix.row, np.asarray(values)[sub_matrix.row, col_idx[sub_matrix.col]])
+
+    return row_max
+
+
+def fn_sparse_count_groups(matrix, col_filt, group_idx):
+    '''Count the groups (e.g. component types) with a stored entry in the
+    filtered columns of each row of a sparse matrix
+
+    Parameters
+    ----------
+    matrix: csr matrix [num reals x num comp_ds]
+      sparse damage array (e.g. is_damaged_full)
+
+    col_filt: logical array [num comp_ds]
+      component damage states to check
+
+    group_idx: int array [num comp_ds]
+      group of each component damage state (non-negative)
+
+    Returns
+    -------
+    num_groups: array [num reals]
+      number of distinct groups with a stored entry in each realization'''
+
+    col_idx = np.flatnonzero(col_filt)
+    sub_matrix = matrix[:, col_idx].tocoo()
+    num_group_ids = np.max(group_idx) + 1 if len(group_idx) > 0 else 1
+    row_groups = np.unique(sub_matrix.row.astype(np.int64) * num_group_ids + np.asarray(group_idx)[col_idx[sub_matrix.col]])
+
+    return np.bincount(row_groups // num_group_ids, minlength = np.size(matrix, 0)).astype(float)
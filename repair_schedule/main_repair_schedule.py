@@ -1,6 +1,7 @@
 def main_repair_schedule(damage, building_model, simulated_red_tags, 
                          repair_time_options, systems, tmp_repair_class, 
-                         impeding_factors, simulated_replacement_time):
+                         impeding_factors, simulated_replacement_time, 
+                         output_profile = 'full'):
     
     '''Determine the repair time for a given damage simulation.
       
@@ -24,6 +25,17 @@ def main_repair_schedule(damage, building_model, simulated_red_tags,
     repair_time_options: dictionary
       general repair time options such as mitigation factors
       
+    repair_time_options['discrete_scheduler']: logical (optional)
+      allocate workers among systems with integer day arithmetic
+      (fn_allocate_workers_systems_discrete). Defaults to false. Only
+      available with the numpy worker allocation backend.
+      
+    repair_time_options['worker_allocation_backend']: string (optional)
+      'numpy' (default) or 'numba'. Numba compiles per realization worker
+      allocation kernels; falls back to numpy when numba is not installed.
+      Cannot be combined with the discrete scheduler. The backends agree bit
+      for bit (see fn_validate_worker_kernels).
+      
     systems: DataFrame
       attributes of structural and nonstructural building systems; data 
       provided in static tables directory
@@ -38,13 +50,23 @@ def main_repair_schedule(damage, building_model, simulated_red_tags,
       amplification factor for temporary repair times due to materials and
       labor impacts due to regional damage
       
+    output_profile: string
+      'full' (default), 'standard' or 'summary'. The gantt chart breakdowns
+      are not built for 'summary', and the per system per story breakdowns
+      are not built for 'standard'.
+      
     Returns
     -------
     damage: dictionary
-      contains per damage state damage and loss data for each component in the building
+      contains per damage state damage and loss data for each component in 
+      the building, including the compact temp and full repair schedules in
+      damage['repair_schedule']
     
     worker_data: dictionary
-      simulated building-level worker allocations throught the repair process
+      simulated building-level worker allocations throught the repair process,
+      and worker allocation convergence diagnostics for the full and temp
+      repairs in worker_data['convergence'] (realizations re-run with the 
+      fallback scheduler, see fn_convergence_diagnostics)
     
     building_repair_schedule: dictionary
       simulations of the building repair schedule, broken down by component,
@@ -53,23 +75,37 @@ def main_repair_schedule(damage, building_model, simulated_red_tags,
 
     ## Initial Setup
     # Import Packages
+    import sys
     import math
     import numpy as np
     
     from repair_schedule import other_repair_schedule_functions
+    from repair_schedule import worker_allocation_kernels
     
     ## initial Setup
     # Define the maximum number of workers that can be on site, based on REDI
     max_workers_per_building = min(max(math.floor(sum(building_model['area_per_story_sf'])* repair_time_options['max_workers_per_sqft_building'] + 10), repair_time_options['max_workers_building_min'])
            , repair_time_options['max_workers_building_max'])
 
+    # Use the discrete time (integer day) worker allocation among systems
+    discrete_scheduler = ('discrete_scheduler' in repair_time_options.keys()) and bool(repair_time_options['discrete_scheduler'])
+    
+    # Use the per realization worker allocation kernels (only if numba is
+    # installed, otherwise the numpy allocation is used)
+    allocation_backend = 'numpy'
+    if ('worker_allocation_backend' in repair_time_options.keys()) and repair_time_options['worker_allocation_backend'] == 'numba':
+        if discrete_scheduler:
+            sys.exit('error! the discrete scheduler is only available with the numpy worker allocation backend')
+        if worker_allocation_kernels.NUMBA_AVAILABLE:
+            allocation_backend = 'numba'
+
     def fn_schedule_repairs(damage, repair_type, systems, max_workers_per_building, 
                             max_workers_per_story, impeding_factors, 
                             simulated_red_tags, tmp_repair_complete_day):
         
         ## Step 1 - Calculate the start and finish times for each system in isolation
         # based on REDi repair sequencing and Yoo 2016 worker allocations
-        system_schedule = other_repair_schedule_functions.fn_calc_system_repair_time(damage, repair_type, systems, max_workers_per_building, max_workers_per_story)
+        system_schedule = other_repair_schedule_functions.fn_calc_system_repair_time(damage, repair_type, systems, max_workers_per_building, max_workers_per_story, allocation_backend)
                                   
         ## Step 2 - Set system repair priority
         sys_idx_priority_matrix = other_repair_schedule_functions.fn_prioritize_systems( systems, repair_type, damage, tmp_repair_complete_day, impeding_factors)
@@ -78,15 +114,29 @@ def main_repair_schedule(damage, building_model, simulated_red_tags,
         sys_constraint_matrix= other_repair_schedule_functions.fn_set_repair_constraints( systems, repair_type, simulated_red_tags)
         
         ## Step 4 - Allocate workers among systems and determine the total days until repair is completed for each sequence
-        repair_complete_day_per_system, worker_data = other_repair_schedule_functions.fn_allocate_workers_systems(systems, system_schedule['system_totals']['repair_days'], system_schedule['system_totals']['num_workers'],
-             max_workers_per_building, sys_idx_priority_matrix, sys_constraint_matrix,
-            simulated_red_tags, impeding_factors['time_sys'])
+        if allocation_backend == 'numba':
+            repair_complete_day_per_system, worker_data = worker_allocation_kernels.fn_allocate_workers_systems_numba(systems, system_schedule['system_totals']['repair_days'], system_schedule['system_totals']['num_workers'],
+                 max_workers_per_building, sys_idx_priority_matrix, sys_constraint_matrix,
+                simulated_red_tags, impeding_factors['time_sys'])
+        elif discrete_scheduler:
+            # Integer day event arithmetic (same schedule, smaller arrays)
+            repair_complete_day_per_system, worker_data = other_repair_schedule_functions.fn_allocate_workers_systems_discrete(systems, system_schedule['system_totals']['repair_days'], system_schedule['system_totals']['num_workers'],
+                 max_workers_per_building, sys_idx_priority_matrix, sys_constraint_matrix,
+                simulated_red_tags, impeding_factors['time_sys'])
+        else:
+            repair_complete_day_per_system, worker_data = other_repair_schedule_functions.fn_allocate_workers_systems(systems, system_schedule['system_totals']['repair_days'], system_schedule['system_totals']['num_workers'],
+                 max_workers_per_building, sys_idx_priority_matrix, sys_constraint_matrix,
+                simulated_red_tags, impeding_factors['time_sys'])
                                   
+        # Collect worker allocation convergence diagnostics
+        worker_data['convergence'] = {'systems' : worker_data['convergence'],
+                                      'stories' : [system_schedule['per_system'][syst]['convergence'] for syst in range(len(systems))]}
+        
         ## Step 5 - Format outputs for Functionality calculations
-        damage_recovery = other_repair_schedule_functions.fn_restructure_repair_schedule( damage, system_schedule,
+        repair_schedule = other_repair_schedule_functions.fn_restructure_repair_schedule( damage, system_schedule,
                      repair_complete_day_per_system, systems, repair_type, simulated_red_tags)
         
-        return damage_recovery, worker_data
+        return repair_schedule, worker_data
     
     
     ## Determine repair schedule per system for Temporary Repairs 
@@ -95,22 +145,23 @@ def main_repair_schedule(damage, building_model, simulated_red_tags,
     
     # Temporary Repairs
     repair_type = 'temp'
-    tmp_damage, tmp_worker_data = fn_schedule_repairs(damage, repair_type, 
+    damage['repair_schedule'] = {}
+    damage['repair_schedule']['temp'], tmp_worker_data = fn_schedule_repairs(damage, repair_type, 
                                                       tmp_repair_class, 
                                                       max_workers_per_building, 
                                                       max_workers_per_story,
                                                       impeding_factors['temp_repair'], 
                                                       simulated_red_tags, [])
     
-    tmp_damage = tmp_damage.copy()
     # Calculate the max temp repair complete day for each component (anywhere in building)
     tmp_repair_complete_day = np.empty(np.shape(damage['tenant_units'][0]['tmp_worker_day']))
     tmp_repair_complete_day[:] = np.nan
     # NaN = Never damaged
     # Inf  = Damage not resolved by temp repair
 
-    for tu in range(len(tmp_damage)):
-        tmp_repair_complete_day = np.fmax(tmp_repair_complete_day, tmp_damage[tu]['repair_complete_day'])
+    for tu in range(len(damage['tenant_units'])):
+        tmp_repair_complete_day = np.fmax(tmp_repair_complete_day, 
+                                          other_repair_schedule_functions.fn_component_repair_day(damage, tu, 'repair_complete_day', 'temp'))
     
     ## Determine repair schedule per system for Full Repairs 
     # Define the maximum number of workers that can be on any given story
@@ -118,42 +169,26 @@ def main_repair_schedule(damage, building_model, simulated_red_tags,
        
     # Full Repairs   
     repair_type = 'full'
-    full_damage, worker_data = fn_schedule_repairs(damage, repair_type, systems, 
+    damage['repair_schedule']['full'], worker_data = fn_schedule_repairs(damage, repair_type, systems, 
                                               max_workers_per_building, 
                                               max_workers_per_story, 
                                               impeding_factors, 
                                               simulated_red_tags, 
                                               tmp_repair_complete_day)
 
+    worker_data['convergence'] = {'full' : worker_data['convergence'], 'temp' : tmp_worker_data['convergence']}
 
-    ## Combine temp and full repair schedules
-    for tu in range(len(full_damage)):
-        damage['tenant_units'][tu]['recovery'] = full_damage[tu]
-        # Repair time is the lesser of the full repair and temp repair times
-        damage['tenant_units'][tu]['recovery']['repair_complete_day_w_tmp'] = np.fmin(damage['tenant_units'][tu]['recovery']['repair_complete_day'],
-                                                                                  tmp_damage[tu]['repair_complete_day'])
-        
-        # Temporary Repair Times control if temporary repair times are less than the full repair time
-        tmp_day_controls = tmp_damage[tu]['repair_complete_day'] < damage['tenant_units'][tu]['recovery']['repair_complete_day']
-        # Repair start day is set to the temp repair start day when temp repairs control
-        damage['tenant_units'][tu]['recovery']['repair_start_day_w_tmp'] = damage['tenant_units'][tu]['recovery']['repair_start_day'].copy()
-        damage['tenant_units'][tu]['recovery']['repair_start_day_w_tmp'][tmp_day_controls] = tmp_damage[tu]['repair_start_day'][tmp_day_controls].copy()
-
-
-    
-    temporary_damage = { 'tenant_units': {} }
-    for tu in range(len(full_damage)):
-        temporary_damage['tenant_units'][tu]={}
-        temporary_damage['tenant_units'][tu]['recovery'] = tmp_damage[tu]
-    
-    temporary_damage['comp_ds_table'] = damage['comp_ds_table'].copy()
+    # Per component repair days of the full and temp repair schedules (and 
+    # their combination) are gathered from damage['repair_schedule'] when
+    # needed using other_repair_schedule_functions.fn_component_repair_day
     
     ## Format Outputs 
     # Format Start and Stop Time Data for Gantt Chart plots 
     # This is also the main data structure used for calculating full repair time outputs
     building_repair_schedule = {}
-    building_repair_schedule['full'] = other_repair_schedule_functions.fn_format_gantt_chart_data(damage, systems, simulated_replacement_time)
-    building_repair_schedule['temp'] = other_repair_schedule_functions.fn_format_gantt_chart_data(temporary_damage, systems, simulated_replacement_time)
+    if output_profile != 'summary':
+        building_repair_schedule['full'] = other_repair_schedule_functions.fn_format_gantt_chart_data(damage, systems, simulated_replacement_time, 'full', output_profile)
+        building_repair_schedule['temp'] = other_repair_schedule_functions.fn_format_gantt_chart_data(damage, systems, simulated_replacement_time, 'temp', output_profile)
  
     return damage, worker_data, building_repair_schedule
     
@@ -6,7 +6,7 @@ import numpy as np
 
 def fn_allocate_workers_stories(total_worker_days, required_workers_per_story, 
                                 average_crew_size, max_crews_building, 
-                                max_workers_per_building):
+                                max_workers_per_building, force_progress = False):
 
     '''For a given building system, allocate crews to each story to
     determine the system level repair time on each story; not considering
@@ -31,6 +31,11 @@ def fn_allocate_workers_stories(total_worker_days, required_workers_per_story,
     max_workers_per_building: int
       maximum number of workers allowed in the buildings at a given time
       
+    force_progress: logical
+      fallback scheduler: when no crew can be assigned in a realization, let
+      one crew (limited by the building worker limit) start on the first story
+      that needs repair. Used to re-run non-converged realizations.
+      
     Returns
     -------
     repair_start_day: array [num reals x num stories]
@@ -44,9 +49,17 @@ def fn_allocate_workers_stories(total_worker_days, required_workers_per_story,
     max_workers_per_story: array [num reals x num stories]
       number of workers required for the repair of this story and system as
       
+    convergence: dictionary
+      worker allocation diagnostics (see fn_convergence_diagnostics)
+      
     Notes
-    -----'''
-    import sys
+    -----
+    Every increment that assigns workers completes at least one story, so a
+    realization converges within num stories increments. Realizations where no 
+    workers can be assigned (e.g. crew size larger than the building worker 
+    limit) or that exceed the iteration budget are isolated and re-run one at
+    a time with the fallback scheduler instead of stopping the analysis.
+    Stories that are still not repaired are given a complete day of inf.'''
     
     ## Initial Setup
     num_reals, num_stories = np.shape(total_worker_days)
@@ -55,14 +68,25 @@ def fn_allocate_workers_stories(total_worker_days, required_workers_per_story,
     repair_start_day[:] = np.nan
     max_workers_per_story = np.zeros([num_reals,num_stories])
     
+    # Keep inputs for re-running non-converged realizations
+    input_worker_days = np.array(total_worker_days, dtype=float).copy()
+    input_required_workers = np.array(required_workers_per_story, dtype=float).copy()
+    
+    # Iteration budget: twice the increments any converging realization needs
+    iteration_budget = 2 * num_stories + 10
+    is_isolated = np.zeros(num_reals, dtype=bool)
+    
     ## Allocate workers to each story
     # Loop through iterations of time reduce damage on each story based on assigned workers
     iter = 0;
     while sum(sum(total_worker_days)) > 0.01:
         iter = iter + 1; 
-        if iter > 1000: # keep the while loop pandemic contained
-            # error('PBEE_Recovery:RepairSchedule', 'Could not converge worker allocations for among stories in sequence');
-            sys.exit('Error! could not converge worker allocations for among stories in sequence')
+        if iter > iteration_budget: # keep the while loop pandemic contained
+            # Isolate the realizations that did not converge within the budget
+            over_budget = np.any(total_worker_days > 0, axis=1)
+            is_isolated[over_budget] = True
+            total_worker_days[over_budget,:] = 0
+            break
     
         # Determine the available workers in the building
         available_workers_in_building = max_workers_per_building * np.ones([num_reals])
@@ -94,6 +118,12 @@ def fn_allocate_workers_stories(total_worker_days, required_workers_per_story,
             # Define Available Workers
             available_workers_in_building = available_workers_in_building - assigned_workers_per_story[:,s]  
         
+        # Fallback scheduler: start one crew on the first story needing repair 
+        # when no workers could be assigned
+        if force_progress:
+            is_stalled = np.logical_not(np.any(assigned_workers_per_story > 0, axis=1)) & np.any(needs_repair, axis=1)
+            first_story = np.argmax(needs_repair, axis=1)
+            assigned_workers_per_story[is_stalled, first_story[is_stalled]] = np.fmin(np.fmax(required_workers_per_story[is_stalled, first_story[is_stalled]], 1), max_workers_per_building)
         
         # Define the start of repairs for each story
         start_repair_filt = np.isnan(repair_start_day) & (assigned_workers_per_story > 0)
@@ -109,6 +139,12 @@ def fn_allocate_workers_stories(total_worker_days, required_workers_per_story,
         total_repair_days[in_progress] = total_worker_days[in_progress] / assigned_workers_per_story[in_progress]
         delta_days = np.amin(total_repair_days,axis=1) # time increment is whatever in-progress story that finishes first 
         delta_days[np.isinf(delta_days)] = 0 # Replace infs from real that has no repair with zero       
+        
+        # Isolate realizations where no workers can be assigned (would never converge)
+        is_stalled = (delta_days == 0) & np.any(total_worker_days > 0, axis=1)
+        is_isolated[is_stalled] = True
+        total_worker_days[is_stalled,:] = 0
+        
         delta_worker_days = np.transpose(np.multiply(np.transpose(assigned_workers_per_story), delta_days)) # time increment is whatever in-progress story that finishes first #FZ# transpose done fto align the arrays for operation
         total_worker_days[in_progress] = np.maximum(total_worker_days[in_progress] - delta_worker_days[in_progress], 0)
         indx_neg_remaining = total_worker_days < 0.001 # find instances of remaining time that are excessively small and don't represent realistic amount of work
@@ -120,10 +156,99 @@ def fn_allocate_workers_stories(total_worker_days, required_workers_per_story,
         # Max Crew Size for use in later function
         max_workers_per_story = np.maximum(max_workers_per_story , assigned_workers_per_story)
     
-    return repair_start_day, repair_complete_day, max_workers_per_story
+    ## Re-run non-converged realizations
+    non_converged_reals = np.where(is_isolated)[0]
+    if force_progress:
+        # Already the fallback, stories never repaired are not resolved
+        repair_complete_day[non_converged_reals,:] = np.where(input_worker_days[non_converged_reals,:] > 0, np.inf, repair_complete_day[non_converged_reals,:])
+        unresolved_reals = non_converged_reals
+    else:
+        repair_start_day, repair_complete_day, max_workers_per_story, unresolved_reals = fn_rerun_non_converged_stories(
+            non_converged_reals, repair_start_day, repair_complete_day, max_workers_per_story,
+            input_worker_days, input_required_workers, average_crew_size, max_crews_building, max_workers_per_building)
+    
+    convergence = fn_convergence_diagnostics(iteration_budget, iter, non_converged_reals, unresolved_reals)
+    
+    return repair_start_day, repair_complete_day, max_workers_per_story, convergence
+
+
+def fn_rerun_non_converged_stories(non_converged_reals, repair_start_day, 
+                                   repair_complete_day, max_workers_per_story, 
+                                   total_worker_days, required_workers_per_story, 
+                                   average_crew_size, max_crews_building, 
+                                   max_workers_per_building):
+    '''Re-run the allocation of workers to stories one realization at a time
+    with the fallback scheduler, for realizations that did not converge
+    
+    Parameters
+    ----------
+    non_converged_reals: int array
+      realizations to re-run
+      
+    repair_start_day, repair_complete_day, max_workers_per_story: arrays [num reals x num stories]
+      outputs of fn_allocate_workers_stories to update
+      
+    total_worker_days, required_workers_per_story, average_crew_size, 
+    max_crews_building, max_workers_per_building: 
+      inputs of fn_allocate_workers_stories (before allocation)
+      
+    Returns
+    -------
+    repair_start_day, repair_complete_day, max_workers_per_story: arrays [num reals x num stories]
+      updated for the re-run realizations
+      
+    unresolved_reals: int array
+      realizations the fallback scheduler could not resolve'''
+    
+    unresolved_reals = []
+    for r in non_converged_reals:
+        start_r, complete_r, workers_r, convergence_r = fn_allocate_workers_stories(
+            np.array(total_worker_days)[[r],:].copy(), np.array(required_workers_per_story)[[r],:].copy(),
+            np.array(average_crew_size)[[r],:], np.array(max_crews_building).reshape(-1)[[r]], 
+            max_workers_per_building, force_progress = True)
+        repair_start_day[r,:] = start_r[0,:]
+        repair_complete_day[r,:] = complete_r[0,:]
+        max_workers_per_story[r,:] = workers_r[0,:]
+        if len(convergence_r['unresolved_reals']) > 0:
+            unresolved_reals.append(r)
+    
+    return repair_start_day, repair_complete_day, max_workers_per_story, np.array(unresolved_reals, dtype=int)
+
+
+def fn_convergence_diagnostics(iteration_budget, num_iterations, non_converged_reals, unresolved_reals):
+    '''Collect worker allocation convergence diagnostics (as plain python
+    types so they can be written to the json outputs)
+    
+    Parameters
+    ----------
+    iteration_budget: int
+      maximum number of increments of the allocation loop
+      
+    num_iterations: int
+      number of increments of the allocation loop
+      
+    non_converged_reals: int array
+      realizations that stalled or exceeded the iteration budget and were
+      re-run with the fallback scheduler
+      
+    unresolved_reals: int array
+      realizations the fallback scheduler could not resolve
+      
+    Returns
+    -------
+    convergence: dictionary
+      diagnostics with the same fields'''
+    
+    convergence = {'iteration_budget' : int(iteration_budget),
+                   'num_iterations' : int(num_iterations),
+                   'non_converged_reals' : [int(r) for r in non_converged_reals],
+                   'unresolved_reals' : [int(r) for r in unresolved_reals]}
+    
+    return convergence
     
 
-def fn_calc_system_repair_time(damage, repair_type, systems, max_workers_per_building, max_workers_per_story):
+def fn_calc_system_repair_time(damage, repair_type, systems, max_workers_per_building, max_workers_per_story,
+                               allocation_backend = 'numpy'):
     ''' From Dustin's work
     Determine the repair time for each system if repaired in isolation 
       
@@ -143,6 +268,10 @@ def fn_calc_system_repair_time(damage, repair_type, systems, max_workers_per_bui
          
        max_workers_per_story: array [1 x num_stories]
          maximum number of workers allowed in each story at once
+         
+       allocation_backend: string
+         'numpy' (default) or 'numba' to allocate workers to each story with
+         the per realization kernel in worker_allocation_kernels
       
        Returns
        -------
@@ -159,6 +288,10 @@ def fn_calc_system_repair_time(damage, repair_type, systems, max_workers_per_bui
        schedule['per_system'][sys]['max_num_workers_per_story'] [num reals x num stories]
          The number of workers required to repair each story of this system
          
+       schedule['per_system'][sys]['convergence'] dictionary
+         worker allocation diagnostics for this system (see 
+         fn_convergence_diagnostics)
+         
        schedule['system_totals']['repair_days'] [num reals x num systems]
          The number of days required to repair each system in isolation
          
@@ -203,7 +336,34 @@ def fn_calc_system_repair_time(damage, repair_type, systems, max_workers_per_bui
         num_damaged_units = np.zeros([num_reals,num_stories])
         average_crew_size = np.zeros([num_reals,num_stories])
         
+        comp_idx = np.array(damage['comp_ds_table']['comp_idx'])
+        comp_type_filt = np.isin(comp_idx, comp_types) # all damage states of the component types in this system
+        if 'sparse_damage' in damage.keys():
+            is_damaged_building = sparse.csr_matrix((num_reals,num_comps), dtype=bool)
+        
         for s in range(num_stories):
+            if 'sparse_damage' in damage.keys():
+                # Same properties, reduced over the stored damaged entries only
+                sparse_unit = damage['sparse_damage']['tenant_units'][s]
+                is_damaged = sparse_unit['is_damaged_' + repair_type]
+                is_damaged_building = is_damaged_building.maximum(is_damaged)
+                num_damaged_units[:,s] = sparse_damage_fns.fn_sparse_row_sum(sparse_unit['qnt_damaged'], sequence_filt)
+                num_damaged_comp_types[:,s] = sparse_damage_fns.fn_sparse_count_groups(is_damaged, comp_type_filt, comp_idx)
+                total_worker_days[:,s] = sparse_damage_fns.fn_sparse_row_sum(sparse_unit[repair_time_var], sequence_filt)
+                
+                # Repair time per component over the stored entries; columns 
+                # without a crew size are divided densely (0/0 is NaN)
+                seq_idx = np.flatnonzero(sequence_filt)
+                crew_size = np.array(damage['comp_ds_table'][crew_size_var], dtype=float)[seq_idx]
+                has_crew = crew_size > 0
+                seq_repair_time = sparse_unit[repair_time_var][:, seq_idx[has_crew]].tocsr()
+                seq_repair_time.data = seq_repair_time.data / crew_size[has_crew][seq_repair_time.indices]
+                sum_repair_time_per_comp = np.asarray(seq_repair_time.sum(axis=1)).ravel()
+                if np.any(np.logical_not(has_crew)):
+                    sum_repair_time_per_comp = sum_repair_time_per_comp + np.sum(sparse_unit[repair_time_var][:, seq_idx[np.logical_not(has_crew)]].toarray() / crew_size[np.logical_not(has_crew)], axis=1)
+                average_crew_size[:,s] = total_worker_days[:,s] / sum_repair_time_per_comp
+                continue
+            
             # Define damage properties of this system at this story
             num_damaged_units[:,s] = np.sum((1*sequence_filt) * damage['tenant_units'][s]['qnt_damaged'], axis=1) #FZ# Total number of damaged components of one system in one story
             is_damaged = np.logical_and(np.array(damage['tenant_units'][s]['qnt_damaged']) > 0, np.array(damage['tenant_units'][s][repair_time_var]) > 0) #FZ# No
@@ -245,15 +405,22 @@ def fn_calc_system_repair_time(damage, repair_type, systems, max_workers_per_bui
         num_workers = average_crew_size* num_crews
         
         # Repeat calc of number of uniquely damaged component types for the whole building
-        num_damaged_comp_types = np.zeros([num_reals])
-        
-        for c in range(len(comp_types)):
-            num_damaged_comp_types = num_damaged_comp_types + np.any( (1* np.array(damage['comp_ds_table']['comp_idx']) == comp_types[c]) * (1*is_damaged_building), axis=1)                                                
+        if 'sparse_damage' in damage.keys():
+            num_damaged_comp_types = sparse_damage_fns.fn_sparse_count_groups(is_damaged_building, comp_type_filt, comp_idx)
+        else:
+            num_damaged_comp_types = np.zeros([num_reals])
+            
+            for c in range(len(comp_types)):
+                num_damaged_comp_types = num_damaged_comp_types + np.any( (1* np.array(damage['comp_ds_table']['comp_idx']) == comp_types[c]) * (1*is_damaged_building), axis=1)                                                
                                                                    
         max_crews_building = max_crews_per_comp_type * num_damaged_comp_types
             
         return total_worker_days, num_workers, average_crew_size, max_crews_building
     
+    from scipy import sparse
+    from repair_schedule import worker_allocation_kernels
+    from preprocessing import sparse_damage_fns
+    
     # General Variable
     num_reals = len(damage['tenant_units'][0]['worker_days'])
     schedule = {'system_totals' : {'repair_days' : np.zeros([num_reals,len(systems)])}}
@@ -276,14 +443,19 @@ def fn_calc_system_repair_time(damage, repair_type, systems, max_workers_per_bui
         # Allocate workers to each story and determine the total days until
         # repair is complete for each story and sequence
 
-        # other_repair_schedule_functions.
-        AA,BB,CC = fn_allocate_workers_stories(total_worker_days, num_workers, 
-                                      average_crew_size, max_crews_building, 
-                                      max_workers_per_building)
+        if allocation_backend == 'numba':
+            AA,BB,CC,DD = worker_allocation_kernels.fn_allocate_workers_stories_numba(total_worker_days, num_workers, 
+                                          average_crew_size, max_crews_building, 
+                                          max_workers_per_building)
+        else:
+            AA,BB,CC,DD = fn_allocate_workers_stories(total_worker_days, num_workers, 
+                                          average_crew_size, max_crews_building, 
+                                          max_workers_per_building)
 
         schedule['per_system'][syst]['repair_start_day']=AA
         schedule['per_system'][syst]['repair_complete_day']=BB
         schedule['per_system'][syst]['max_num_workers_per_story']=CC
+        schedule['per_system'][syst]['convergence']=DD
     
         # How many days does it take to complete each system in isloation
         schedule['system_totals']['repair_days'][:,syst] = np.amax(schedule['per_system'][syst]['repair_complete_day'], axis=1)
@@ -331,6 +503,7 @@ def fn_prioritize_systems( systems, repair_type, damage, tmp_repair_complete_day
     coupled with the function assessment'''
     
     import sys
+    from repair_schedule import system_priority_functions
     
     ## Initial Setup
     # Define Repair Type Variables (variable within the damage object)
@@ -349,30 +522,41 @@ def fn_prioritize_systems( systems, repair_type, damage, tmp_repair_complete_day
     # Find which components potentially affect reoccupancy accross any tenant unit
     affects_reoccupancy = np.zeros([num_reals, len(damage['comp_ds_table']['comp_id'])], dtype=bool)
     for s in range(len(damage['tenant_units'])):
-        affects_reoccupancy = np.logical_or(affects_reoccupancy, np.logical_and(damage['fnc_filters']['affects_reoccupancy'], np.array(damage['tenant_units'][s]['qnt_damaged']) > 0))
+        affects_reoccupancy = np.logical_or(affects_reoccupancy, np.logical_and(damage['fnc_filters']['affects_reoccupancy'], np.asarray(damage['tenant_units'][s]['qnt_damaged']) > 0))
 
     
     # Find which components potentially affect function accross any tenant unit 
     for s in range(len(damage['tenant_units'])):
         # affects_function = zeros(num_reals, len(damagecomp_ds_table));
         affects_function = np.zeros([num_reals, len(damage['comp_ds_table']['comp_id'])], dtype=bool)
-        affects_function = np.logical_or(affects_function, np.logical_and(damage['fnc_filters']['affects_function'], np.array(damage['tenant_units'][s]['qnt_damaged']) > 0))
+        affects_function = np.logical_or(affects_function, np.logical_and(damage['fnc_filters']['affects_function'], np.asarray(damage['tenant_units'][s]['qnt_damaged']) > 0))
 
        
     ## Define ranks for each system 
-    sys_affects_reoccupancy = np.zeros([num_reals, num_sys]) # only prioritize the systems that potentially affect reoccupancy
-    sys_affects_function = np.zeros([num_reals, num_sys]) # only prioritize the systems that potentially affect function
-    sys_tmp_repaired = np.zeros([num_reals, num_sys]) # dont prioitize the systems that are completely resolved by temporary repairs
+    # Component damage states in each system
+    comp_sys = np.array(damage['comp_ds_table'][system_var])
+    comp_sys_filt = comp_sys.reshape(len(comp_sys),1) == np.arange(1, num_sys+1).reshape(1,num_sys) #FZ# +1 done to account for python indexing starting from 0
+    sys_present = np.any(comp_sys_filt, axis=0) # Only if this system is present
+    
+    sys_affects_reoccupancy = system_priority_functions.fn_any_per_system(affects_reoccupancy, comp_sys_filt) # only prioritize the systems that potentially affect reoccupancy
+    sys_affects_function = system_priority_functions.fn_any_per_system(affects_function, comp_sys_filt) # only prioritize the systems that potentially affect function
+    sys_tmp_repaired = np.zeros([num_reals, num_sys], dtype=bool) # dont prioitize the systems that are completely resolved by temporary repairs
+    
+    if np.size(tmp_repair_complete_day) > 0: # Only if temp repair data is passed in
+        # is every single damaged component resolved by temp repairs
+        all_sys_tmp_repaired = system_priority_functions.fn_all_per_system(np.logical_or(tmp_repair_complete_day < np.inf, np.isnan(tmp_repair_complete_day)), comp_sys_filt)
+        
+        # Are the temp repairs for each system resolved before impeding factors
+        # are complete
+        sys_tmp_complete_day = system_priority_functions.fn_max_per_system(tmp_repair_complete_day, comp_sys_filt)
+        tmp_repair_quick = sys_tmp_complete_day < impeding_factors['time_sys'][:,0:num_sys]
+        
+        sys_tmp_repaired = np.logical_and(all_sys_tmp_repaired, tmp_repair_quick) # damage is quickly resolved by temp repair
     
-    for syst in range(num_sys):
-        sys_filter = damage['comp_ds_table'][system_var] == syst+1 #FZ# +1 done to account for python indexing starting from 0
-        if any(sys_filter): # Only if this system is present
-            sys_affects_reoccupancy[:,syst] = np.any(affects_reoccupancy[:,sys_filter], axis = 1); # any damage that potentially affects function in this system    
-            sys_affects_function[:,syst] = np.any(affects_function[:,sys_filter], axis = 1); # any damage that potentially affects function in this system
-            if tmp_repair_complete_day != []: # Only if temp repair data is passed in
-                all_sys_tmp_repaired = np.all(np.logical_or(tmp_repair_complete_day[:,sys_filter] < np.inf, np.isnan(tmp_repair_complete_day[:,sys_filter])), axis=1) # is every single damaged component resolved by temp repairs
-                tmp_repair_quick = np.nanmax(tmp_repair_complete_day[:,sys_filter], axis=1) < impeding_factors['time_sys'][:,syst] # Are the temp repairs for this system resolved before impeding factors are complete
-                sys_tmp_repaired[:,syst] = np.logical_and(all_sys_tmp_repaired, tmp_repair_quick) # damage is quickly resolved by temp repair
+    # Systems that are not present are not prioritized
+    sys_affects_reoccupancy = 1 * (sys_affects_reoccupancy & sys_present)
+    sys_affects_function = 1 * (sys_affects_function & sys_present)
+    sys_tmp_repaired = 1 * (sys_tmp_repaired & sys_present)
 
     prioritize_system_reoccupancy = np.logical_and(sys_affects_reoccupancy == 1, sys_tmp_repaired == 0)
     prioritize_system_function_only = np.logical_and(sys_affects_function == 1, np.logical_and(prioritize_system_reoccupancy, sys_tmp_repaired == 0))
@@ -441,9 +625,9 @@ def fn_set_repair_constraints(systems, repair_type, conditionTag):
         
         # Red Tag Constraints
         # All systems blocked by structural when red tagged
-        for rt in np.where(conditionTag)[0]:
-            for st in np.where(np.array(systems['name']) != 'structural')[0]:
-                sys_constraint_matrix[rt, st] = structure_idx+1
+        red_tag_reals = np.where(conditionTag)[0]
+        non_structure_idx = np.where(np.array(systems['name']) != 'structural')[0]
+        sys_constraint_matrix[np.ix_(red_tag_reals, non_structure_idx)] = structure_idx+1
     
     elif repair_type == 'temp':
         shoring_id = 5
@@ -463,7 +647,8 @@ def fn_allocate_workers_systems(systems, sys_repair_days, sys_crew_size,
                                 sys_idx_priority_matrix, 
                                 sys_constraint_matrix, 
                                 condition_tag, 
-                                sys_impeding_factors):
+                                sys_impeding_factors,
+                                force_progress = False):
 
 
     '''Stager repair to each system and allocate workers based on the repair
@@ -498,6 +683,13 @@ def fn_allocate_workers_systems(systems, sys_repair_days, sys_crew_size,
     sys_impeding_factors: array [num_reals x num_sys]
      maximum impedance time (days) for each system. Pass in empty array when
      calculating repair times (i.e. not including impeding factors).
+     
+    force_progress: logical
+     fallback scheduler: when nothing can be worked on or waited for in a 
+     realization, assign one crew (limited by the building worker limit) to 
+     the highest priority incomplete system, ignoring repair constraints if
+     every incomplete system is blocked. Used to re-run non-converged 
+     realizations.
     
     Returns
     -------
@@ -515,36 +707,19 @@ def fn_allocate_workers_systems(systems, sys_repair_days, sys_crew_size,
      Day of each time step of the worker allocation algorthim. The number of 
      columns varies with the number of increments of the worker allocation algorithm.
     
-    Notes
-    -----'''
+    worker_data['convergence']: dictionary
+     worker allocation diagnostics (see fn_convergence_diagnostics)
     
-    import sys
+    Notes
+    -----
+    Every increment either completes a system or ends the wait for impeding
+    factors of a system, so a realization converges within 2 x num systems 
+    increments. Realizations where nothing can progress (e.g. crew size larger
+    than the building worker limit) or that exceed the iteration budget are 
+    isolated and re-run one at a time with the fallback scheduler instead of
+    stopping the analysis.'''
     
-    def fitler_matrix_by_rows( values, filter_by):
-    # Use a identiry matrix to filter values from another matrix by rows
-    
-        '''Parameters
-        ----------
-        values: matrix [n x m]
-          values to filter by row
-        filter: matrix [n x m]
-          array indexes to grab from each row of values
-        
-        Returns
-        -------
-        filtered_values: matrix [n x m]
-          values filtered by rows'''
-        
-        # Method
-        x2t = np.transpose(values)
-        idx1 = np.transpose(filter_by)
-        y4 = np.zeros(np.shape(idx1))
-        for r in range(np.size(values,0)):
-            y4[:, r] = x2t[idx1[:, r], r]
-        filtered_values = np.transpose(y4)
- 
-        return filtered_values
-
+    from repair_schedule import system_priority_functions
     
     ## Initial Setup
     # Initialize Variables
@@ -554,29 +729,38 @@ def fn_allocate_workers_systems(systems, sys_repair_days, sys_crew_size,
     total_workers = np.zeros([num_reals,0])
     
     # Re-order system variables based on priority
-    priority_sys_workers_matrix = fitler_matrix_by_rows(sys_crew_size, sys_idx_priority_matrix)
-    priority_sys_constraint_matrix = fitler_matrix_by_rows(sys_constraint_matrix, sys_idx_priority_matrix)
-    priority_sys_repair_days = fitler_matrix_by_rows(sys_repair_days, sys_idx_priority_matrix)
+    priority_sys_workers_matrix = system_priority_functions.fn_reorder_by_priority(sys_crew_size, sys_idx_priority_matrix).astype(float)
+    priority_sys_constraint_matrix = system_priority_functions.fn_reorder_by_priority(sys_constraint_matrix, sys_idx_priority_matrix)
+    priority_sys_repair_days = system_priority_functions.fn_reorder_by_priority(sys_repair_days, sys_idx_priority_matrix).astype(float)
     if sys_impeding_factors.size == 0:
         priority_sys_impeding_factors = np.zeros([num_reals, num_sys])
     else:
-        priority_sys_impeding_factors = fitler_matrix_by_rows(sys_impeding_factors, sys_idx_priority_matrix)
+        priority_sys_impeding_factors = system_priority_functions.fn_reorder_by_priority(sys_impeding_factors, sys_idx_priority_matrix).astype(float)
 
     
+    # Location of the system constraining each system
+    constraining_sys_position = system_priority_functions.fn_constraining_system_position(sys_idx_priority_matrix, priority_sys_constraint_matrix)
+    
     # Round up days to the nearest day
     # Provides an implicit change of trade delay, as well as help to reduce the
     # number of delta increments in the following while loop
     priority_sys_repair_days = np.ceil(priority_sys_repair_days)
     priority_sys_impeding_factors = np.ceil(priority_sys_impeding_factors) #FZ# Already rounded. Check requirement
     
+    # Iteration budget: twice the increments any converging realization needs
+    iteration_budget = 4 * num_sys + 10
+    is_isolated = np.zeros(num_reals, dtype=bool)
+    
     ## Assign workers to each system based on repair constraints
     iter = 0
     current_day = np.zeros(num_reals)
     priority_sys_waiting_days = priority_sys_impeding_factors.copy()
     while sum(sum(priority_sys_repair_days)) > 0.01:
         iter = iter + 1; 
-        if iter > 1000: # keep the while loop pandemic contained
-            sys.exit('error (PBEE_Recovery:RepairSchedule, Could not converge worker allocations for among systems')
+        if iter > iteration_budget: # keep the while loop pandemic contained
+            # Isolate the realizations that did not converge within the budget
+            is_isolated[np.any(priority_sys_repair_days > 0, axis=1)] = True
+            break
 
         
         # zero out assigned workers matrix
@@ -590,13 +774,9 @@ def fn_allocate_workers_systems(systems, sys_repair_days, sys_crew_size,
         available_workers = max_workers_per_building * np.ones(num_reals)
         
         # Define what systems are waiting to begin repairs
-        sys_blocked = np.zeros([num_reals,num_sys]).astype(bool)
+        # System is constrained if blocked by an incomplete system
         sys_incomplete = priority_sys_repair_days > 0
-        for s in range(num_sys): # Loop over each system that may constrain something
-            constrained_systems = priority_sys_constraint_matrix == s+1 # These systems are constrained by looped system #FZ# s+1 is done to correlate with +1 done in deriving constraint matrix
-            constraining_sys_filt = sys_idx_priority_matrix == s; # location in matrix of this system
-            is_constraining_sys_incomplete = np.amax(sys_incomplete * constraining_sys_filt, axis=1) # Vec of relizations for looped system
-            sys_blocked = sys_blocked | np.transpose(np.transpose(constrained_systems) * is_constraining_sys_incomplete) # System is constrained if blocked by an incomplete system. #FZ# transpose done to align arrays for the operation
+        sys_blocked = system_priority_functions.fn_constraining_system_status(sys_incomplete, constraining_sys_position)
         
         # Need to wait for impeding factors or other repairs to finish
         is_waiting = np.transpose(current_day < np.transpose(priority_sys_impeding_factors)) | sys_blocked # assuming impeding factors are the only constraints. #FZ# transpose done to align arrays for the operation
@@ -624,6 +804,15 @@ def fn_allocate_workers_systems(systems, sys_repair_days, sys_crew_size,
             # when not in series, calc the remaining workers
             available_workers[np.logical_not(in_series)] = available_workers[np.logical_not(in_series)] - assigned_workers[np.logical_not(in_series),s]
 
+        # Fallback scheduler: when nothing is being repaired or waited on, start 
+        # one crew on the highest priority system that needs repair (or that is
+        # incomplete, if every incomplete system is blocked)
+        if force_progress:
+            is_stalled = np.any(sys_incomplete, axis=1) & np.logical_not(np.any(assigned_workers > 0, axis=1)) & np.logical_not(np.any(priority_sys_waiting_days > 0, axis=1))
+            can_start = np.where(np.any(needs_repair, axis=1).reshape(num_reals,1), needs_repair, sys_incomplete)
+            first_sys = np.argmax(can_start, axis=1)
+            assigned_workers[is_stalled, first_sys[is_stalled]] = np.fmin(np.fmax(priority_sys_workers_matrix[is_stalled, first_sys[is_stalled]], 1), max_workers_per_building)
+            needs_repair[is_stalled, first_sys[is_stalled]] = True
         
         # Calculate the time associated with this increment of the while loop
         in_progress = assigned_workers > 0 # sequences where work is being done
@@ -637,6 +826,11 @@ def fn_allocate_workers_systems(systems, sys_repair_days, sys_crew_size,
         total_time = np.fmin(total_repair_days,total_waiting_days) # combime repair time and waiting time
         delta_days = np.amin(total_time,axis=1) # time increment is whatever in-progress story that finishes first
         delta_days[np.isinf(delta_days)] = 0 # Replace infs from real that has no repair with zero
+        
+        # Isolate realizations where nothing can progress (would never converge)
+        is_stalled = (delta_days == 0) & np.any(priority_sys_repair_days > 0, axis=1)
+        is_isolated[is_stalled] = True
+        priority_sys_repair_days[is_stalled,:] = 0
                  
         # Reduce waiting time
         priority_sys_waiting_days = np.maximum(np.transpose(np.transpose(priority_sys_waiting_days) - delta_days), 0) #FZ# transpose done to align arrays for the operation
@@ -659,23 +853,303 @@ def fn_allocate_workers_systems(systems, sys_repair_days, sys_crew_size,
 
         
     # Untangle system_complete_day back into system table order
+    repair_complete_day_per_system = system_priority_functions.fn_restore_system_order(priority_system_complete_day, sys_idx_priority_matrix)
+    
+    # Save worker data matrices
+    worker_data ={'total_workers' : total_workers, 'day_vector' : day_vector}
+    
+    ## Re-run non-converged realizations
+    non_converged_reals = np.where(is_isolated)[0]
+    if force_progress:
+        # Already the fallback, systems never repaired are not resolved
+        repair_complete_day_per_system[non_converged_reals,:] = np.inf
+        unresolved_reals = non_converged_reals
+    else:
+        repair_complete_day_per_system, worker_data, unresolved_reals = fn_rerun_non_converged_systems(
+            non_converged_reals, repair_complete_day_per_system, worker_data, systems, sys_repair_days, 
+            sys_crew_size, max_workers_per_building, sys_idx_priority_matrix, 
+            sys_constraint_matrix, condition_tag, sys_impeding_factors)
+    
+    worker_data['convergence'] = fn_convergence_diagnostics(iteration_budget, iter, non_converged_reals, unresolved_reals)
+
+    return repair_complete_day_per_system, worker_data
+
+
+def fn_rerun_non_converged_systems(non_converged_reals, repair_complete_day_per_system, 
+                                   worker_data, systems, sys_repair_days, sys_crew_size, 
+                                   max_workers_per_building, sys_idx_priority_matrix, 
+                                   sys_constraint_matrix, condition_tag, 
+                                   sys_impeding_factors):
+    '''Re-run the allocation of workers to systems one realization at a time
+    with the fallback scheduler, for realizations that did not converge
+    
+    Parameters
+    ----------
+    non_converged_reals: int array
+      realizations to re-run
+      
+    repair_complete_day_per_system: matrix [num reals x num systems]
+      output of fn_allocate_workers_systems to update
+      
+    worker_data: dictionary
+      output of fn_allocate_workers_systems to update. Time steps are padded
+      (with the last day and zero workers) to the longest realization.
+      
+    systems, sys_repair_days, sys_crew_size, max_workers_per_building, 
+    sys_idx_priority_matrix, sys_constraint_matrix, condition_tag, 
+    sys_impeding_factors:
+      inputs of fn_allocate_workers_systems
+      
+    Returns
+    -------
+    repair_complete_day_per_system: matrix [num reals x num systems]
+      updated for the re-run realizations
+      
+    worker_data: dictionary
+      updated for the re-run realizations
+      
+    unresolved_reals: int array
+      realizations the fallback scheduler could not resolve'''
+    
+    unresolved_reals = []
+    for r in non_converged_reals:
+        if np.size(sys_impeding_factors) == 0:
+            impeding_factors_r = sys_impeding_factors
+        else:
+            impeding_factors_r = np.array(sys_impeding_factors)[[r],:]
+        complete_day_r, worker_data_r = fn_allocate_workers_systems(systems, 
+            np.array(sys_repair_days)[[r],:], np.array(sys_crew_size)[[r],:], max_workers_per_building, 
+            np.array(sys_idx_priority_matrix)[[r],:], np.array(sys_constraint_matrix)[[r],:], 
+            np.array(condition_tag).reshape(-1)[[r]], impeding_factors_r, force_progress = True)
+        repair_complete_day_per_system[r,:] = complete_day_r[0,:]
+        
+        # Pad the worker data time steps to the longest realization
+        num_steps = max(np.size(worker_data['day_vector'],1), np.size(worker_data_r['day_vector'],1))
+        for var in ['day_vector', 'total_workers']:
+            for data in [worker_data, worker_data_r]:
+                num_pad = num_steps - np.size(data[var],1)
+                if num_pad > 0:
+                    if var == 'day_vector' and np.size(data[var],1) > 0:
+                        pad = np.repeat(data[var][:,[-1]], num_pad, axis=1)
+                    else:
+                        pad = np.zeros([np.size(data[var],0), num_pad])
+                    data[var] = np.column_stack((data[var], pad))
+            worker_data[var][r,:] = worker_data_r[var][0,:]
+        
+        if len(worker_data_r['convergence']['unresolved_reals']) > 0:
+            unresolved_reals.append(r)
+    
+    return repair_complete_day_per_system, worker_data, np.array(unresolved_reals, dtype=int)
+
+
+def fn_allocate_workers_systems_discrete(systems, sys_repair_days, sys_crew_size, 
+                                         max_workers_per_building, 
+                                         sys_idx_priority_matrix, 
+                                         sys_constraint_matrix, 
+                                         condition_tag, 
+                                         sys_impeding_factors):
+
+    '''Discrete time version of fn_allocate_workers_systems. System repair 
+    days and impeding times are rounded up to whole days before worker 
+    allocation, and crew sizes are always whole workers, so every time step of 
+    the allocation can be done with integer arithmetic. Days are stored as 
+    int32 arrays, workers as int16 arrays (int32 if they do not fit), and the 
+    incomplete systems of each realization are packed into the bits of a 
+    single integer to check repair constraints. Produces the same schedule as
+    fn_allocate_workers_systems.
+    
+    Parameters
+    ----------
+    systems: DataFrame
+     data table containing information about each system's attributes
+     
+    sys_repair_days: [num reals x num systems]
+     Number of days from the start of repair of each to the completion of
+     the system (assuming all sequences start on day zero)
+    
+    sys_crew_size: array [num reals x num systems]
+     required crew size for each system
+     
+    max_workers_per_building: int
+     Maximum number of workers that can work in the building at the same time 
+     
+    sys_idx_priority_matrix: matrix [num reals x systems]
+     worker allocation order of system id's prioritized for each realiztion
+     
+    sys_constraint_matrix: array [num reals x num_sys]
+     array of system ids which define which systems (column index) are delayed by the
+     system ids (array values)
+     
+    condition_tag: logical array [num reals x 1]
+     true/false if the building is red tagged
+     
+    sys_impeding_factors: array [num_reals x num_sys]
+     maximum impedance time (days) for each system. Pass in empty array when
+     calculating repair times (i.e. not including impeding factors).
+    
+    Returns
+    -------
+    repair_complete_day_per_system: matrix [num reals x num systems]
+     Number of days from the start of each sequence to the completion of the
+     sequence considering the allocation of workers to each sequence (ie
+     some sequences start before others)
+     
+    worker_data['total_workers']: array [num reals x varies]
+     total number of workers in the building at each time step of the worker
+     allocation algorthim. The number of columns varies with the number of
+     increments of the worker allocation algorithm.
+     
+    worker_data['day_vector']: array [num reals x varies]
+     Day of each time step of the worker allocation algorthim. The number of 
+     columns varies with the number of increments of the worker allocation algorithm.
+    
+    worker_data['convergence']: dictionary
+     worker allocation diagnostics (see fn_convergence_diagnostics)
+    
+    Notes
+    -----
+    Non-converged realizations are isolated and re-run with the fallback 
+    scheduler of fn_allocate_workers_systems. Impeding times of NaN are treated as zero, the same as the floating point
+    allocation. Only systems allocation is discrete; the story allocation of
+    fn_allocate_workers_stories divides worker days by the assigned workers 
+    and therefore stays in floating point.'''
+    
+    import sys
+    from repair_schedule import system_priority_functions
+    
+    ## Initial Setup
+    # Initialize Variables
+    num_reals, num_sys = np.shape(sys_repair_days)
+    if num_sys > 62:
+        sys.exit('error! Discrete scheduler is limited to 62 systems')
+    day_sentinel = np.iinfo(np.int32).max # no event for this system
+    if max(max_workers_per_building, np.max(sys_crew_size, initial=0)) < np.iinfo(np.int16).max:
+        worker_dtype = np.int16
+    else:
+        worker_dtype = np.int32
+    
+    # Re-order system variables based on priority
+    sys_idx_priority_matrix = np.array(sys_idx_priority_matrix).astype(np.int64)
+    priority_sys_workers_matrix = system_priority_functions.fn_reorder_by_priority(sys_crew_size, sys_idx_priority_matrix).astype(worker_dtype)
+    priority_sys_constraint_matrix = system_priority_functions.fn_reorder_by_priority(sys_constraint_matrix, sys_idx_priority_matrix).astype(np.int64)
+    
+    # Round up days to the nearest day
+    priority_sys_repair_days = np.ceil(system_priority_functions.fn_reorder_by_priority(sys_repair_days, sys_idx_priority_matrix)).astype(np.int32)
+    if sys_impeding_factors.size == 0:
+        priority_sys_impeding_factors = np.zeros([num_reals, num_sys], dtype=np.int32)
+    else:
+        priority_sys_impeding_factors = np.ceil(np.nan_to_num(system_priority_functions.fn_reorder_by_priority(sys_impeding_factors, sys_idx_priority_matrix), nan=0)).astype(np.int32)
+    
+    # Bit of each system (in system table order) within the packed masks
+    priority_sys_bits = np.left_shift(np.int64(1), sys_idx_priority_matrix)
+    
+    # Constraining system bit of each prioritized system (zero if unconstrained)
+    has_constraint = priority_sys_constraint_matrix > 0
+    priority_constraint_bits = np.where(has_constraint, np.left_shift(np.int64(1), np.fmax(priority_sys_constraint_matrix - 1, 0)), 0)
+    
+    # Systems in series when the building is red tagged
+    in_series = [np.logical_and(condition_tag, systems['name'][s] == 'structural') for s in range(num_sys)]
+    
+    # Iteration budget: twice the increments any converging realization needs
+    iteration_budget = 4 * num_sys + 10
+    is_isolated = np.zeros(num_reals, dtype=bool)
+    
+    ## Assign workers to each system based on repair constraints
+    iter = 0
+    priority_system_complete_day = np.zeros([num_reals,num_sys], dtype=np.int32)
+    current_day = np.zeros(num_reals, dtype=np.int32)
+    priority_sys_waiting_days = priority_sys_impeding_factors.copy()
+    day_vector = []
+    total_workers = []
+    while np.any(priority_sys_repair_days > 0):
+        iter = iter + 1; 
+        if iter > iteration_budget: # keep the while loop pandemic contained
+            # Isolate the realizations that did not converge within the budget
+            is_isolated[np.any(priority_sys_repair_days > 0, axis=1)] = True
+            break
+        
+        # zero out assigned workers matrix
+        assigned_workers = np.zeros([num_reals,num_sys], dtype=worker_dtype)
+        available_workers = np.full(num_reals, max_workers_per_building, dtype=worker_dtype)
+        
+        # Pack the systems that are still incomplete in each realization into
+        # the bits of a single integer, and block systems whose constraining
+        # system bit is set
+        sys_incomplete = priority_sys_repair_days > 0
+        incomplete_bits = np.bitwise_or.reduce(np.where(sys_incomplete, priority_sys_bits, 0), axis=1)
+        sys_blocked = np.bitwise_and(priority_constraint_bits, incomplete_bits.reshape(num_reals,1)) != 0
+        
+        # Need to wait for impeding factors or other repairs to finish
+        is_waiting = (current_day.reshape(num_reals,1) < priority_sys_impeding_factors) | sys_blocked
+        
+        # Define where needs repair
+        needs_repair = sys_incomplete & np.logical_not(is_waiting)
+    
+        # Defined Required Workers
+        required_workers = needs_repair * priority_sys_workers_matrix
+        
+        # Assign Workers to each system
+        for s in range(num_sys):
+            enough_workers = required_workers[:,s] <= available_workers
+            assigned_workers[enough_workers,s] = np.fmin(required_workers[enough_workers,s], available_workers[enough_workers])
     
-    sys_idx_untangle_matrix = np.argsort(sys_idx_priority_matrix, axis=1)
+            # Define Available Workers
+            available_workers[np.logical_and(in_series[s], assigned_workers[:,s] > 0)] = 0
+            available_workers[np.logical_not(in_series[s])] = available_workers[np.logical_not(in_series[s])] - assigned_workers[np.logical_not(in_series[s]),s]
+        
+        # Calculate the time associated with this increment of the while loop
+        # as the next event (a system completes or stops waiting)
+        in_progress = assigned_workers > 0
+        total_time = np.where(in_progress, priority_sys_repair_days, day_sentinel)
+        total_time = np.where(priority_sys_waiting_days > 0, np.fmin(total_time, priority_sys_waiting_days), total_time)
+        delta_days = np.amin(total_time, axis=1)
+        delta_days[delta_days == day_sentinel] = 0
+        
+        # Isolate realizations where nothing can progress (would never converge)
+        is_stalled = (delta_days == 0) & np.any(priority_sys_repair_days > 0, axis=1)
+        is_isolated[is_stalled] = True
+        priority_sys_repair_days[is_stalled,:] = 0
+        
+        # Reduce waiting and repair time
+        priority_sys_waiting_days = np.maximum(priority_sys_waiting_days - delta_days.reshape(num_reals,1), 0)
+        priority_sys_repair_days = np.where(in_progress, np.maximum(priority_sys_repair_days - delta_days.reshape(num_reals,1), 0), priority_sys_repair_days)
+        
+        # Define Start and Stop of Repair for each sequence
+        priority_system_complete_day = priority_system_complete_day + delta_days.reshape(num_reals,1) * (needs_repair | is_waiting)
+        
+        # Define Cummulative day of repair and save worker data data over time
+        workers_this_step = np.sum(assigned_workers, axis=1, dtype=np.int32)
+        day_vector.extend([current_day, current_day + delta_days])
+        total_workers.extend([workers_this_step, workers_this_step])
+        current_day = current_day + delta_days
     
-    repair_complete_day_per_system = fitler_matrix_by_rows(priority_system_complete_day, sys_idx_untangle_matrix)
+    # Untangle system_complete_day back into system table order
+    repair_complete_day_per_system = system_priority_functions.fn_restore_system_order(priority_system_complete_day, sys_idx_priority_matrix).astype(float)
     
     # Save worker data matrices
-    worker_data ={'total_workers' : total_workers, 'day_vector' : day_vector}
+    worker_data = {'total_workers' : np.array(total_workers, dtype=float).reshape(len(total_workers), num_reals).T, 
+                   'day_vector' : np.array(day_vector, dtype=float).reshape(len(day_vector), num_reals).T}
+    
+    ## Re-run non-converged realizations
+    non_converged_reals = np.where(is_isolated)[0]
+    repair_complete_day_per_system, worker_data, unresolved_reals = fn_rerun_non_converged_systems(
+        non_converged_reals, repair_complete_day_per_system, worker_data, systems, sys_repair_days, 
+        sys_crew_size, max_workers_per_building, sys_idx_priority_matrix, 
+        sys_constraint_matrix, condition_tag, sys_impeding_factors)
+    
+    worker_data['convergence'] = fn_convergence_diagnostics(iteration_budget, iter, non_converged_reals, unresolved_reals)
 
-    return repair_complete_day_per_system, worker_data 
+    return repair_complete_day_per_system, worker_data
 
 
 def fn_restructure_repair_schedule( damage, system_schedule,
     repair_complete_day_per_system, systems, repair_type, simulated_red_tags):
     
-    '''Redistribute repair schedule data from the system and story level to the component level for use 
-    in the functionality assessment (ie, put repair schedule data into the
-    damage object)
+    '''Redistribute repair schedule data from the system level to the story 
+    level for each system, and map each component damage state to its system
+    (for use in the functionality assessment). Component level repair days are
+    not expanded here, and are instead gathered on demand for each tenant 
+    unit using fn_component_repair_day
     
     Parameters
     ----------
@@ -701,24 +1175,36 @@ def fn_restructure_repair_schedule( damage, system_schedule,
     
     Returns
     -------
-    damage: dictionary
-     contains per damage state damage and loss data for each component in
-     the building, including repair schedule data.
+    repair_schedule['repair_start_day']: array [num reals x num systems x num units]
+     day repairs of each system start on each story (tenant unit)
+    
+    repair_schedule['repair_complete_day']: array [num reals x num systems x num units]
+     day repairs of each system are complete on each story (tenant unit)
+    
+    repair_schedule['comp_sys_idx']: int array [num comp_ds]
+     index of the system (row of the systems table) each component damage
+     state is repaired with; -1 where there is no System/RepairClass assignment
+    
+    repair_schedule['repair_time_var']: string
+     variable within damage['tenant_units'] that defines if a component 
+     damage state needs this type of repair
     
-    % Notes
+    repair_schedule['is_damaged']: list [num units] of logical arrays [num reals x num comp_ds]
+     component damage states of each tenant unit that are damaged and need
+     this type of repair
+    
+    Notes
     -----
     In the repair start day outputs:
        - Zero = Starts immediately
-       - NaN = Repairs never started (because not damaged, has no temp repair, or controlled by red tag)
-    In the repair complete day outputs:
-       - NaN = No damage (or controlled by red tag)
-       - Inf = Is damaged, but has no System/RepairClass assignment (or no temp repair)'''
+       - NaN = Repairs never started (because controlled by red tag)'''
     
     import sys
     
     ## Initialize Parameters
     num_sys = len(systems)
     num_units = len(damage['tenant_units'])
+    num_reals = len(repair_complete_day_per_system)
     
     # Define Repair Type Variables (variable within the damage object)
     if repair_type == 'full':
@@ -730,22 +1216,11 @@ def fn_restructure_repair_schedule( damage, system_schedule,
     else:
         sys.exit('Unexpected Repair Type')
 
-    # Initialize recovery field
-    damage_recovery = {}
-    for tu in range(num_units):
-        # Set to inf as a null repair time (will remain inf for components with
-        # no attributed system) - matters for temp repairs, shouldnt matter for
-        # full repair
-        damage_recovery[tu]={}
-        damage_recovery[tu]['repair_start_day'] = np.empty(np.shape(np.array(damage['tenant_units'][tu]['qnt_damaged'])))
-        damage_recovery[tu]['repair_start_day'][:] = np.nan
-        damage_recovery[tu]['repair_complete_day'] = np.empty(np.shape(np.array(damage['tenant_units'][tu]['qnt_damaged'])))
-        damage_recovery[tu]['repair_complete_day'][:] = np.inf
-        
-        # if not damaged, set repair complete time to NaN
-        is_damaged = np.logical_and(np.array(damage['tenant_units'][tu]['qnt_damaged']) > 0, np.array(damage['tenant_units'][tu][repair_time_var]) > 0)
-        damage_recovery[tu]['repair_complete_day'][np.logical_not(is_damaged)] = np.nan
-
+    # Initialize compact schedule
+    repair_schedule = {'repair_start_day' : np.empty([num_reals, num_sys, num_units], dtype=damage['precision']),
+                       'repair_complete_day' : np.empty([num_reals, num_sys, num_units], dtype=damage['precision']),
+                       'comp_sys_idx' : -np.ones(len(damage['comp_ds_table'][system_var]), dtype=int),
+                       'repair_time_var' : repair_time_var}
 
    ## Redistribute repair schedule data
     for syst in range(num_sys):
@@ -759,22 +1234,98 @@ def fn_restructure_repair_schedule( damage, system_schedule,
         if np.logical_and(repair_type == 'temp', np.any(simulated_red_tags)):
             story_start_day[simulated_red_tags.astype(bool),:] = np.nan
             story_complete_day[simulated_red_tags.astype(bool),:] = np.nan
+        
+        repair_schedule['repair_start_day'][:,syst,:] = story_start_day
+        repair_schedule['repair_complete_day'][:,syst,:] = story_complete_day
    
-        # Re-distribute to each tenant unit
-        sys_filt = damage['comp_ds_table'][system_var] == systems['id'][syst] # identifies which ds idices are in this seqeunce  
-        for tu in range(num_units):
-            is_damaged = np.logical_and(np.array(damage['tenant_units'][tu]['qnt_damaged'])[:,sys_filt] > 0, np.array(damage['tenant_units'][tu][repair_time_var])[:,sys_filt] > 0)
-            is_damaged = (is_damaged * 1).astype(float)
-            is_damaged[is_damaged == 0] = np.nan
-    
-            # Re-distribute repair days to component damage states
-            damage_recovery[tu]['repair_start_day'][:,sys_filt] = is_damaged* story_start_day[:,tu].reshape(len(story_start_day[:,tu]),1)
-            damage_recovery[tu]['repair_complete_day'][:,sys_filt] = is_damaged * story_complete_day[:,tu].reshape(len(story_complete_day[:,tu]),1)
+        # Map the component damage states in this system
+        sys_filt = np.array(damage['comp_ds_table'][system_var]) == systems['id'][syst] # identifies which ds idices are in this seqeunce  
+        repair_schedule['comp_sys_idx'][sys_filt] = syst
+    
+    ## Damaged component damage states that need this type of repair (reused by each gather)
+    damaged_var = 'is_damaged_' + repair_type
+    repair_schedule['is_damaged'] = []
+    for tu in range(num_units):
+        if 'sparse_damage' in damage.keys() and damaged_var in damage['sparse_damage']['tenant_units'][tu].keys():
+            is_damaged = damage['sparse_damage']['tenant_units'][tu][damaged_var].toarray()
+        else:
+            is_damaged = np.logical_and(np.array(damage['tenant_units'][tu]['qnt_damaged']) > 0, np.array(damage['tenant_units'][tu][repair_time_var]) > 0)
+        repair_schedule['is_damaged'].append(is_damaged)
             
-    return damage_recovery
+    return repair_schedule
+
+
+def fn_component_repair_day(damage, tu, day_var, repair_type = 'full'):
+    '''Gather the repair day of each component damage state for a single 
+    tenant unit from the compact system and story repair schedule
+    
+    Parameters
+    ----------
+    damage: dictionary
+     contains per damage state damage and loss data for each component in
+     the building, including the compact repair schedule data in 
+     damage['repair_schedule']
+     
+    tu: int
+     index of the tenant unit (story)
+     
+    day_var: string
+     'repair_start_day' or 'repair_complete_day'. Add the suffix '_w_tmp' 
+     to get the full repair days considering temporary repairs (i.e. the
+     lesser of the full and temporary repair complete day)
+    
+    repair_type: string
+      String identifier indicating whether the repair are temporary or full
+    
+    Returns
+    -------
+    comp_day: array [num reals x num comp_ds]
+     repair start or complete day of each component damage state. A new 
+     array is returned for each call.
+    
+    Notes
+    -----
+    In the repair start day outputs:
+       - Zero = Starts immediately
+       - NaN = Repairs never started (because not damaged, has no temp repair, or controlled by red tag)
+    In the repair complete day outputs:
+       - NaN = No damage (or controlled by red tag)
+       - Inf = Is damaged, but has no System/RepairClass assignment (or no temp repair)'''
+    
+    ## Repair days considering temporary repairs
+    if day_var.endswith('_w_tmp'):
+        full_complete_day = fn_component_repair_day(damage, tu, 'repair_complete_day', 'full')
+        tmp_complete_day = fn_component_repair_day(damage, tu, 'repair_complete_day', 'temp')
+        if day_var == 'repair_complete_day_w_tmp':
+            # Repair time is the lesser of the full repair and temp repair times
+            return np.fmin(full_complete_day, tmp_complete_day)
+        
+        # Repair start day is set to the temp repair start day when temp repairs control
+        tmp_day_controls = tmp_complete_day < full_complete_day
+        comp_day = fn_component_repair_day(damage, tu, 'repair_start_day', 'full')
+        comp_day[tmp_day_controls] = fn_component_repair_day(damage, tu, 'repair_start_day', 'temp')[tmp_day_controls]
+        return comp_day
+    
+    ## Gather system repair days on this story for each component
+    repair_schedule = damage['repair_schedule'][repair_type]
+    comp_sys_idx = repair_schedule['comp_sys_idx']
+    comp_day = repair_schedule[day_var][:, np.fmax(comp_sys_idx, 0), tu]
+    
+    # Set to inf as a null repair time (will remain inf for components with
+    # no attributed system) - matters for temp repairs, shouldnt matter for
+    # full repair
+    if day_var == 'repair_start_day':
+        comp_day[:, comp_sys_idx < 0] = np.nan
+    else:
+        comp_day[:, comp_sys_idx < 0] = np.inf
+    
+    # if not damaged, set repair day to NaN
+    comp_day[np.logical_not(repair_schedule['is_damaged'][tu])] = np.nan
+    
+    return comp_day
 
 
-def fn_format_gantt_chart_data( damage, systems, simulated_replacement_time):
+def fn_format_gantt_chart_data( damage, systems, simulated_replacement_time, repair_type = 'full', output_profile = 'full'):
     '''Reformat data from the damage structure into data that is used for the
     gantt charts
     
@@ -791,7 +1342,14 @@ def fn_format_gantt_chart_data( damage, systems, simulated_replacement_time):
      will take (in days). NaN represents no replacement needed (ie
      building will be repaired)
     
-Returns
+    repair_type: string
+      String identifier indicating whether the repair are temporary or full
+    
+    output_profile: string
+      'full' (default) or 'standard'. The per system per story and per story
+      per system breakdowns are only formatted for 'full'.
+    
+    Returns
     -------
     repair_schedule: dictionary
      Contians reformated repair schedule data for gantt chart plots for
@@ -806,10 +1364,23 @@ Returns
     structure) should be output and this reformatting logic moved outside the
     functional recovery assessment and into the data visuallation logic'''
     
+    from preprocessing import preprocessing_fns
+    
     ## Initial Setup
     num_stories = len(damage['tenant_units'])
-    num_reals = np.size(damage['tenant_units'][0]['recovery']['repair_start_day'],0)
-    comps = np.unique(damage['comp_ds_table']['comp_id'])
+    num_reals = np.size(damage['repair_schedule'][repair_type]['repair_start_day'],0)
+    if 'comp_groups' in damage.keys():
+        comp_groups = damage['comp_groups']
+    else:
+        comp_groups = preprocessing_fns.fn_create_comp_groups(damage['comp_ds_table']['comp_id'])
+    comps = comp_groups['comp_names']
+    
+    # Gather the component repair days on each story from the compact schedule
+    comp_start_day = []
+    comp_complete_day = []
+    for s in range(num_stories):
+        comp_start_day.append(fn_component_repair_day(damage, s, 'repair_start_day', repair_type))
+        comp_complete_day.append(fn_component_repair_day(damage, s, 'repair_complete_day', repair_type))
        
     # Determine replacement cases
     replace_cases = np.logical_not(np.isnan(simulated_replacement_time))
@@ -817,68 +1388,68 @@ Returns
     ## Reformat repair schedule data into various breakdowns
     # Per component
     repair_schedule = {'repair_start_day' : {}, 'repair_complete_day' : {}, 'component_names':[]}
-    repair_schedule['repair_start_day']['per_component'] = np.empty([num_reals, len(comps)])
+    repair_schedule['repair_start_day']['per_component'] = np.empty([num_reals, len(comps)], dtype=damage['precision'])
     repair_schedule['repair_start_day']['per_component'][:] = np.nan
-    repair_schedule['repair_complete_day']['per_component'] = np.zeros([num_reals,len(comps)])
-    for c in range(len(comps)):
-        comps_filt = damage['comp_ds_table']['comp_id'] == comps[c]
-        for s in range(num_stories):
-            repair_schedule['repair_start_day']['per_component'][:,c] = np.nanmin(np.column_stack((repair_schedule['repair_start_day']['per_component'][:,c], damage['tenant_units'][s]['recovery']['repair_start_day'][:,comps_filt])), axis=1)
-            repair_schedule['repair_complete_day']['per_component'][:,c] = np.nanmax(np.column_stack((repair_schedule['repair_complete_day']['per_component'][:,c], damage['tenant_units'][s]['recovery']['repair_complete_day'][:,comps_filt])), axis=1)
-
-        repair_schedule['component_names'].append(str(comps[c]))
+    repair_schedule['repair_complete_day']['per_component'] = np.zeros([num_reals,len(comps)], dtype=damage['precision'])
+    for s in range(num_stories):
+        repair_schedule['repair_start_day']['per_component'] = np.fmin(repair_schedule['repair_start_day']['per_component'], preprocessing_fns.fn_comp_group_reduce(comp_start_day[s], comp_groups, np.fmin))
+        repair_schedule['repair_complete_day']['per_component'] = np.fmax(repair_schedule['repair_complete_day']['per_component'], preprocessing_fns.fn_comp_group_reduce(comp_complete_day[s], comp_groups, np.fmax))
+    repair_schedule['component_names'] = [str(comp) for comp in comps]
 
     
     # Per Story
-    repair_schedule['repair_start_day']['per_story'] = np.empty([num_reals, num_stories])
+    repair_schedule['repair_start_day']['per_story'] = np.empty([num_reals, num_stories], dtype=damage['precision'])
     repair_schedule['repair_start_day']['per_story'][:] = np.nan
-    repair_schedule['repair_complete_day']['per_story'] = np.zeros([num_reals,num_stories])
+    repair_schedule['repair_complete_day']['per_story'] = np.zeros([num_reals,num_stories], dtype=damage['precision'])
     for s in range(num_stories):
-        repair_schedule['repair_start_day']['per_story'][:,s] = np.nanmin(np.column_stack((repair_schedule['repair_start_day']['per_story'][:,s], damage['tenant_units'][s]['recovery']['repair_start_day'])), axis=1)
-        repair_schedule['repair_complete_day']['per_story'][:,s] = np.nanmax(np.column_stack((repair_schedule['repair_complete_day']['per_story'][:,s], damage['tenant_units'][s]['recovery']['repair_complete_day'])), axis=1)
+        repair_schedule['repair_start_day']['per_story'][:,s] = np.nanmin(np.column_stack((repair_schedule['repair_start_day']['per_story'][:,s], comp_start_day[s])), axis=1)
+        repair_schedule['repair_complete_day']['per_story'][:,s] = np.nanmax(np.column_stack((repair_schedule['repair_complete_day']['per_story'][:,s], comp_complete_day[s])), axis=1)
     
     
     # Per Repair System
-    repair_schedule['repair_start_day']['per_system'] = np.empty([num_reals, len(systems)])
+    repair_schedule['repair_start_day']['per_system'] = np.empty([num_reals, len(systems)], dtype=damage['precision'])
     repair_schedule['repair_start_day']['per_system'][:] = np.nan
-    repair_schedule['repair_complete_day']['per_system'] = np.zeros([num_reals,len(systems)])
+    repair_schedule['repair_complete_day']['per_system'] = np.zeros([num_reals,len(systems)], dtype=damage['precision'])
     for sys in range(len(systems)):
         sys_filt = damage['comp_ds_table']['system'] == systems['id'][sys] # identifies which ds idices are in this seqeunce  
         for s in range(num_stories):
-            repair_schedule['repair_start_day']['per_system'][:,sys] = np.nanmin(np.column_stack((repair_schedule['repair_start_day']['per_system'][:,sys], damage['tenant_units'][s]['recovery']['repair_start_day'][:,sys_filt])), axis=1)
-            repair_schedule['repair_complete_day']['per_system'][:,sys] = np.nanmax(np.column_stack((repair_schedule['repair_complete_day']['per_system'][:,sys], damage['tenant_units'][s]['recovery']['repair_complete_day'][:,sys_filt])), axis=1)
+            repair_schedule['repair_start_day']['per_system'][:,sys] = np.nanmin(np.column_stack((repair_schedule['repair_start_day']['per_system'][:,sys], comp_start_day[s][:,sys_filt])), axis=1)
+            repair_schedule['repair_complete_day']['per_system'][:,sys] = np.nanmax(np.column_stack((repair_schedule['repair_complete_day']['per_system'][:,sys], comp_complete_day[s][:,sys_filt])), axis=1)
 
 
     repair_schedule['system_names'] = np.array(systems['name'])
     
-    # Per system per story
-    num_sys_stories = num_stories * len(systems)
-    repair_schedule['repair_start_day']['per_system_story'] = np.empty([num_reals,num_sys_stories])
-    repair_schedule['repair_start_day']['per_system_story'][:] = np.nan
-    repair_schedule['repair_complete_day']['per_system_story'] = np.zeros([num_reals,num_sys_stories])
-    id = -1; #FZ# -1 done to account for python indexing starting from 0
-    for s in range(num_stories):
+    # Per system story breakdowns are only needed for the full output profile
+    if output_profile == 'full':
+        # Per system per story
+        num_sys_stories = num_stories * len(systems)
+        repair_schedule['repair_start_day']['per_system_story'] = np.empty([num_reals,num_sys_stories], dtype=damage['precision'])
+        repair_schedule['repair_start_day']['per_system_story'][:] = np.nan
+        repair_schedule['repair_complete_day']['per_system_story'] = np.zeros([num_reals,num_sys_stories], dtype=damage['precision'])
+        id = -1; #FZ# -1 done to account for python indexing starting from 0
+        for s in range(num_stories):
+            for sys in range(len(systems)):
+                id += 1
+                sys_filt = damage['comp_ds_table']['system'] == systems['id'][sys] # identifies which ds idices are in this seqeunce  
+                repair_schedule['repair_start_day']['per_system_story'][:,id] = np.nanmin(np.column_stack((repair_schedule['repair_start_day']['per_system_story'][:,id], comp_start_day[s][:,sys_filt])), axis=1)
+                repair_schedule['repair_complete_day']['per_system_story'][:,id] = np.nanmax(np.column_stack((repair_schedule['repair_complete_day']['per_system_story'][:,id], comp_complete_day[s][:,sys_filt])), axis=1)
+
+
+        # Per story per system
+        num_sys_stories = num_stories * len(systems)
+        repair_schedule['repair_start_day']['per_story_system'] = np.empty([num_reals,num_sys_stories], dtype=damage['precision'])
+        repair_schedule['repair_start_day']['per_story_system'][:] = np.nan
+        repair_schedule['repair_complete_day']['per_story_system'] = np.zeros([num_reals,num_sys_stories], dtype=damage['precision'])
+
+        id = -1; #FZ# -1 done to account for python indexing starting from 0
         for sys in range(len(systems)):
-            id += 1
-            sys_filt = damage['comp_ds_table']['system'] == systems['id'][sys] # identifies which ds idices are in this seqeunce  
-            repair_schedule['repair_start_day']['per_system_story'][:,id] = np.nanmin(np.column_stack((repair_schedule['repair_start_day']['per_system_story'][:,id], damage['tenant_units'][s]['recovery']['repair_start_day'][:,sys_filt])), axis=1)
-            repair_schedule['repair_complete_day']['per_system_story'][:,id] = np.nanmax(np.column_stack((repair_schedule['repair_complete_day']['per_system_story'][:,id], damage['tenant_units'][s]['recovery']['repair_complete_day'][:,sys_filt])), axis=1)
+            for s in range(num_stories):
+                id += 1
+                sys_filt = damage['comp_ds_table']['system'] == systems['id'][sys] # identifies which ds idices are in this seqeunce 
+                repair_schedule['repair_start_day']['per_story_system'][:,id] = np.nanmin(np.column_stack((repair_schedule['repair_start_day']['per_story_system'][:,id], comp_start_day[s][:,sys_filt])), axis=1)
+                repair_schedule['repair_complete_day']['per_story_system'][:,id] = np.nanmax(np.column_stack((repair_schedule['repair_complete_day']['per_story_system'][:,id], comp_complete_day[s][:,sys_filt])), axis=1)
 
     
-    # Per story per system
-    num_sys_stories = num_stories * len(systems)
-    repair_schedule['repair_start_day']['per_story_system'] = np.empty([num_reals,num_sys_stories])
-    repair_schedule['repair_start_day']['per_story_system'][:] = np.nan
-    repair_schedule['repair_complete_day']['per_story_system'] = np.zeros([num_reals,num_sys_stories])
-    
-    id = -1; #FZ# -1 done to account for python indexing starting from 0
-    for sys in range(len(systems)):
-        for s in range(num_stories):
-            id += 1
-            sys_filt = damage['comp_ds_table']['system'] == systems['id'][sys] # identifies which ds idices are in this seqeunce 
-            repair_schedule['repair_start_day']['per_story_system'][:,id] = np.nanmin(np.column_stack((repair_schedule['repair_start_day']['per_story_system'][:,id], damage['tenant_units'][s]['recovery']['repair_start_day'][:,sys_filt])), axis=1)
-            repair_schedule['repair_complete_day']['per_story_system'][:,id] = np.nanmax(np.column_stack((repair_schedule['repair_complete_day']['per_story_system'][:,id], damage['tenant_units'][s]['recovery']['repair_complete_day'][:,sys_filt])), axis=1)
-    
     # Overwrite realization for demo and replace cases
     formats = list(repair_schedule['repair_start_day'].keys())
     for f in range(len(formats)):
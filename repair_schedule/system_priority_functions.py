@@ -0,0 +1,180 @@
+"""
+Index gather functions to reorder system data by the repair priority of each
+realization, and to check system repair constraints and per system damage,
+without looping over realizations
+"""
+import numpy as np
+
+def fn_reorder_by_priority(values, sys_idx_priority_matrix):
+    '''Reorder the columns of each row of a system matrix by priority
+
+    Parameters
+    ----------
+    values: matrix [num reals x num systems]
+      values in system table order
+
+    sys_idx_priority_matrix: index array [num reals x num systems]
+      row index to filter system matrices to be prioritized for each
+      realiztion. Priority is left to right.
+
+    Returns
+    -------
+    priority_values: matrix [num reals x num systems]
+      values in priority order'''
+
+    return np.take_along_axis(np.asarray(values), np.asarray(sys_idx_priority_matrix, dtype=int), axis=1)
+
+
+def fn_restore_system_order(priority_values, sys_idx_priority_matrix):
+    '''Put the columns of each row of a matrix in priority order back into
+    system table order (the inverse of fn_reorder_by_priority)
+
+    Parameters
+    ----------
+    priority_values: matrix [num reals x num systems]
+      values in priority order
+
+    sys_idx_priority_matrix: index array [num reals x num systems]
+      row index to filter system matrices to be prioritized for each
+      realiztion. Priority is left to right.
+
+    Returns
+    -------
+    values: matrix [num reals x num systems]
+      values in system table order'''
+
+    priority_values = np.asarray(priority_values)
+    values = np.empty(np.shape(priority_values), dtype=priority_values.dtype)
+    np.put_along_axis(values, np.asarray(sys_idx_priority_matrix, dtype=int), priority_values, axis=1)
+
+    return values
+
+
+def fn_constraining_system_position(sys_idx_priority_matrix, priority_sys_constraint_matrix):
+    '''Find the position (in priority order) of the system constraining each
+    system
+
+    Parameters
+    ----------
+    sys_idx_priority_matrix: index array [num reals x num systems]
+      row index to filter system matrices to be prioritized for each
+      realiztion. Priority is left to right.
+
+    priority_sys_constraint_matrix: array [num reals x num systems]
+      system ids (table index + 1) that constrain each system, in priority
+      order. Zero where not constrained.
+
+    Returns
+    -------
+    constraining_sys_position: int array [num reals x num systems]
+      column (in priority order) of the constraining system of each system.
+      -1 where not constrained.'''
+
+    num_sys = np.size(sys_idx_priority_matrix, 1)
+    priority_sys_constraint_matrix = np.asarray(priority_sys_constraint_matrix).astype(int)
+
+    # Position of each system (table order) within the priority order
+    sys_position = np.argsort(np.asarray(sys_idx_priority_matrix), axis=1)
+
+    # Position of the constraining system of each system
+    is_constrained = (priority_sys_constraint_matrix >= 1) & (priority_sys_constraint_matrix <= num_sys)
+    constraining_sys_idx = np.where(is_constrained, priority_sys_constraint_matrix - 1, 0)
+    constraining_sys_position = np.where(is_constrained, np.take_along_axis(sys_position, constraining_sys_idx, axis=1), -1)
+
+    return constraining_sys_position
+
+
+def fn_constraining_system_status(sys_status, constraining_sys_position):
+    '''Gather the status (e.g. incomplete) of the system constraining each
+    system, with all data in priority order
+
+    Parameters
+    ----------
+    sys_status: logical array [num reals x num systems]
+      status of each system, in priority order
+
+    constraining_sys_position: int array [num reals x num systems]
+      output of fn_constraining_system_position
+
+    Returns
+    -------
+    constraining_sys_status: logical array [num reals x num systems]
+      status of the constraining system of each system (false where not
+      constrained)'''
+
+    is_constrained = constraining_sys_position >= 0
+    constraining_sys_status = is_constrained & np.take_along_axis(np.asarray(sys_status), np.fmax(constraining_sys_position, 0), axis=1)
+
+    return constraining_sys_status
+
+
+def fn_any_per_system(comp_values, comp_sys_filt):
+    '''Check if any component damage state of each system meets a condition,
+    for each realization
+
+    Parameters
+    ----------
+    comp_values: logical array [num reals x num comp_ds]
+      condition for each component damage state
+
+    comp_sys_filt: logical array [num comp_ds x num systems]
+      component damage states in each system
+
+    Returns
+    -------
+    sys_any: logical array [num reals x num systems]
+      true where any component damage state of the system meets the
+      condition'''
+
+    comp_values = np.asarray(comp_values, dtype=bool)
+    sys_any = np.zeros([np.size(comp_values, 0), np.size(comp_sys_filt, 1)], dtype=bool)
+    for syst in np.where(np.any(comp_sys_filt, axis=0))[0]:
+        sys_any[:,syst] = np.logical_or.reduce(comp_values[:,comp_sys_filt[:,syst]], axis=1)
+
+    return sys_any
+
+
+def fn_all_per_system(comp_values, comp_sys_filt):
+    '''Check if every component damage state of each system meets a
+    condition, for each realization
+
+    Parameters
+    ----------
+    comp_values: logical array [num reals x num comp_ds]
+      condition for each component damage state
+
+    comp_sys_filt: logical array [num comp_ds x num systems]
+      component damage states in each system
+
+    Returns
+    -------
+    sys_all: logical array [num reals x num systems]
+      true where every component damage state of the system meets the
+      condition (true for systems with no component damage states)'''
+
+    return np.logical_not(fn_any_per_system(np.logical_not(comp_values), comp_sys_filt))
+
+
+def fn_max_per_system(comp_values, comp_sys_filt):
+    '''Largest value of the component damage states of each system, for each
+    realization
+
+    Parameters
+    ----------
+    comp_values: array [num reals x num comp_ds]
+      value for each component damage state (NaNs are ignored)
+
+    comp_sys_filt: logical array [num comp_ds x num systems]
+      component damage states in each system
+
+    Returns
+    -------
+    sys_max: array [num reals x num systems]
+      largest value of the component damage states of each system (NaN for
+      systems with no component damage states, or only NaN values)'''
+
+    sys_max = np.full([np.size(comp_values, 0), np.size(comp_sys_filt, 1)], np.nan)
+    for syst in np.where(np.any(comp_sys_filt, axis=0))[0]:
+        sys_max[:,syst] = np.fmax.reduce(comp_values[:,comp_sys_filt[:,syst]], axis=1)
+
+    return sys_max
@@ -0,0 +1,380 @@
+"""
+Per realization worker allocation kernels, compiled with Numba when it is
+installed. Each realization is stepped through time in its own event loop
+instead of whole matrix passes over every realization on every step. Used in
+place of fn_allocate_workers_stories and fn_allocate_workers_systems when
+repair_time_options['worker_allocation_backend'] is 'numba'.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    def njit(*args, **kwargs):
+        # Without Numba, kernels run (slowly) as plain python
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+
+@njit(cache=True, error_model='numpy')
+def _allocate_workers_stories_kernel(total_worker_days, required_workers_per_story,
+                                     average_crew_size, max_crews_building,
+                                     max_workers_per_building, iteration_budget):
+    num_reals, num_stories = total_worker_days.shape
+    repair_complete_day = np.zeros((num_reals, num_stories))
+    repair_start_day = np.full((num_reals, num_stories), np.nan)
+    max_workers_per_story = np.zeros((num_reals, num_stories))
+    num_iter = np.zeros(num_reals, dtype=np.int64)
+    is_isolated = np.zeros(num_reals, dtype=np.bool_)
+
+    assigned_workers = np.zeros(num_stories)
+    assigned_crews = np.zeros(num_stories)
+    needs_repair = np.zeros(num_stories, dtype=np.bool_)
+    for r in range(num_reals):
+        remaining = total_worker_days[r, :].copy()
+        required = required_workers_per_story[r, :].copy()
+        while True:
+            total_remaining = 0.0
+            for s in range(num_stories):
+                total_remaining += remaining[s]
+            if not total_remaining > 0:
+                break
+            if num_iter[r] >= iteration_budget: # keep the while loop pandemic contained
+                is_isolated[r] = True
+                break
+            num_iter[r] += 1
+
+            # Assign Workers to each story
+            available_workers = max_workers_per_building
+            for s in range(num_stories):
+                needs_repair[s] = remaining[s] > 0
+                if not needs_repair[s]:
+                    required[s] = 0.0
+                assigned_workers[s] = 0.0
+                assigned_crews[s] = 0.0
+            for s in range(num_stories):
+                if required[s] <= available_workers:
+                    assigned_workers[s] = required[s]
+                assigned_crews[s] = assigned_workers[s] / average_crew_size[r, s]
+                if np.isnan(assigned_crews[s]):
+                    assigned_crews[s] = 0.0
+                num_crews_in_building = 0.0
+                for ss in range(num_stories):
+                    num_crews_in_building += assigned_crews[ss]
+                if num_crews_in_building > max_crews_building[r]:
+                    assigned_workers[s] = 0.0
+                available_workers = available_workers - assigned_workers[s]
+
+            # Define the start of repairs for each story
+            max_day_completed_so_far = repair_complete_day[r, 0]
+            for s in range(1, num_stories):
+                max_day_completed_so_far = max(max_day_completed_so_far, repair_complete_day[r, s])
+            for s in range(num_stories):
+                if np.isnan(repair_start_day[r, s]) and assigned_workers[s] > 0:
+                    repair_start_day[r, s] = max_day_completed_so_far
+
+            # Calculate the time associated with this increment
+            delta_days = np.inf
+            for s in range(num_stories):
+                if assigned_workers[s] > 0:
+                    delta_days = min(delta_days, remaining[s] / assigned_workers[s])
+            if np.isinf(delta_days):
+                delta_days = 0.0
+            if delta_days == 0: # no workers can be assigned (would never converge)
+                is_isolated[r] = True
+                break
+            for s in range(num_stories):
+                if assigned_workers[s] > 0:
+                    remaining[s] = max(remaining[s] - assigned_workers[s] * delta_days, 0.0)
+                if remaining[s] < 0.001:
+                    remaining[s] = 0.0
+                if needs_repair[s]:
+                    repair_complete_day[r, s] += delta_days
+                max_workers_per_story[r, s] = max(max_workers_per_story[r, s], assigned_workers[s])
+
+    return repair_start_day, repair_complete_day, max_workers_per_story, num_iter, is_isolated
+
+
+@njit(cache=True, error_model='numpy')
+def _allocate_workers_systems_kernel(priority_sys_repair_days, priority_sys_workers_matrix,
+                                     priority_sys_constraint_matrix, priority_sys_impeding_factors,
+                                     sys_idx_priority_matrix, in_series, max_workers_per_building,
+                                     num_steps, iteration_budget):
+    '''Run each realization for num_steps increments (or until complete when
+    num_steps < 0, returning the number of increments needed and the 
+    realizations that stall or exceed the iteration budget)'''
+    num_reals, num_sys = priority_sys_repair_days.shape
+    record = num_steps >= 0
+    num_cols = 2 * num_steps if record else 0
+    priority_system_complete_day = np.zeros((num_reals, num_sys))
+    total_workers = np.zeros((num_reals, num_cols))
+    day_vector = np.zeros((num_reals, num_cols))
+    num_iter = np.zeros(num_reals, dtype=np.int64)
+    is_isolated = np.zeros(num_reals, dtype=np.bool_)
+
+    sys_position = np.zeros(num_sys, dtype=np.int64)
+    is_waiting = np.zeros(num_sys, dtype=np.bool_)
+    needs_repair = np.zeros(num_sys, dtype=np.bool_)
+    assigned_workers = np.zeros(num_sys)
+    for r in range(num_reals):
+        repair_days = priority_sys_repair_days[r, :].copy()
+        waiting_days = priority_sys_impeding_factors[r, :].copy()
+        current_day = 0.0
+        for p in range(num_sys):
+            sys_position[sys_idx_priority_matrix[r, p]] = p
+
+        step = 0
+        while True:
+            if record:
+                if step >= num_steps:
+                    break
+            else:
+                any_incomplete = False
+                for p in range(num_sys):
+                    if repair_days[p] > 0:
+                        any_incomplete = True
+                if not any_incomplete:
+                    break
+                if step >= iteration_budget: # keep the while loop pandemic contained
+                    is_isolated[r] = True
+                    break
+
+            # Define what systems are waiting to begin repairs
+            for p in range(num_sys):
+                constraint = priority_sys_constraint_matrix[r, p]
+                blocked = False
+                if constraint >= 1 and constraint <= num_sys:
+                    blocked = repair_days[sys_position[constraint - 1]] > 0
+                is_waiting[p] = (current_day < priority_sys_impeding_factors[r, p]) or blocked
+                needs_repair[p] = repair_days[p] > 0 and not is_waiting[p]
+
+            # Assign Workers to each system
+            available_workers = max_workers_per_building
+            for p in range(num_sys):
+                required = priority_sys_workers_matrix[r, p] if needs_repair[p] else 0.0
+                assigned_workers[p] = 0.0
+                if required <= available_workers:
+                    assigned_workers[p] = min(required, available_workers)
+                if in_series[r, p]:
+                    if assigned_workers[p] > 0:
+                        available_workers = 0.0
+                else:
+                    available_workers = available_workers - assigned_workers[p]
+
+            # Calculate the time associated with this increment
+            delta_days = np.inf
+            for p in range(num_sys):
+                if assigned_workers[p] > 0:
+                    delta_days = min(delta_days, repair_days[p])
+                if waiting_days[p] > 0:
+                    delta_days = min(delta_days, waiting_days[p])
+            if np.isinf(delta_days):
+                delta_days = 0.0
+            if not record and delta_days == 0: # nothing can progress (would never converge)
+                is_isolated[r] = True
+                step += 1
+                break
+
+            # Reduce waiting and repair time
+            workers_this_step = 0.0
+            for p in range(num_sys):
+                if not np.isnan(waiting_days[p]):
+                    waiting_days[p] = max(waiting_days[p] - delta_days, 0.0)
+                if assigned_workers[p] > 0:
+                    repair_days[p] = max(repair_days[p] - delta_days, 0.0)
+                if needs_repair[p] or is_waiting[p]:
+                    priority_system_complete_day[r, p] += delta_days
+                workers_this_step += assigned_workers[p]
+
+            # Save worker data data over time
+            if record:
+                day_vector[r, 2*step] = current_day
+                day_vector[r, 2*step + 1] = current_day + delta_days
+                total_workers[r, 2*step] = workers_this_step
+                total_workers[r, 2*step + 1] = workers_this_step
+            current_day = current_day + delta_days
+            step += 1
+        num_iter[r] = step
+
+    return priority_system_complete_day, total_workers, day_vector, num_iter, is_isolated
+
+
+def fn_allocate_workers_stories_numba(total_worker_days, required_workers_per_story,
+                                      average_crew_size, max_crews_building,
+                                      max_workers_per_building):
+    '''Per realization version of fn_allocate_workers_stories; same inputs and
+    outputs.
+
+    Parameters
+    ----------
+    total_worker_days: [num reals x num stories]
+      The total worker days needed to repair damage each story for this
+      sequence
+
+    required_workers_per_story: array [num reals x num stories]
+      Number of workers required to repair damage in each story
+
+    average_crew_size: array [num reals x num stories]
+      Average crew size required to repair damage in each story
+
+    max_crews_building: logical array [num reals x 1]
+      maximum number of crews allowed in the building for this system
+
+    max_workers_per_building: int
+      maximum number of workers allowed in the buildings at a given time
+
+    Returns
+    -------
+    repair_start_day: array [num reals x num stories]
+      The number of days from the start of repair of this system until the repair of this system
+      starts on each story
+
+    repair_complete_day: array [num reals x num stories]
+      The number of days from the start of repair of this system until each story is
+      repaired for damage in this system
+
+    max_workers_per_story: array [num reals x num stories]
+      number of workers required for the repair of this story and system as
+      
+    convergence: dictionary
+      worker allocation diagnostics (see fn_convergence_diagnostics)'''
+
+    from repair_schedule import other_repair_schedule_functions
+
+    # Iteration budget: twice the increments any converging realization needs
+    iteration_budget = 2 * np.size(total_worker_days, 1) + 10
+
+    repair_start_day, repair_complete_day, max_workers_per_story, num_iter, is_isolated = _allocate_workers_stories_kernel(
+        np.ascontiguousarray(total_worker_days, dtype=float),
+        np.ascontiguousarray(required_workers_per_story, dtype=float),
+        np.ascontiguousarray(average_crew_size, dtype=float),
+        np.ascontiguousarray(max_crews_building, dtype=float).reshape(-1),
+        float(max_workers_per_building), iteration_budget)
+
+    ## Re-run non-converged realizations with the fallback scheduler
+    non_converged_reals = np.where(is_isolated)[0]
+    repair_start_day, repair_complete_day, max_workers_per_story, unresolved_reals = other_repair_schedule_functions.fn_rerun_non_converged_stories(
+        non_converged_reals, repair_start_day, repair_complete_day, max_workers_per_story,
+        total_worker_days, required_workers_per_story, average_crew_size, max_crews_building, max_workers_per_building)
+
+    convergence = other_repair_schedule_functions.fn_convergence_diagnostics(iteration_budget, np.max(num_iter, initial=0), non_converged_reals, unresolved_reals)
+
+    return repair_start_day, repair_complete_day, max_workers_per_story, convergence
+
+
+def fn_allocate_workers_systems_numba(systems, sys_repair_days, sys_crew_size,
+                                      max_workers_per_building,
+                                      sys_idx_priority_matrix,
+                                      sys_constraint_matrix,
+                                      condition_tag,
+                                      sys_impeding_factors):
+    '''Per realization version of fn_allocate_workers_systems; same inputs and
+    outputs.
+
+    Parameters
+    ----------
+    systems: DataFrame
+     data table containing information about each system's attributes
+
+    sys_repair_days: [num reals x num systems]
+     Number of days from the start of repair of each to the completion of
+     the system (assuming all sequences start on day zero)
+
+    sys_crew_size: array [num reals x num systems]
+     required crew size for each system
+
+    max_workers_per_building: int
+     Maximum number of workers that can work in the building at the same time
+
+    sys_idx_priority_matrix: matrix [num reals x systems]
+     worker allocation order of system id's prioritized for each realiztion
+
+    sys_constraint_matrix: array [num reals x num_sys]
+     array of system ids which define which systems (column index) are delayed by the
+     system ids (array values)
+
+    condition_tag: logical array [num reals x 1]
+     true/false if the building is red tagged
+
+    sys_impeding_factors: array [num_reals x num_sys]
+     maximum impedance time (days) for each system. Pass in empty array when
+     calculating repair times (i.e. not including impeding factors).
+
+    Returns
+    -------
+    repair_complete_day_per_system: matrix [num reals x num systems]
+     Number of days from the start of each sequence to the completion of the
+     sequence considering the allocation of workers to each sequence (ie
+     some sequences start before others)
+
+    worker_data['total_workers']: array [num reals x varies]
+     total number of workers in the building at each time step of the worker
+     allocation algorthim.
+
+    worker_data['day_vector']: array [num reals x varies]
+     Day of each time step of the worker allocation algorthim.
+     
+    worker_data['convergence']: dictionary
+     worker allocation diagnostics (see fn_convergence_diagnostics)
+
+    Notes
+    -----
+    The matrix version keeps stepping realizations that are complete until
+    every realization is complete, which can still advance the complete day
+    of systems waiting on impeding factors. To match it, the number of
+    increments to complete every realization is found first, and then every
+    realization is run for that many increments.'''
+
+    from repair_schedule import other_repair_schedule_functions
+    from repair_schedule import system_priority_functions
+
+    ## Initial Setup
+    num_reals, num_sys = np.shape(sys_repair_days)
+    sys_idx_priority_matrix = np.ascontiguousarray(sys_idx_priority_matrix, dtype=np.int64)
+
+    # Re-order system variables based on priority
+    priority_sys_workers_matrix = system_priority_functions.fn_reorder_by_priority(sys_crew_size, sys_idx_priority_matrix).astype(float)
+    priority_sys_constraint_matrix = system_priority_functions.fn_reorder_by_priority(sys_constraint_matrix, sys_idx_priority_matrix).astype(np.int64)
+    priority_sys_repair_days = np.ceil(system_priority_functions.fn_reorder_by_priority(sys_repair_days, sys_idx_priority_matrix).astype(float))
+    if sys_impeding_factors.size == 0:
+        priority_sys_impeding_factors = np.zeros([num_reals, num_sys])
+    else:
+        priority_sys_impeding_factors = np.ceil(system_priority_functions.fn_reorder_by_priority(sys_impeding_factors, sys_idx_priority_matrix).astype(float))
+
+    # Systems in series when the building is red tagged
+    is_structural = np.array([systems['name'][s] == 'structural' for s in range(num_sys)])
+    in_series = np.logical_and(np.array(condition_tag, dtype=bool).reshape(num_reals,1), is_structural.reshape(1,num_sys))
+
+    kernel_inputs = (np.ascontiguousarray(priority_sys_repair_days), np.ascontiguousarray(priority_sys_workers_matrix),
+                     np.ascontiguousarray(priority_sys_constraint_matrix), np.ascontiguousarray(priority_sys_impeding_factors),
+                     sys_idx_priority_matrix, np.ascontiguousarray(in_series), float(max_workers_per_building))
+
+    # Iteration budget: twice the increments any converging realization needs
+    iteration_budget = 4 * num_sys + 10
+
+    ## Number of increments to complete every realization
+    num_iter, is_isolated = _allocate_workers_systems_kernel(*kernel_inputs, -1, iteration_budget)[3:]
+    num_steps = int(np.max(num_iter, initial=0))
+
+    ## Assign workers to each system based on repair constraints
+    priority_system_complete_day, total_workers, day_vector = _allocate_workers_systems_kernel(*kernel_inputs, num_steps, iteration_budget)[:3]
+
+    # Untangle system_complete_day back into system table order
+    repair_complete_day_per_system = system_priority_functions.fn_restore_system_order(priority_system_complete_day, sys_idx_priority_matrix)
+
+    # Save worker data matrices
+    worker_data = {'total_workers' : total_workers, 'day_vector' : day_vector}
+
+    ## Re-run non-converged realizations with the fallback scheduler
+    non_converged_reals = np.where(is_isolated)[0]
+    repair_complete_day_per_system, worker_data, unresolved_reals = other_repair_schedule_functions.fn_rerun_non_converged_systems(
+        non_converged_reals, repair_complete_day_per_system, worker_data, systems, sys_repair_days,
+        sys_crew_size, max_workers_per_building, sys_idx_priority_matrix,
+        sys_constraint_matrix, condition_tag, sys_impeding_factors)
+
+    worker_data['convergence'] = other_repair_schedule_functions.fn_convergence_diagnostics(iteration_budget, num_steps, non_converged_reals, unresolved_reals)
+
+    return repair_complete_day_per_system, worker_data